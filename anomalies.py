@@ -0,0 +1,219 @@
+import math
+from array import array
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+
+from timestamps import ns_to_rfc3339
+
+# Field types whose values are reported as int, they are stored as floats
+INTEGER_TYPES = ("integer", "unsigned")
+
+
+class SeriesPoints:
+    """The points of one series that anomalies refer to, each stored once.
+
+    Only the points around anomalies are kept, in typed arrays, together with
+    their index in the series so gaps between kept windows are never mistaken
+    for neighbours. Times are epoch nanoseconds, formatted only when read.
+    `tags` is the complete tag set of the series, as its scan query reported
+    it, so fixes are written to the same series. Values are stored as
+    floats and reported as ints if `value_type`, the type of the value
+    field, is an integer type.
+    """
+
+    def __init__(self, measurement: str, entity_id: str, tags: dict = None):
+        self.measurement = measurement
+        self.entity_id = entity_id
+        self.tags = tags or {}
+        self.index = array("q")  # Series index of each kept point
+        self.values = array("d")
+        self.times = array("q")
+        self.friendly_names = []
+        self.value_type = None  # Set after the scan, float if unknown
+
+    def value(self, pos: int):
+        """Return the value at a storage position, None if it is missing."""
+        value = self.values[pos]
+        if math.isnan(value):
+            return None
+        return int(value) if self.value_type in INTEGER_TYPES else value
+
+    def keep(self, offset: int, times, values, friendly_names, first: int, last: int):
+        """Keep buffered points first..last-1, whose series index is `offset` + position.
+
+        Points kept by an earlier call are skipped, so overlapping windows
+        share their points.
+        """
+        first = max(first, 0)
+        if self.index:
+            first = max(first, self.index[-1] - offset + 1)
+        last = min(last, len(values))
+        if first >= last:
+            return
+        self.index.extend(range(offset + first, offset + last))
+        self.values.frombytes(np.asarray(values[first:last], dtype=float).tobytes())
+        self.times.extend(times[first:last])
+        self.friendly_names.extend(friendly_names[first:last])
+
+    def position(self, series_index: int) -> int:
+        """Return the storage position of a kept point."""
+        return bisect_left(self.index, series_index)
+
+
+class AnomalyStore:
+    """Anomalies as (series, position) pairs into shared SeriesPoints.
+
+    Values, context and prev/next are read from the series on demand, so an
+    anomaly costs a few bytes no matter how large `context_size` is. Indexing
+    returns the anomaly as a dict, for export.
+    """
+
+    def __init__(self, context_size: int = 0):
+        self.context_size = context_size
+        self.series = []
+        self.series_ids = array("i")
+        self.positions = array("q")
+
+    def add(self, series: SeriesPoints, positions) -> None:
+        """Add anomalies at the given storage positions of a series."""
+        self.series.append(series)
+        self.series_ids.extend([len(self.series) - 1] * len(positions))
+        self.positions.extend(positions)
+
+    def measurements(self) -> set:
+        """Return the measurements of the series with anomalies."""
+        return {self.series[i].measurement for i in set(self.series_ids)}
+
+    def set_value_types(self, value_types: dict) -> None:
+        """Set the value field type of each series from a measurement -> type map."""
+        for series in self.series:
+            series.value_type = value_types.get(series.measurement)
+
+    def extend(self, other: "AnomalyStore") -> None:
+        """Append the anomalies of another store, e.g. of another entity."""
+        base = len(self.series)
+        self.series.extend(other.series)
+        self.series_ids.extend(base + i for i in other.series_ids)
+        self.positions.extend(other.positions)
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def __getitem__(self, idx: int) -> dict:
+        return self.record(idx)
+
+    def __iter__(self):
+        return (self.record(idx) for idx in range(len(self)))
+
+    def _point(self, idx: int):
+        return self.series[self.series_ids[idx]], self.positions[idx]
+
+    def time(self, idx: int) -> str:
+        """Return the time of an anomaly as an RFC3339 string, as InfluxDB formats it."""
+        return ns_to_rfc3339(self.timestamp(idx))
+
+    def timestamp(self, idx: int) -> int:
+        """Return the time of an anomaly in epoch nanoseconds."""
+        series, pos = self._point(idx)
+        return series.times[pos]
+
+    def value(self, idx: int):
+        series, pos = self._point(idx)
+        return series.value(pos)
+
+    def set_value(self, idx: int, value: float) -> None:
+        """Update a point in memory after it was fixed in InfluxDB."""
+        series, pos = self._point(idx)
+        series.values[pos] = value
+
+    def measurement(self, idx: int) -> str:
+        return self.series[self.series_ids[idx]].measurement
+
+    def entity_id(self, idx: int) -> str:
+        return self.series[self.series_ids[idx]].entity_id
+
+    def tags(self, idx: int) -> dict:
+        """Return the tag set of an anomaly's series, empty if the scan did not report it."""
+        return self.series[self.series_ids[idx]].tags
+
+    def friendly_name(self, idx: int):
+        series, pos = self._point(idx)
+        return series.friendly_names[pos]
+
+    def _series_index(self, idx: int) -> tuple[int, int]:
+        series, pos = self._point(idx)
+        return self.series_ids[idx], series.index[pos]
+
+    def _neighbour_position(self, idx: int, step: int):
+        series, pos = self._point(idx)
+        other = pos + step
+        if 0 <= other < len(series.index) and (
+            series.index[other] == series.index[pos] + step
+        ):
+            return other
+        return None
+
+    def _neighbour(self, idx: int, step: int):
+        other = self._neighbour_position(idx, step)
+        if other is None:
+            return None
+        return self.series[self.series_ids[idx]].value(other)
+
+    def neighbour(self, idx: int, step: int):
+        """Return (epoch ns, value) of the point `step` points away, or None if not kept."""
+        other = self._neighbour_position(idx, step)
+        if other is None:
+            return None
+        series = self.series[self.series_ids[idx]]
+        return series.times[other], series.value(other)
+
+    def runs(self, indices) -> list:
+        """Group anomalies into runs of consecutive points of one series.
+
+        Returns lists of anomaly indices in time order. Any point between two
+        anomalies, including an anomaly not in `indices`, ends a run.
+        """
+        runs = []
+        last = None
+        for idx in sorted(set(indices), key=self._series_index):
+            series_id, series_index = self._series_index(idx)
+            if last == (series_id, series_index - 1):
+                runs[-1].append(idx)
+            else:
+                runs.append([idx])
+            last = (series_id, series_index)
+        return runs
+
+    def prev_value(self, idx: int):
+        return self._neighbour(idx, -1)
+
+    def next_value(self, idx: int):
+        return self._neighbour(idx, 1)
+
+    def context(self, idx: int) -> tuple[list, list]:
+        """Return the (time, value) points before and after an anomaly, in time order."""
+        series, pos = self._point(idx)
+        center = series.index[pos]
+        low = bisect_left(series.index, center - self.context_size)
+        high = bisect_right(series.index, center + self.context_size)
+        points = [
+            (ns_to_rfc3339(series.times[i]), series.value(i)) for i in range(low, high)
+        ]
+        return points[: pos - low], points[pos - low + 1 :]
+
+    def record(self, idx: int) -> dict:
+        """Return the anomaly with its context as a dict."""
+        before, after = self.context(idx)
+        return {
+            "time": self.time(idx),
+            "value": self.value(idx),
+            "prev_value": self.prev_value(idx),
+            "next_value": self.next_value(idx),
+            "measurement": self.measurement(idx),
+            "entity_id": self.entity_id(idx),
+            "friendly_name": self.friendly_name(idx),
+            # Nearest point first
+            "context_before": before[::-1],
+            "context_after": after,
+        }
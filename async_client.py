@@ -0,0 +1,165 @@
+import asyncio
+import base64
+import gzip
+import json
+
+import aiohttp
+import requests
+from influxdb.exceptions import InfluxDBClientError, InfluxDBServerError
+from influxdb.line_protocol import make_lines
+from influxdb.resultset import ResultSet
+
+from profiling import profiler, span
+
+# Concurrent connections (and so requests) per client
+ASYNC_POOL_SIZE = 8
+
+# Gateway errors worth retrying, the request did not reach InfluxDB
+RETRY_STATUS = (502, 503, 504)
+
+
+class AsyncInfluxDBClient:
+    """asyncio client for the InfluxDB 1.x /query and /write endpoints.
+
+    Mirrors the parts of influxdb.InfluxDBClient that DataManager uses, as
+    coroutines. All requests share one keep-alive session whose connection
+    pool bounds how many are in flight at once. Connection errors, timeouts
+    and gateway errors are retried `retries` times with exponential backoff.
+    """
+
+    def __init__(
+        self,
+        host: str = "localhost",
+        port: int = 8086,
+        username: str = "root",
+        password: str = "root",
+        database: str = None,
+        ssl: bool = False,
+        pool_size: int = ASYNC_POOL_SIZE,
+        connect_timeout: float = None,
+        read_timeout: float = None,
+        retries: int = 0,
+        retry_backoff: float = 0.5,
+        gzip: bool = False,
+    ):
+        self.base_url = f"{'https' if ssl else 'http'}://{host}:{port}"
+        # Sent as a header, passing credentials to the session is deprecated.
+        # Latin-1 like the requests-based InfluxDBClient
+        credentials = f"{username}:{password}".encode("latin-1")
+        self.headers = {
+            "Authorization": f"Basic {base64.b64encode(credentials).decode('ascii')}",
+            "Accept-Encoding": "gzip",
+        }
+        self.database = database
+        self.pool_size = max(1, int(pool_size))
+        self.timeout = aiohttp.ClientTimeout(
+            sock_connect=connect_timeout, sock_read=read_timeout
+        )
+        self.retries = max(0, int(retries))
+        self.retry_backoff = retry_backoff
+        self.gzip = (
+            gzip  # Compress request bodies, responses are always accepted gzipped
+        )
+        self.session = None  # Created on first use, inside the running event loop
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self) -> None:
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def _session(self) -> aiohttp.ClientSession:
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                headers=self.headers,
+                timeout=self.timeout,
+                # Decompressed in request(), so the profiler sees the bytes as received
+                auto_decompress=False,
+            )
+        return self.session
+
+    async def request(self, method: str, path: str, expected: int, **kwargs) -> str:
+        """Send a request and return the response body.
+
+        Failures raise the same exceptions as InfluxDBClient, so callers can
+        handle both clients alike.
+        """
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await asyncio.sleep(self.retry_backoff * 2 ** (attempt - 1))
+            try:
+                with span("http"):
+                    async with self._session().request(
+                        method, self.base_url + path, **kwargs
+                    ) as response:
+                        raw = await response.read()
+                        status = response.status
+                        encoding = response.headers.get("Content-Encoding")
+                profiler.count("bytes", len(raw))
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt < self.retries:
+                    continue
+                raise requests.exceptions.ConnectionError(str(e) or repr(e)) from e
+            if status not in RETRY_STATUS or attempt == self.retries:
+                break
+        if encoding == "gzip":
+            raw = gzip.decompress(raw)
+        body = raw.decode("utf-8", errors="replace")
+        if status >= 500:
+            raise InfluxDBServerError(body)
+        if status != expected:
+            raise InfluxDBClientError(body, status)
+        return body
+
+    async def query(
+        self,
+        query: str,
+        epoch: str = None,
+        method: str = "GET",
+        raise_errors: bool = True,
+        database: str = None,
+    ):
+        """Run a query, returning a ResultSet or a list of them for several statements."""
+        params = {"q": query, "db": database or self.database}
+        if epoch is not None:
+            params["epoch"] = epoch
+        body = await self.request(
+            method,
+            "/query",
+            200,
+            params=params,
+            headers={"Accept": "application/json"},
+        )
+        data = json.loads(body)
+        if "error" in data:
+            raise InfluxDBClientError(data["error"])
+        results = [
+            ResultSet(result, raise_errors=raise_errors)
+            for result in data.get("results", [])
+        ]
+        if not results:
+            return ResultSet({})
+        return results if len(results) > 1 else results[0]
+
+    async def write_points(
+        self, points: list, time_precision: str = None, database: str = None
+    ) -> bool:
+        """Write points given as dicts, like InfluxDBClient.write_points."""
+        data = make_lines({"points": points}, precision=time_precision).encode("utf-8")
+        headers = {"Content-Type": "application/octet-stream"}
+        if self.gzip:
+            data = gzip.compress(data)
+            headers["Content-Encoding"] = "gzip"
+        params = {"db": database or self.database}
+        if time_precision is not None:
+            params["precision"] = time_precision
+        await self.request(
+            "POST", "/write", 204, params=params, data=data, headers=headers
+        )
+        return True
@@ -0,0 +1,435 @@
+"""Benchmark DataManager scans, deletes and fixes against a synthetic InfluxDB.
+
+Runs without a database: FakeInfluxDBClient serves generated series and
+records the requests it gets. Decoding a canned msgpack response is
+timed the way InfluxDBClient.query does it and column-wise (with and
+without pausing garbage collection), and the GUI's startup imports in a
+fresh interpreter. Results are written as JSON, and `--compare` reports
+the change against an earlier results file:
+
+    python3 benchmark.py --sizes 10k,1M -o before.json
+    python3 benchmark.py --sizes 10k,1M --compare before.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import time
+
+import msgpack
+import numpy as np
+from influxdb.client import _msgpack_parse_hook
+from influxdb.resultset import ResultSet
+
+from connection import decode_columns
+from data import DataManager, _series_columns
+from timestamps import parse_duration
+
+# Seconds between synthetic points
+POINT_INTERVAL = 10
+
+# Share of points turned into spikes/dips or bounds violations
+ANOMALY_RATE = 0.001
+
+SIZE_SUFFIXES = {"": 1, "k": 1_000, "M": 1_000_000}
+
+# Modules the GUI imports before its window appears, the data layer loads later
+STARTUP_IMPORTS = ("config", "cli", "ui")
+
+# A line of `python -X importtime`: self and cumulative microseconds, indented name
+IMPORT_TIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)")
+
+# Synthetic series per dataset: measurement and bounds used for the bounds check
+DATASETS = {
+    "counter": {"unit": "kWh", "min": 0, "max": 1e9},
+    "power": {"unit": "W", "min": 0, "max": 1000},
+    "stuck": {"unit": "Wh", "min": 0, "max": 50},
+}
+
+
+def parse_size(text: str) -> int:
+    match = re.fullmatch(r"(\d+)([kM]?)", text.strip())
+    if not match:
+        raise argparse.ArgumentTypeError(f"Invalid size: {text!r}")
+    return int(match.group(1)) * SIZE_SUFFIXES[match.group(2)]
+
+
+def generate_values(kind: str, size: int, rng) -> np.ndarray:
+    """Generate `size` values of a monotonic counter, noisy power reading or stuck sensor."""
+    anomalies = rng.choice(size, max(1, int(size * ANOMALY_RATE)), replace=False)
+    if kind == "counter":
+        values = 35000 + np.cumsum(rng.exponential(0.01, size))
+        # Spikes and dips of a single point, as a glitching meter produces them
+        values[anomalies] += rng.choice([-1, 1], len(anomalies)) * 500
+    elif kind == "power":
+        values = np.clip(rng.normal(400, 150, size), 0, None)
+        values[anomalies] = rng.uniform(1500, 5000, len(anomalies))
+    else:
+        # Readings that stay on one value for a while, then jump to the next
+        values = np.repeat(rng.uniform(1, 15, size // 100 + 1), 100)[:size]
+        values[anomalies] = rng.uniform(60, 100, len(anomalies))
+    return np.round(values, 3)
+
+
+class FakeInfluxDBClient:
+    """Stand-in for InfluxDBClient serving synthetic series from memory.
+
+    Understands the SELECT queries of a (chunked) scan, SHOW FIELD KEYS and
+    DELETE statements, and records every query, DELETE statement and written
+    point.
+    """
+
+    def __init__(self, size: int, seed: int = 42):
+        rng = np.random.default_rng(seed)
+        end = time.time_ns()
+        self.times = end - np.arange(size, 0, -1, dtype=np.int64) * (
+            POINT_INTERVAL * 1_000_000_000
+        )
+        self.series = {}  # entity_id -> (measurement, values)
+        for kind, config in DATASETS.items():
+            values = generate_values(kind, size, rng).tolist()
+            self.series[f"bench_{kind}"] = (config["unit"], values)
+        self.reset()
+
+    def reset(self) -> None:
+        self.queries = []
+        self.deletes = []
+        self.writes = []  # Points per write_points call
+
+    def query(self, query, epoch=None, raise_errors=True, **kwargs):
+        self.queries.append(query)
+        statements = query.split("; ")
+        results = [self._statement(s, n) for n, s in enumerate(statements)]
+        return results if len(results) > 1 else results[0]
+
+    def _statement(self, statement: str, statement_id: int):
+        if statement.startswith("DELETE"):
+            self.deletes.append(statement)
+            return ResultSet({"statement_id": statement_id}, raise_errors=False)
+        if statement.startswith("SHOW FIELD KEYS"):
+            # Every synthetic series has one float field
+            series = {
+                "name": re.search(r'FROM "([^"]*)"', statement).group(1),
+                "columns": ["fieldKey", "fieldType"],
+                "values": [["value", "float"]],
+            }
+            return ResultSet({"statement_id": statement_id, "series": [series]})
+
+        entity_id = re.search(r"\"entity_id\" = '([^']*)'", statement).group(1)
+        measurement, values = self.series.get(entity_id, (None, []))
+        if not values or f'FROM "{measurement}"' not in statement:
+            return ResultSet({"statement_id": statement_id})
+        lower, upper = 0, len(values)
+        now = time.time_ns()
+        for op, bound in re.findall(r"time ([<>]=?) (now\(\)[^ ]*|\d+)", statement):
+            if bound.startswith("now()"):
+                offset = bound[len("now()") :]
+                bound = now + (parse_duration(offset) if offset else 0)
+            side = "right" if op in (">", "<=") else "left"
+            position = int(np.searchsorted(self.times, int(bound), side=side))
+            if op.startswith(">"):
+                lower = max(lower, position)
+            else:
+                upper = min(upper, position)
+        times = self.times[lower:upper].tolist()  # Scans query with epoch="ns"
+        rows = [[t, v, entity_id] for t, v in zip(times, values[lower:upper])]
+        series = []
+        if rows:
+            series.append(
+                {
+                    "name": measurement,
+                    "tags": {
+                        "domain": "sensor",
+                        "entity_id": entity_id,
+                        "friendly_name": entity_id,
+                        "source": "HA",
+                    },
+                    "columns": ["time", "value", "friendly_name"],
+                    "values": rows,
+                }
+            )
+        return ResultSet({"statement_id": statement_id, "series": series})
+
+    def write_points(self, points, **kwargs):
+        self.writes.append(len(points))
+        return True
+
+
+def timed(func, repeat: int):
+    """Run `func` `repeat` times, return the best time in seconds and the last result."""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def run_benchmarks(sizes, context_sizes, chunk_duration, repeat, log=print):
+    results = []
+    for size in sizes:
+        client = FakeInfluxDBClient(size)
+        manager = DataManager(client)
+        start_time = f"-{size * POINT_INTERVAL + 60}s"
+        for entity_id, (unit, _) in client.series.items():
+            config = DATASETS[entity_id[len("bench_") :]]
+            for check_type in ("bounds", "monotonicity"):
+                for context_size in context_sizes:
+                    seconds, anomalies = timed(
+                        lambda: manager.scan_data(
+                            unit,
+                            entity_id,
+                            start_time,
+                            "+0s",
+                            context_size,
+                            check_type,
+                            config["min"],
+                            config["max"],
+                            chunk_duration,
+                        ),
+                        repeat,
+                    )
+                    results.append(
+                        {
+                            "name": f"scan/{entity_id}/{check_type}/context={context_size}",
+                            "points": size,
+                            "seconds": seconds,
+                            "points_per_second": size / seconds,
+                            "anomalies": len(anomalies),
+                        }
+                    )
+                    log(_describe(results[-1]))
+
+            # Repairs on the bounds violators of each series
+            manager.scan_data(
+                unit,
+                entity_id,
+                start_time,
+                "+0s",
+                2,
+                "bounds",
+                config["min"],
+                config["max"],
+                chunk_duration,
+            )
+            indices = list(range(len(manager.anomalies)))
+            for name, repair in (
+                ("delete", lambda: manager.delete_selected(indices)),
+                (
+                    "fix",
+                    lambda: manager.fix_selected(
+                        indices, "Average of Previous and Next"
+                    ),
+                ),
+            ):
+                client.reset()
+                seconds, _ = timed(repair, 1)
+                results.append(
+                    {
+                        "name": f"{name}/{entity_id}",
+                        "points": size,
+                        "seconds": seconds,
+                        "anomalies": len(indices),
+                        "requests": len(client.queries) + len(client.writes),
+                        "statements": len(client.deletes),
+                        "points_written": sum(client.writes),
+                    }
+                )
+                log(_describe(results[-1]))
+    return results
+
+
+def canned_response(client: FakeInfluxDBClient) -> bytes:
+    """Return the msgpack /query response of a scan of bench_power, epoch ns."""
+    unit = client.series["bench_power"][0]
+    result = client.query(
+        f'SELECT value, friendly_name FROM "{unit}" WHERE '
+        f"(\"entity_id\" = 'bench_power') GROUP BY *",
+        epoch="ns",
+    )
+    return msgpack.packb({"results": [result.raw]})
+
+
+def decode_like_client(content: bytes):
+    """Decode a response the way InfluxDBClient.query does, then transpose it."""
+    data = msgpack.unpackb(content, ext_hook=_msgpack_parse_hook, raw=False)
+    result = ResultSet(data["results"][0])
+    return [_series_columns(series) for series in result.raw.get("series", [])]
+
+
+def decode_columnar(content: bytes):
+    """Decode a response with connection.decode_columns."""
+    result = decode_columns(content)
+    return [_series_columns(series) for series in result.raw.get("series", [])]
+
+
+def decode_columnar_gc(content: bytes):
+    """Decode a response with connection.decode_columns, garbage collection running."""
+    result = decode_columns(content, pause_gc=False)
+    return [_series_columns(series) for series in result.raw.get("series", [])]
+
+
+def run_decoding_benchmarks(sizes, repeat, log=print):
+    """Time decoding a canned msgpack response of each size, each way."""
+    results = []
+    for size in sizes:
+        content = canned_response(FakeInfluxDBClient(size))
+        for name, decode in (
+            ("decode/client", decode_like_client),
+            ("decode/columnar", decode_columnar),
+            ("decode/columnar-gc", decode_columnar_gc),
+        ):
+            seconds, columns = timed(lambda: decode(content), repeat)
+            results.append(
+                {
+                    "name": name,
+                    "points": size,
+                    "seconds": seconds,
+                    "points_per_second": size / seconds,
+                    "bytes": len(content),
+                }
+            )
+            log(_describe(results[-1]))
+    return results
+
+
+def measure_startup(repeat: int, log=print):
+    """Time the GUI's startup imports in a fresh interpreter, best of `repeat`.
+
+    Returns the total seconds and the cumulative seconds of each module the
+    startup modules import directly, or None if they cannot be imported.
+    """
+    best = None
+    for _ in range(repeat):
+        process = subprocess.run(
+            [
+                sys.executable,
+                "-X",
+                "importtime",
+                "-c",
+                f"import {', '.join(STARTUP_IMPORTS)}",
+            ],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+        )
+        if process.returncode != 0:
+            log(f"Startup imports failed: {process.stderr.strip().splitlines()[-1]}")
+            return None
+        total = 0.0
+        imports = {}
+        children = []  # Direct imports of the next top level module, listed before it
+        for line in process.stderr.splitlines():
+            match = IMPORT_TIME_LINE.match(line)
+            if match is None:
+                continue
+            cumulative = int(match.group(2)) / 1_000_000
+            depth = len(match.group(3)) // 2
+            if depth == 1:
+                children.append((match.group(4), cumulative))
+            elif depth == 0:
+                if match.group(4) in STARTUP_IMPORTS:
+                    total += cumulative
+                    imports[match.group(4)] = cumulative
+                    imports.update(
+                        (f"{match.group(4)}/{name}", seconds)
+                        for name, seconds in children
+                    )
+                children = []
+        if best is None or total < best["seconds"]:
+            best = {"seconds": total, "imports": imports}
+    best["imports"] = dict(sorted(best["imports"].items(), key=lambda item: -item[1]))
+    return best
+
+
+def _describe(result: dict) -> str:
+    text = (
+        f"{result['name']:<45} {result['points']:>10} points "
+        f"{result['seconds']:9.3f}s"
+    )
+    if "anomalies" in result:
+        text += f" {result['anomalies']:>7} anomalies"
+    return text
+
+
+def compare(results: list, baseline_path: str, log=print, startup=None) -> None:
+    """Log the change in time of each benchmark against an earlier results file."""
+    with open(baseline_path) as f:
+        report = json.load(f)
+    baseline = {(r["name"], r["points"]): r["seconds"] for r in report["results"]}
+    if startup is not None and report.get("startup"):
+        before = report["startup"]["seconds"]
+        change = (startup["seconds"] - before) / before * 100
+        log(
+            f"{'startup imports':<45} {'':>10}        "
+            f"{before:9.3f}s -> {startup['seconds']:9.3f}s ({change:+.1f}%)"
+        )
+    for result in results:
+        before = baseline.get((result["name"], result["points"]))
+        if before:
+            change = (result["seconds"] - before) / before * 100
+            log(
+                f"{result['name']:<45} {result['points']:>10} points "
+                f"{before:9.3f}s -> {result['seconds']:9.3f}s ({change:+.1f}%)"
+            )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        type=lambda text: [parse_size(s) for s in text.split(",")],
+        default=[10_000, 1_000_000],
+        help="points per series, e.g. 10k,1M,10M (default: 10k,1M)",
+    )
+    parser.add_argument(
+        "--context-sizes",
+        type=lambda text: [int(s) for s in text.split(",")],
+        default=[1, 2, 5, 20],
+        help="context sizes to scan with (default: 1,2,5,20)",
+    )
+    parser.add_argument("--chunk", default="", help="chunk duration for the scans")
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="runs per scan, best counts"
+    )
+    parser.add_argument("-o", "--output", help="write the JSON results to this file")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    def log(line):
+        print(line, file=sys.stderr)
+
+    startup = measure_startup(max(1, args.repeat), log)
+    if startup is not None:
+        log(f"{'startup imports':<45} {'':>10}        {startup['seconds']:9.3f}s")
+        for name, seconds in list(startup["imports"].items())[:10]:
+            log(f"  {name:<43} {'':>10}        {seconds:9.3f}s")
+    results = run_benchmarks(
+        args.sizes, args.context_sizes, args.chunk, max(1, args.repeat), log
+    )
+    results += run_decoding_benchmarks(args.sizes, max(1, args.repeat), log)
+    report = {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "startup": startup,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=4)
+    else:
+        json.dump(report, sys.stdout, indent=4)
+        print()
+    if args.compare:
+        compare(results, args.compare, log, startup)
+
+
+if __name__ == "__main__":
+    main()
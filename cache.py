@@ -0,0 +1,188 @@
+import json
+import sqlite3
+import threading
+
+
+class SeriesCache:
+    """On-disk SQLite cache of fetched series, keyed by measurement and entity_id.
+
+    Points are stored with epoch nanosecond timestamps. The coverage table
+    records the time range (exclusive bounds) that is fully cached per entity,
+    so scans only need to fetch what lies outside of it.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()  # One connection per thread
+        with self._connect() as db:
+            db.executescript("""
+                CREATE TABLE IF NOT EXISTS series (
+                    id INTEGER PRIMARY KEY,
+                    measurement TEXT NOT NULL,
+                    entity_id TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    tags TEXT NOT NULL,
+                    UNIQUE (measurement, entity_id, key)
+                );
+                CREATE TABLE IF NOT EXISTS points (
+                    series_id INTEGER NOT NULL,
+                    time INTEGER NOT NULL,
+                    value,
+                    friendly_name TEXT,
+                    PRIMARY KEY (series_id, time)
+                ) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS coverage (
+                    measurement TEXT NOT NULL,
+                    entity_id TEXT NOT NULL,
+                    start_ns INTEGER NOT NULL,
+                    end_ns INTEGER NOT NULL,
+                    PRIMARY KEY (measurement, entity_id)
+                );
+                """)
+
+    def _connect(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def coverage(self, measurement: str, entity_id: str):
+        """Return the cached (start, end) range in epoch ns, or None."""
+        row = (
+            self._connect()
+            .execute(
+                "SELECT start_ns, end_ns FROM coverage "
+                "WHERE measurement = ? AND entity_id = ?",
+                (measurement, entity_id),
+            )
+            .fetchone()
+        )
+        return tuple(row) if row else None
+
+    def set_coverage(self, measurement: str, entity_id: str, start: int, end: int):
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO coverage VALUES (?, ?, ?, ?)",
+                (measurement, entity_id, start, end),
+            )
+
+    def clear(self, measurement: str, entity_id: str) -> None:
+        """Drop all cached points and the coverage of an entity."""
+        with self._connect() as db:
+            db.execute(
+                "DELETE FROM points WHERE series_id IN "
+                "(SELECT id FROM series WHERE measurement = ? AND entity_id = ?)",
+                (measurement, entity_id),
+            )
+            db.execute(
+                "DELETE FROM coverage WHERE measurement = ? AND entity_id = ?",
+                (measurement, entity_id),
+            )
+
+    def store(self, measurement: str, entity_id: str, key: str, series: dict):
+        """Store a raw series fetched with epoch='ns'."""
+        columns = series["columns"]
+        rows = series.get("values", [])
+        if not rows:
+            return
+        time_col = columns.index("time")
+        value_col = columns.index("value")
+        name_col = (
+            columns.index("friendly_name") if "friendly_name" in columns else None
+        )
+        with self._connect() as db:
+            series_id = self._series_id(db, measurement, entity_id, key, series)
+            db.executemany(
+                "INSERT OR REPLACE INTO points VALUES (?, ?, ?, ?)",
+                (
+                    (
+                        series_id,
+                        row[time_col],
+                        row[value_col],
+                        row[name_col] if name_col is not None else None,
+                    )
+                    for row in rows
+                ),
+            )
+
+    @staticmethod
+    def _series_id(db, measurement, entity_id, key, series) -> int:
+        db.execute(
+            "INSERT OR IGNORE INTO series (measurement, entity_id, key, tags) "
+            "VALUES (?, ?, ?, ?)",
+            (measurement, entity_id, key, json.dumps(series.get("tags") or {})),
+        )
+        return db.execute(
+            "SELECT id FROM series WHERE measurement = ? AND entity_id = ? AND key = ?",
+            (measurement, entity_id, key),
+        ).fetchone()[0]
+
+    def iter_series(
+        self, measurement: str, entity_id: str, start: int, end: int, chunk_size: int
+    ):
+        """Yield (key, raw series chunk) for points with start < time < end.
+
+        Series come in key order and points in time order, `chunk_size` rows
+        per chunk, with epoch ns times like a query made with epoch='ns'.
+        """
+        db = self._connect()
+        series_rows = db.execute(
+            "SELECT id, key, tags FROM series "
+            "WHERE measurement = ? AND entity_id = ? ORDER BY key",
+            (measurement, entity_id),
+        ).fetchall()
+        for series_id, key, tags in series_rows:
+            cursor = db.execute(
+                "SELECT time, value, friendly_name FROM points "
+                "WHERE series_id = ? AND time > ? AND time < ? ORDER BY time",
+                (series_id, start, end),
+            )
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield key, {
+                    "name": measurement,
+                    "tags": json.loads(tags),
+                    "columns": ["time", "value", "friendly_name"],
+                    "values": rows,
+                }
+
+    def delete_points(
+        self, measurement: str, entity_id: str, times: list, tags: dict = None
+    ) -> None:
+        """Remove the points at the given epoch ns times from the series of an entity.
+
+        With `tags`, only from the series with that tag set (empty tag values
+        left out), else from every series of the entity.
+        """
+        with self._connect() as db:
+            series_ids = [
+                series_id
+                for series_id, series_tags in db.execute(
+                    "SELECT id, tags FROM series WHERE measurement = ? AND entity_id = ?",
+                    (measurement, entity_id),
+                )
+                if tags is None
+                or {k: v for k, v in json.loads(series_tags).items() if v} == tags
+            ]
+            db.executemany(
+                "DELETE FROM points WHERE series_id = ? AND time = ?",
+                ((series_id, t) for series_id in series_ids for t in times),
+            )
+
+    def update_points(self, measurement: str, entity_id: str, updates: list) -> None:
+        """Patch cached values from (epoch ns time, friendly_name, value) tuples."""
+        with self._connect() as db:
+            db.executemany(
+                "UPDATE points SET value = ? WHERE time = ? "
+                "AND friendly_name IS ? AND series_id IN "
+                "(SELECT id FROM series WHERE measurement = ? AND entity_id = ?)",
+                (
+                    (value, t, friendly_name, measurement, entity_id)
+                    for t, friendly_name, value in updates
+                ),
+            )
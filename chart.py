@@ -0,0 +1,280 @@
+import time
+import tkinter as tk
+from bisect import bisect_left, bisect_right
+
+try:
+    import ttkbootstrap as ttk
+except ImportError:
+    from tkinter import ttk
+
+# Canvas margins in pixels: left for the value axis, bottom for the time axis
+MARGIN_LEFT = 70
+MARGIN_RIGHT = 10
+MARGIN_TOP = 10
+MARGIN_BOTTOM = 22
+
+# Drags narrower than this many pixels are clicks, not zooms
+MIN_ZOOM_DRAG = 5
+
+# Radius of an anomaly marker and how close a click must be to hit one
+MARKER_RADIUS = 3
+MARKER_HIT_RADIUS = 6
+
+# Narrowest window zooming can reach, in nanoseconds
+MIN_WINDOW = 1_000_000_000
+
+
+class OverviewChart:
+    """Canvas plot of one series with its anomalies marked.
+
+    The plot draws decimated points from `DataManager.fetch_overview`: each
+    time bucket is a vertical stroke from its minimum to its maximum, so
+    narrow spikes stay visible however many points a pixel covers. Dragging
+    across the plot zooms into a time window, the mouse wheel zooms around
+    the pointer and a right click shows the whole range again. Zooming calls
+    `on_zoom(start, end)` so the owner can fetch the window at a finer
+    resolution; until then the coarse points are stretched. Clicking a marker
+    calls `on_select(idx)` with its anomaly index.
+    """
+
+    def __init__(self, parent, on_zoom, on_select, height: int = 180):
+        self.on_zoom = on_zoom
+        self.on_select = on_select
+        self.canvas = tk.Canvas(parent, height=height, highlightthickness=0)
+        self.canvas.bind("<Configure>", lambda e: self.redraw())
+        self.canvas.bind("<ButtonPress-1>", self._press)
+        self.canvas.bind("<B1-Motion>", self._drag)
+        self.canvas.bind("<ButtonRelease-1>", self._release)
+        self.canvas.bind("<Button-3>", lambda e: self.reset_zoom())
+        self.canvas.bind("<MouseWheel>", self._wheel)  # Windows and macOS
+        self.canvas.bind("<Button-4>", lambda e: self.zoom_at(e.x, 0.5))  # X11
+        self.canvas.bind("<Button-5>", lambda e: self.zoom_at(e.x, 2.0))
+        self.title = ""
+        self.range = None  # Scanned (start, end) in epoch ns
+        self.window = None  # Visible (start, end) in epoch ns
+        self.overview = None  # Points as returned by fetch_overview
+        self.markers = []  # (epoch ns, value, anomaly index), in time order
+        self.selected = None  # Anomaly index of the highlighted marker
+        self.drag_start = None
+
+    def pack(self, **kwargs) -> None:
+        self.canvas.pack(**kwargs)
+
+    def set_series(self, title: str, start: int, end: int, markers: list) -> None:
+        """Show a new series over the scanned range, before its points arrive."""
+        self.title = title
+        self.range = self.window = (start, end)
+        self.overview = None
+        self.markers = sorted(markers, key=lambda marker: marker[0])
+        self.selected = None
+        self.redraw()
+
+    def clear(self) -> None:
+        self.title = ""
+        self.range = self.window = self.overview = None
+        self.markers = []
+        self.selected = None
+        self.redraw()
+
+    def set_overview(self, start: int, end: int, overview: dict) -> None:
+        """Show fetched points, unless the chart moved to another window meanwhile."""
+        if (start, end) == self.window:
+            self.overview = overview
+            self.redraw()
+
+    def select(self, idx) -> None:
+        """Highlight the marker of an anomaly, zooming out if it is not visible."""
+        self.selected = idx
+        for t, _, marker_idx in self.markers:
+            if marker_idx == idx and not self.window[0] <= t < self.window[1]:
+                self.reset_zoom()
+                return
+        self.redraw()
+
+    def reset_zoom(self) -> None:
+        if self.range is not None and self.window != self.range:
+            self._zoom(*self.range)
+
+    def zoom_at(self, x: int, factor: float) -> None:
+        """Scale the visible window by `factor`, keeping the time under `x` in place."""
+        if self.window is None:
+            return
+        start, end = self.window
+        anchor = self._time_at(x)
+        full = self.range[1] - self.range[0]
+        width = min(full, max(MIN_WINDOW, int((end - start) * factor)))
+        start = anchor - int((anchor - start) * width / (end - start))
+        start = max(self.range[0], min(start, self.range[1] - width))
+        self._zoom(start, min(self.range[1], start + width))
+
+    def _zoom(self, start: int, end: int) -> None:
+        self.window = (start, end)
+        self.redraw()
+        self.on_zoom(start, end)
+
+    def _plot_area(self):
+        width = max(self.canvas.winfo_width(), MARGIN_LEFT + MARGIN_RIGHT + 1)
+        height = max(self.canvas.winfo_height(), MARGIN_TOP + MARGIN_BOTTOM + 1)
+        return MARGIN_LEFT, MARGIN_TOP, width - MARGIN_RIGHT, height - MARGIN_BOTTOM
+
+    def plot_width(self) -> int:
+        """Width of the plot area in pixels, i.e. the useful number of buckets."""
+        left, _, right, _ = self._plot_area()
+        return right - left
+
+    def _time_at(self, x: int) -> int:
+        left, _, right, _ = self._plot_area()
+        start, end = self.window
+        x = min(max(x, left), right)
+        return start + int((x - left) * (end - start) / (right - left))
+
+    def _colors(self):
+        style = ttk.Style()
+        background = style.lookup("TFrame", "background") or "white"
+        foreground = style.lookup("TLabel", "foreground") or "black"
+        return background, foreground
+
+    def redraw(self) -> None:
+        canvas = self.canvas
+        canvas.delete("all")
+        background, foreground = self._colors()
+        canvas.configure(background=background)
+        left, top, right, bottom = self._plot_area()
+        canvas.create_rectangle(left, top, right, bottom, outline=foreground)
+        if self.window is None:
+            return
+        start, end = self.window
+        span = max(end - start, 1)
+
+        # Only what lies in the window decides the value scale
+        times, lows, highs = [], [], []
+        if self.overview is not None:
+            all_times = self.overview["times"]
+            first = max(bisect_left(all_times, start) - 1, 0)
+            last = bisect_right(all_times, end) + 1
+            times = all_times[first:last]
+            lows = self.overview["lows"][first:last]
+            highs = self.overview["highs"][first:last]
+        first = bisect_left(self.markers, (start,))
+        last = bisect_left(self.markers, (end,))
+        markers = [m for m in self.markers[first:last] if m[1] is not None]
+        values = [v for v in lows + highs if v is not None]
+        values += [m[1] for m in markers]
+        low = min(values, default=0.0)
+        high = max(values, default=1.0)
+        if high == low:
+            low, high = low - 1, high + 1
+
+        def x_of(t):
+            return left + (t - start) * (right - left) / span
+
+        def y_of(v):
+            return bottom - (v - low) * (bottom - top) / (high - low)
+
+        # One stroke per bucket from min to max, joined into a single polyline
+        coords = []
+        for t, lo, hi in zip(times, lows, highs):
+            if lo is None or hi is None:
+                continue
+            x = x_of(t)
+            coords.extend((x, y_of(lo)))
+            if hi != lo:
+                coords.extend((x, y_of(hi)))
+        if len(coords) >= 4:
+            canvas.create_line(*coords, fill="#2780e3")
+        elif coords:
+            x, y = coords
+            canvas.create_oval(x - 1, y - 1, x + 1, y + 1, outline="#2780e3")
+        for t, v, idx in markers:
+            x, y = x_of(t), y_of(v)
+            r = MARKER_RADIUS + (2 if idx == self.selected else 0)
+            canvas.create_oval(
+                x - r,
+                y - r,
+                x + r,
+                y + r,
+                fill="#ff7851" if idx == self.selected else "#d9534f",
+                outline=foreground if idx == self.selected else "",
+                tags=f"anomaly{idx}",
+            )
+
+        # Cover the line segments leading to points just outside the window
+        canvas.create_rectangle(0, 0, left, bottom, fill=background, outline="")
+        canvas.create_rectangle(
+            right + 1, 0, right + MARGIN_RIGHT, bottom, fill=background, outline=""
+        )
+        canvas.create_rectangle(left, top, right, bottom, outline=foreground)
+        canvas.create_text(
+            left - 4, top, text=f"{high:.6g}", anchor="ne", fill=foreground
+        )
+        canvas.create_text(
+            left - 4, bottom, text=f"{low:.6g}", anchor="se", fill=foreground
+        )
+        for x, anchor in ((left, "nw"), (right, "ne")):
+            canvas.create_text(
+                x,
+                bottom + 4,
+                text=self._format_time(self._time_at(x), span),
+                anchor=anchor,
+                fill=foreground,
+            )
+        status = self.title
+        if self.overview is None:
+            status += " (loading...)"
+        elif not self.overview["raw"]:
+            status += " (min/max per pixel, drag to zoom)"
+        canvas.create_text(
+            (left + right) / 2, bottom + 4, text=status, anchor="n", fill=foreground
+        )
+
+    @staticmethod
+    def _format_time(t: int, span: int) -> str:
+        seconds = t // 1_000_000_000
+        if span < 2 * 86_400_000_000_000:
+            return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(seconds))
+        return time.strftime("%Y-%m-%d", time.localtime(seconds))
+
+    def _marker_at(self, x: int, y: int):
+        """Return the anomaly index of the marker under (x, y), or None."""
+        for item in self.canvas.find_overlapping(
+            x - MARKER_HIT_RADIUS,
+            y - MARKER_HIT_RADIUS,
+            x + MARKER_HIT_RADIUS,
+            y + MARKER_HIT_RADIUS,
+        ):
+            for tag in self.canvas.gettags(item):
+                if tag.startswith("anomaly"):
+                    return int(tag[len("anomaly") :])
+        return None
+
+    def _press(self, event) -> None:
+        self.drag_start = event.x
+
+    def _drag(self, event) -> None:
+        if self.drag_start is None or self.window is None:
+            return
+        _, top, _, bottom = self._plot_area()
+        self.canvas.delete("zoombox")
+        self.canvas.create_rectangle(
+            self.drag_start, top, event.x, bottom, outline="#ff7851", tags="zoombox"
+        )
+
+    def _release(self, event) -> None:
+        drag_start, self.drag_start = self.drag_start, None
+        self.canvas.delete("zoombox")
+        if drag_start is None or self.window is None:
+            return
+        if abs(event.x - drag_start) >= MIN_ZOOM_DRAG:
+            start, end = sorted((self._time_at(drag_start), self._time_at(event.x)))
+            if end - start < MIN_WINDOW:
+                end = start + MIN_WINDOW
+            self._zoom(start, end)
+            return
+        idx = self._marker_at(event.x, event.y)
+        if idx is not None:
+            self.selected = idx
+            self.redraw()
+            self.on_select(idx)
+
+    def _wheel(self, event) -> None:
+        self.zoom_at(event.x, 0.5 if event.delta > 0 else 2.0)
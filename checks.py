@@ -0,0 +1,44 @@
+# Check names with their labels, in the order the UI lists them. Kept apart
+# from detection so the GUI can start without importing numpy.
+CHECKS = {
+    "bounds": "Bounds Check",
+    "monotonicity": "Monotonicity Check",
+    "rate": "Rate of Change",
+    "zscore": "Z-Score Outliers",
+    "mad": "MAD Outliers",
+    "stuck": "Stuck Values",
+    "gaps": "Gaps",
+    "duplicates": "Duplicate Times",
+    "counter_reset": "Counter Resets",
+}
+
+# Entity config keys the detectors read, besides min and max
+DETECTOR_OPTIONS = (
+    "max_rate",  # Rate of change: units per second
+    "zscore",  # Z-score: standard deviations, default 4
+    "zscore_window",  # Z-score: neighbours on either side, default 30, at most 1000
+    "mad",  # MAD: scaled median absolute deviations, default 4
+    "mad_window",  # MAD: neighbours on either side, default 30, at most 1000
+    "stuck_run",  # Stuck values: equal values in a row, default 30
+    "max_gap",  # Gaps: seconds without data, default 3600
+    "reset_drop",  # Counter resets: smallest drop flagged, default any
+)
+
+# Largest zscore_window and mad_window, their detectors take O(points * window)
+MAX_DETECTOR_WINDOW = 1000
+
+# Check type that runs the detectors listed under 'checks' in the entity config
+CONFIGURED_CHECKS = "configured"
+
+
+def check_names(check_type: str, options: dict) -> list:
+    """Return the detector names of a check: one name, several comma-separated or CONFIGURED_CHECKS."""
+    if check_type == CONFIGURED_CHECKS:
+        names = options.get("checks") or ["bounds"]
+    else:
+        names = check_type.split(",")
+    names = [name.strip() for name in names if name.strip()]
+    unknown = [name for name in names if name not in CHECKS]
+    if unknown or not names:
+        raise ValueError(f"Unknown check type: {', '.join(unknown) or check_type!r}")
+    return names
@@ -0,0 +1,268 @@
+import argparse
+import csv
+import json
+import sys
+
+from profiling import profiler
+
+# Process exit codes of a headless run
+EXIT_CLEAN = 0  # No anomalies found
+EXIT_ANOMALIES = 1  # Anomalies found (even if they were deleted or fixed)
+EXIT_ERROR = 2  # An entity could not be scanned or a delete/fix failed
+
+FIX_METHODS = {
+    "previous": "Previous Value",
+    "next": "Next Value",
+    "average": "Average of Previous and Next",
+    "interpolate": "Linear Interpolation",
+}
+
+CSV_FIELDS = [
+    "entity_id",
+    "measurement",
+    "friendly_name",
+    "time",
+    "value",
+    "prev_value",
+    "next_value",
+]
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Find and repair anomalies in Home Assistant data in InfluxDB."
+    )
+    parser.add_argument(
+        "--headless",
+        action="store_true",
+        help="scan without the GUI, e.g. from cron",
+    )
+    headless = parser.add_argument_group("headless options")
+    headless.add_argument(
+        "-e",
+        "--entity",
+        action="append",
+        dest="entities",
+        metavar="ENTITY_ID",
+        help="entity to scan, may be repeated (default: all configured entities)",
+    )
+    headless.add_argument(
+        "--start", default="-200d", help="range start relative to now (%(default)s)"
+    )
+    headless.add_argument(
+        "--end", default="-0s", help="range end relative to now (%(default)s)"
+    )
+    headless.add_argument(
+        "--check",
+        default="bounds",
+        help="detector, comma-separated detectors or 'configured' to run the "
+        "entity's configured checks (%(default)s)",
+    )
+    headless.add_argument("--context", type=int, default=2, help="context size")
+    headless.add_argument(
+        "--chunk", default="", help="chunk duration such as 7d (default: none)"
+    )
+    headless.add_argument(
+        "--prefilter",
+        action="store_true",
+        help="filter bounds on the server (bounds check only, without --chunk)",
+    )
+    headless.add_argument(
+        "--use-cache", action="store_true", help="scan from the local cache"
+    )
+    headless.add_argument(
+        "--incremental",
+        action="store_true",
+        help="only scan points added since the last incremental scan (not with --use-cache)",
+    )
+    headless.add_argument(
+        "--async-requests",
+        type=int,
+        default=0,
+        metavar="N",
+        help="use the asyncio client with up to N concurrent requests (needs aiohttp)",
+    )
+    headless.add_argument(
+        "--profile",
+        metavar="DIR",
+        help="write a cProfile file per scan, delete and fix to DIR",
+    )
+    headless.add_argument(
+        "-o", "--output", default="-", help="anomaly file, '-' for stdout (default)"
+    )
+    headless.add_argument(
+        "--format",
+        choices=("json", "csv"),
+        help="output format (default: from the file extension, else json)",
+    )
+    repair = headless.add_mutually_exclusive_group()
+    repair.add_argument(
+        "--delete", action="store_true", help="delete all anomalies found"
+    )
+    repair.add_argument(
+        "--fix", choices=sorted(FIX_METHODS), help="fix all anomalies found"
+    )
+    headless.add_argument(
+        "--ranges",
+        action="store_true",
+        help="delete runs of consecutive anomalies with one statement each",
+    )
+    headless.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="with --delete or --fix, list the changes without making them",
+    )
+    headless.add_argument(
+        "--undo",
+        action="store_true",
+        help="restore the points of the last delete or fix from the journal and exit",
+    )
+    return parser
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """Parse the command line, rejecting options that would be silently ignored."""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.ranges and not args.delete:
+        parser.error("--ranges needs --delete")
+    if args.dry_run and not (args.delete or args.fix):
+        parser.error("--dry-run needs --delete or --fix")
+    return args
+
+
+def write_anomalies(anomalies, output, fmt: str) -> None:
+    """Write an AnomalyStore to an open file as JSON (with context) or CSV."""
+    if fmt == "csv":
+        writer = csv.DictWriter(output, fieldnames=CSV_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(anomalies)
+    else:
+        json.dump(list(anomalies), output, indent=4)
+        output.write("\n")
+
+
+def format_change(change: dict) -> str:
+    """One line per change of a --dry-run preview."""
+    where = f"{change['measurement']} {change['entity_id']} {change['time']}"
+    if change["action"] == "delete":
+        return f"delete {where} (value {change['old_value']})"
+    return f"fix {where}: {change['old_value']} -> {change['new_value']}"
+
+
+def run_headless(args, config_manager, data_manager) -> int:
+    """Scan, report and optionally repair without a GUI. Returns the exit code.
+
+    `data_manager` may be an AsyncDataManager, whose coroutines are run on
+    one event loop so its client session is reused throughout.
+    """
+    import asyncio  # Not needed to build the parser, which the GUI does too
+
+    if not asyncio.iscoroutinefunction(data_manager.scan_all):
+        return _run_headless(args, config_manager, data_manager, lambda result: result)
+    if args.prefilter or args.use_cache or args.incremental:
+        print(
+            "--prefilter, --use-cache and --incremental need the blocking client",
+            file=sys.stderr,
+        )
+        return EXIT_ERROR
+    loop = asyncio.new_event_loop()
+    try:
+        return _run_headless(
+            args, config_manager, data_manager, loop.run_until_complete
+        )
+    finally:
+        loop.run_until_complete(data_manager.client.close())
+        loop.close()
+
+
+def _run_headless(args, config_manager, data_manager, wait) -> int:
+    from data import REQUEST_ERRORS
+
+    entities = config_manager.get_entities()
+    unknown = [e for e in args.entities or [] if e not in entities]
+    if unknown:
+        print(f"Unknown entities: {', '.join(unknown)}", file=sys.stderr)
+        return EXIT_ERROR
+    selected = {e: entities[e] for e in args.entities or entities}
+    profiler.profile_dir = args.profile
+
+    if args.undo:
+        description, restored, errors = wait(data_manager.undo_last())
+        if description is None and not errors:
+            print("Nothing to undo", file=sys.stderr)
+        elif description is not None:
+            print(
+                f"Undo '{description}': restored {restored} point(s)", file=sys.stderr
+            )
+        for error in errors:
+            print(error, file=sys.stderr)
+        return EXIT_ERROR if errors else EXIT_CLEAN
+
+    options = {"chunk_duration": args.chunk}
+    if args.prefilter or args.use_cache or args.incremental:
+        options.update(
+            prefilter=args.prefilter,
+            use_cache=args.use_cache,
+            incremental=args.incremental,
+        )
+    try:
+        anomalies, summaries = wait(
+            data_manager.scan_all(
+                selected, args.start, args.end, args.context, args.check, **options
+            )
+        )
+    except (ValueError, *REQUEST_ERRORS) as e:
+        print(f"Scan failed: {e}", file=sys.stderr)
+        return EXIT_ERROR
+
+    failed = False
+    for summary in summaries:
+        if summary["error"]:
+            failed = True
+            print(f"{summary['entity_id']}: error: {summary['error']}", file=sys.stderr)
+        else:
+            print(
+                f"{summary['entity_id']}: {summary['anomalies']} anomalies in "
+                f"{summary['points']} points ({summary['duration']:.1f}s)",
+                file=sys.stderr,
+            )
+
+    if data_manager.last_scan is not None:
+        print(data_manager.last_scan.summary(), file=sys.stderr)
+
+    fmt = args.format or ("csv" if args.output.lower().endswith(".csv") else "json")
+    if args.output == "-":
+        write_anomalies(anomalies, sys.stdout, fmt)
+    else:
+        with open(args.output, "w", newline="") as f:
+            write_anomalies(anomalies, f, fmt)
+
+    indices = list(range(len(anomalies)))
+    errors = []
+    if args.dry_run and (args.delete or args.fix) and indices:
+        if args.delete:
+            changes = data_manager.preview_delete(indices, ranges=args.ranges)
+        else:
+            changes, errors = wait(
+                data_manager.preview_fix(indices, FIX_METHODS[args.fix])
+            )
+        for change in changes:
+            print(format_change(change), file=sys.stderr)
+        print(
+            f"Would {'delete' if args.delete else 'fix'} {len(changes)} of "
+            f"{len(indices)} anomalies",
+            file=sys.stderr,
+        )
+    elif args.delete and indices:
+        done, errors = wait(data_manager.delete_selected(indices, ranges=args.ranges))
+        print(f"Deleted {len(done)} of {len(indices)} anomalies", file=sys.stderr)
+    elif args.fix and indices:
+        done, errors = wait(data_manager.fix_selected(indices, FIX_METHODS[args.fix]))
+        print(f"Fixed {len(done)} of {len(indices)} anomalies", file=sys.stderr)
+    for error in errors:
+        print(error, file=sys.stderr)
+
+    if failed or errors:
+        return EXIT_ERROR
+    return EXIT_ANOMALIES if anomalies else EXIT_CLEAN
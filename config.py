@@ -1,7 +1,11 @@
 import json
+import logging
 import os
 from typing import Dict
 
+# Not logger.warning(): headless runs write their anomalies to stdout
+logger = logging.getLogger(__name__)
+
 
 class InfluxDBConfig:
     """Handles loading and validating InfluxDB configuration."""
@@ -13,6 +17,16 @@ class InfluxDBConfig:
             "username": "admin",
             "password": "admin",
             "database": "default",
+            "write_batch_size": 5000,
+            "scan_workers": 4,
+            "pool_size": 10,
+            "connect_timeout": 10,
+            "read_timeout": 300,
+            "retries": 3,
+            "retry_backoff": 0.5,
+            "gzip": True,
+            "columnar_decoding": False,
+            "scan_processes": 0,
         },
         "entities": {
             "hm800_ch2_power": {"unit": "W", "min": 0, "max": 1000},
@@ -31,7 +45,7 @@ class InfluxDBConfig:
     def load_config(self) -> Dict:
         """Load configuration from file, filling in missing or invalid sections with defaults."""
         if not os.path.exists(self.config_path):
-            print(
+            logger.warning(
                 f"Config file not found at {self.config_path}. Creating with defaults."
             )
             self.save_config(self.DEFAULT_CONFIG)
@@ -41,7 +55,7 @@ class InfluxDBConfig:
             with open(self.config_path, "r") as f:
                 config = json.load(f)
         except json.JSONDecodeError as e:
-            print(f"Invalid JSON in config file: {e}. Resetting to defaults.")
+            logger.warning(f"Invalid JSON in config file: {e}. Resetting to defaults.")
             self.save_config(self.DEFAULT_CONFIG)
             return self.DEFAULT_CONFIG.copy()
 
@@ -58,7 +72,7 @@ class InfluxDBConfig:
         ):
             final_config["influxdb"] = config["influxdb"]
         else:
-            print("Invalid or missing 'influxdb' section. Using default.")
+            logger.warning("Invalid or missing 'influxdb' section. Using default.")
             final_config["influxdb"] = self.DEFAULT_CONFIG["influxdb"]
             modified = True
 
@@ -66,13 +80,13 @@ class InfluxDBConfig:
         if "entities" in config and isinstance(config["entities"], dict):
             final_config["entities"] = config["entities"]
         else:
-            print("Invalid or missing 'entities' section. Using default.")
+            logger.warning("Invalid or missing 'entities' section. Using default.")
             final_config["entities"] = self.DEFAULT_CONFIG["entities"]
             modified = True
 
         # If we modified anything, save the updated config
         if modified:
-            print(
+            logger.warning(
                 f"Config at {self.config_path} was incomplete or invalid. Updated with defaults."
             )
             self.save_config(final_config)
@@ -1,12 +1,435 @@
+import asyncio
+import logging
+import multiprocessing
+import threading
+import time
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from functools import partial
+
+import requests
 from influxdb import InfluxDBClient
+from influxdb.exceptions import InfluxDBClientError, InfluxDBServerError
+
+from anomalies import AnomalyStore, SeriesPoints
+from checks import check_names
+from detection import (
+    build_detectors,
+    detect_bounds,
+    run_detectors,
+    run_detectors_sharded,
+    suppress_consecutive,
+    to_time_array,
+    to_value_array,
+)
+from jobs import OperationCancelled
+from profiling import profiler, span
+from timestamps import parse_duration
+
+logger = logging.getLogger(__name__)
+
+# Errors a single InfluxDB request can fail with, handled per batch
+REQUEST_ERRORS = (
+    InfluxDBClientError,
+    InfluxDBServerError,
+    requests.exceptions.RequestException,
+)
+
+# Characters per multi-statement request, keeps the query URL within common proxy limits
+QUERY_BATCH_MAX_LENGTH = 8000
+
+# Points per write request when fixing anomalies
+WRITE_BATCH_SIZE = 5000
+
+# Entities scanned concurrently by scan_all, stays below the client's connection pool size
+SCAN_WORKERS = 4
+
+# Worker processes that split detection of long series, 0 or 1 detects in the scanning thread
+SCAN_PROCESSES = 0
+
+# Requests an AsyncDataManager keeps in flight, scan chunks fetched ahead included
+ASYNC_CONCURRENCY = 8
+
+# Cached scans skip fetching new points if the cache is younger than this
+CACHE_REFRESH_INTERVAL = "5m"
+
+# Rows read from the local cache at a time
+CACHE_READ_CHUNK = 100_000
+
+# Overview windows with at most this many points per bucket are plotted raw
+OVERVIEW_RAW_PER_BUCKET = 2
+
+
+def batch_statements(statements: list, max_length: int) -> list:
+    """Split statements into lists whose joined length stays within `max_length`."""
+    batches = []
+    batch, length = [], 0
+    for statement in statements:
+        if batch and length + len(statement) + 2 > max_length:
+            batches.append(batch)
+            batch, length = [], 0
+        batch.append(statement)
+        length += len(statement) + 2
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def _snapshot_queries(statements: list, max_length: int) -> list:
+    """Turn DELETE statements into requests selecting the points they would remove."""
+    selects = [
+        "SELECT *" + statement[len("DELETE") :] + " GROUP BY *"
+        for statement in statements
+    ]
+    return ["; ".join(batch) for batch in batch_statements(selects, max_length)]
+
+
+def _field_types(result) -> dict:
+    """Map field keys to their types from a SHOW FIELD KEYS result."""
+    return {point["fieldKey"]: point["fieldType"] for point in result.get_points()}
+
+
+def _field_value(value, field_type: str):
+    """Convert a value to the type of the field it is written to, float unless integer."""
+    if field_type in ("integer", "unsigned"):
+        return int(round(value))
+    return float(value)
+
+
+def _journal_points(measurement: str, results, field_types: dict) -> list:
+    """Return the rows of SELECT * ... GROUP BY * results as points for write_points.
+
+    Float fields holding whole numbers are decoded as ints, so they are
+    converted back to keep the field type when the points are restored.
+    """
+    if not isinstance(results, list):
+        results = [results]
+    points = []
+    for result in results:
+        for series in result.raw.get("series", []):
+            tags = _series_tags(series)
+            columns = series["columns"]
+            for row in series.get("values", []):
+                fields = {
+                    column: (
+                        float(value) if field_types.get(column) == "float" else value
+                    )
+                    for column, value in zip(columns[1:], row[1:])
+                    if value is not None
+                }
+                if fields:
+                    points.append(
+                        {
+                            "measurement": measurement,
+                            "tags": tags,
+                            "time": row[0],
+                            "fields": fields,
+                        }
+                    )
+    return points
+
+
+def _quote(value) -> str:
+    """Escape a tag value for use inside a single-quoted InfluxQL string."""
+    return str(value).replace("\\", "\\\\").replace("'", "\\'")
+
+
+def _scan_select(unit: str, entity_id: str) -> str:
+    """Return the start of a scan query of an entity, completed by its time bounds."""
+    return (
+        f'SELECT value, friendly_name FROM "{unit}" WHERE '
+        f"(\"entity_id\" = '{_quote(entity_id)}') AND "
+    )
+
+
+def _series_key(series: dict) -> str:
+    """Return the series key (measurement plus sorted tags) as InfluxDB orders it."""
+    tags = series.get("tags") or {}
+    return ",".join(
+        [series.get("name", "")] + [f"{k}={v}" for k, v in sorted(tags.items())]
+    )
+
+
+def _series_tags(series: dict) -> dict:
+    """Return the tag set of a GROUP BY * series.
+
+    Tag keys of the measurement that this series does not have are reported
+    with empty values and left out.
+    """
+    return {k: v for k, v in (series.get("tags") or {}).items() if v}
+
+
+def _series_columns(series: dict):
+    """Return the time, value and friendly_name columns of a raw series.
+
+    Series are queried with epoch='ns', so times are epoch nanosecond ints.
+    """
+    columns = series["columns"]
+    if "data" in series:
+        cols = series["data"]  # Decoded column-wise, see connection.decode_columns
+        if not cols:
+            return (), (), ()
+    else:
+        rows = series.get("values", [])
+        if not rows:
+            return (), (), ()
+        with span("iterate"):
+            # Transpose rows into columns once instead of building a dict per point
+            cols = list(zip(*rows))
+    friendly_names = (
+        cols[columns.index("friendly_name")]
+        if "friendly_name" in columns
+        else (None,) * len(cols[0])
+    )
+    return cols[columns.index("time")], cols[columns.index("value")], friendly_names
+
+
+def _detectors(
+    check_type: str, context_size: int, min_val: float, max_val: float, options
+) -> list:
+    """Build the detectors of a scan from the entity options, with the given bounds."""
+    return build_detectors(
+        check_type, context_size, {**(options or {}), "min": min_val, "max": max_val}
+    )
+
+
+def _feed_result(scans: dict, result, *args) -> None:
+    """Feed each series of a query result to its _SeriesScan, created from `args`."""
+    for series in result.raw.get("series", []):
+        key = _series_key(series)
+        if key not in scans:
+            scans[key] = _SeriesScan(*args)
+        scans[key].feed(series)
+
+
+def _range_queries(select: str, start: int, end: int, step: int):
+    """Yield queries tiling start < time < end (epoch ns), `step` ns per query."""
+    lower = ">"
+    while start < end:
+        upper = min(start + step, end)
+        yield select + f"time {lower} {start} AND time < {upper} GROUP BY *"
+        start = upper
+        lower = ">="
+
+
+def _finish_scans(scans: dict, context_size: int) -> AnomalyStore:
+    """Finish per-series scans and apply the consecutive-flag rule across them.
+
+    Series are taken in key order, as InfluxDB returns them, so the result
+    matches a single-pass scan over the whole response.
+    """
+    store = AnomalyStore(context_size)
+    last_flagged_idx = (
+        -2
+    )  # Track the index of the last flagged anomaly to avoid consecutive flagging
+    for key in sorted(scans):
+        scan = scans[key]
+        scan.finish()
+        if scan.last_flagged_idx is not None:
+            last_flagged_idx = scan.last_flagged_idx  # Resumed incremental scan
+        with span("records"):
+            kept, chain = suppress_consecutive(
+                [c[0] for c in scan.candidates],
+                [c[1] for c in scan.candidates],
+                last_flagged_idx,
+            )
+            if scan.resume_state is not None:
+                # Suppression state as of the first point the next scan checks again
+                boundary = scan.resume_state["offset"] + scan.resume_state["pending"]
+                for pos in kept:
+                    if scan.candidates[pos][0] < boundary:
+                        last_flagged_idx = scan.candidates[pos][0]
+                scan.resume_state["last_flagged_idx"] = last_flagged_idx
+            last_flagged_idx = chain
+            store.add(scan.stored, [scan.candidates[pos][2] for pos in kept])
+    return store
+
+
+class _SeriesScan:
+    """Incremental detection state for one series, fed one chunk at a time.
+
+    Only the points still needed as context for unchecked points are kept
+    between chunks, so memory is bounded by the chunk size.
+    """
+
+    def __init__(self, unit, entity_id, context_size, detectors, run=run_detectors):
+        self.detectors = detectors
+        self.run = run  # run_detectors or a sharded variant of it
+        self.needs_times = any(detector.needs_times for detector in detectors)
+        # Points kept on either side of an anomaly for its record
+        self.context_margin = max(context_size, 1)
+        # Points needed on either side of a point to check it and build its record
+        self.margin = max(
+            [self.context_margin]
+            + [max(detector.lookback, detector.lookahead) for detector in detectors]
+        )
+        self.times = []
+        self.values = []
+        self.friendly_names = []
+        self.offset = 0  # Series index of the first buffered point
+        self.pending = 0  # Buffer index of the first point not yet checked
+        self.points = 0  # Points fed so far
+        # (series index, still flagged after a flagged point, stored position)
+        self.candidates = []
+        self.stored = SeriesPoints(unit, entity_id)
+        # Set for incremental scans, see save_state/restore
+        self.last_flagged_idx = None
+        self.resume_state = None
+        self.resume_after = None  # Epoch ns of the last point already buffered
+
+    @classmethod
+    def restore(cls, state: dict, *args) -> "_SeriesScan":
+        """Resume a scan from `save_state`, as if its range was fed again."""
+        scan = cls(*args)
+        scan.offset = state["offset"]
+        scan.pending = state["pending"]
+        scan.times = list(state["times"])
+        scan.values = list(state["values"])
+        scan.friendly_names = list(state["friendly_names"])
+        scan.last_flagged_idx = state["last_flagged_idx"]
+        scan.stored.tags = state.get("tags") or {}
+        scan.resume_after = scan.times[-1]
+        return scan
+
+    def save_state(self) -> None:
+        """Keep the unchecked tail and its context so a later scan can resume here.
+
+        Call after the last chunk and before `finish`, which checks the tail
+        as if the series ended.
+        """
+        self.resume_state = {
+            "offset": self.offset,
+            "pending": self.pending,
+            "times": list(self.times),
+            "values": list(self.values),
+            "friendly_names": list(self.friendly_names),
+            "tags": self.stored.tags,
+        }
+
+    def feed(self, series: dict) -> None:
+        """Append a chunk of raw series rows and check every point that has full context."""
+        if not self.stored.tags:
+            # Learned once per series from the result, every chunk carries the same tags
+            self.stored.tags = _series_tags(series)
+        times, values, friendly_names = _series_columns(series)
+        if self.resume_after is not None:
+            # Skip points a restored scan has already buffered
+            skip = bisect_right(times, self.resume_after)
+            if skip < len(times):
+                self.resume_after = None
+            times, values, friendly_names = (
+                times[skip:],
+                values[skip:],
+                friendly_names[skip:],
+            )
+        if not times:
+            return
+        self.points += len(times)
+        self.times.extend(times)
+        self.values.extend(values)
+        self.friendly_names.extend(friendly_names)
+        self._check(len(self.values) - self.margin)
+
+    def finish(self) -> None:
+        """Check the remaining points once the end of the series is known."""
+        self._check(len(self.values))
+
+    def _check(self, end: int) -> None:
+        if end <= self.pending:
+            return
+        with span("detect"):
+            # All detectors share one pass over the buffered arrays
+            flagged, still_flagged = self.run(
+                self.detectors,
+                to_value_array(self.values),
+                to_time_array(self.times) if self.needs_times else None,
+            )
+        in_range = (flagged >= self.pending) & (flagged < end)
+        with span("records"):
+            for idx, keep in zip(
+                flagged[in_range].tolist(), still_flagged[in_range].tolist()
+            ):
+                # Keep the candidate with its context before the buffer moves on
+                self.stored.keep(
+                    self.offset,
+                    self.times,
+                    self.values,
+                    self.friendly_names,
+                    idx - self.context_margin,
+                    idx + self.context_margin + 1,
+                )
+                self.candidates.append(
+                    (self.offset + idx, keep, self.stored.position(self.offset + idx))
+                )
+
+        # Keep just enough history to serve as context for the next chunk
+        drop = max(0, end - self.margin)
+        del self.times[:drop]
+        del self.values[:drop]
+        del self.friendly_names[:drop]
+        self.offset += drop
+        self.pending = end - drop
 
 
 class DataManager:
     """Handles data operations with InfluxDB."""
 
-    def __init__(self, client: InfluxDBClient):
+    def __init__(
+        self,
+        client: InfluxDBClient,
+        write_batch_size: int = WRITE_BATCH_SIZE,
+        scan_workers: int = SCAN_WORKERS,
+        cache=None,
+        watermarks=None,
+        columnar_decoding: bool = False,
+        scan_processes: int = SCAN_PROCESSES,
+        journal=None,
+    ):
         self.client = client
-        self.anomalies = []
+        self.cache = cache  # Optional SeriesCache for use_cache scans
+        self.watermarks = watermarks  # Optional WatermarkStore for incremental scans
+        self.journal = journal  # Optional ChangeJournal to undo deletes and fixes
+        # Decode scan responses column-wise, needs a client with query_columns
+        self.columnar_decoding = columnar_decoding
+        self.write_batch_size = max(1, int(write_batch_size))
+        self.scan_workers = max(1, int(scan_workers))
+        self.scan_processes = max(0, int(scan_processes))
+        self._process_pool = None  # Started by the first scan that needs it
+        self._process_pool_lock = threading.Lock()
+        self.anomalies = AnomalyStore()
+        self.last_scan = None  # profiling.Operation of the latest scan
+        # Measurement -> {field: type}, read once per measurement
+        self.field_types = {}
+
+    def _query(self, *args, **kwargs):
+        """Run client.query as a 'query' span, which includes decoding the response."""
+        with span("query"):
+            return self.client.query(*args, **kwargs)
+
+    def _detector_runner(self):
+        """Return how scans run their detectors: in-thread or over worker processes."""
+        if self.scan_processes < 2:
+            return run_detectors
+        with self._process_pool_lock:
+            if self._process_pool is None:
+                # Spawned rather than forked, forking the threaded GUI is unsafe
+                self._process_pool = ProcessPoolExecutor(
+                    max_workers=self.scan_processes,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+        return partial(
+            run_detectors_sharded,
+            executor=self._process_pool,
+            shards=self.scan_processes,
+        )
+
+    def _scan_query(self, query: str):
+        """Run a scan query with epoch ns times, decoded column-wise if enabled."""
+        if not self.columnar_decoding:
+            return self._query(query, epoch="ns")
+        with span("query"):
+            return self.client.query_columns(query)
 
     def scan_data(
         self,
@@ -18,172 +441,1582 @@ class DataManager:
         check_type: str,
         min_val: float,
         max_val: float,
+        chunk_duration: str = "",
+        prefilter: bool = False,
+        use_cache: bool = False,
+        incremental: bool = False,
+        options: dict = None,
+        progress=None,
+        cancel=None,
     ):
-        """Scan InfluxDB for anomalies based on bounds or monotonicity."""
-        self.anomalies.clear()
-        query = (
-            f'SELECT value, friendly_name FROM "{unit}" WHERE '
-            f"(\"entity_id\" = '{entity_id}') AND "
-            f"time > now(){start_time} AND "
-            f"time < now(){end_time} GROUP BY *"
-        )
+        """Scan InfluxDB for anomalies with the detectors of `check_type`.
 
-        result = self.client.query(query)
-
-        anomalies_list = []
-        last_flagged_idx = -2  # Track the index of the last flagged anomaly to avoid consecutive flagging
-
-        for p in result:
-            points = list(p)
-            for idx, e in enumerate(points):
-                anomaly_data = {
-                    "time": e["time"],
-                    "value": e["value"],
-                    "prev_value": points[max(0, idx - 1)]["value"] if idx > 0 else None,
-                    "next_value": (
-                        points[min(len(points) - 1, idx + 1)]["value"]
-                        if idx < len(points) - 1
-                        else None
-                    ),
-                    "measurement": unit,
-                    "entity_id": entity_id,
-                    "friendly_name": e.get("friendly_name", None),
-                    "context_before": [],
-                    "context_after": [],
-                }
+        `check_type` names a check of checks.CHECKS, several
+        comma-separated, or CONFIGURED_CHECKS for the 'checks' listed in the
+        entity `options` (its config), which also hold detector thresholds.
+        All detectors run in one pass over the fetched points.
 
-                for i in range(1, context_size + 1):
-                    if idx - i >= 0:
-                        anomaly_data["context_before"].append(
-                            (points[idx - i]["time"], points[idx - i]["value"])
-                        )
-                    if idx + i < len(points):
-                        anomaly_data["context_after"].append(
-                            (points[idx + i]["time"], points[idx + i]["value"])
-                        )
+        With a `chunk_duration` (e.g. '7d') the range is fetched and checked one
+        time chunk at a time, carrying `context_size` points across chunk
+        boundaries, so memory depends on the chunk size rather than the range.
+        With `prefilter`, bounds checks are pushed down to InfluxDB instead
+        (see `_scan_bounds_prefiltered`), other checks, chunks, the cache and
+        incremental scans are then refused with ValueError. With `use_cache`, points are read
+        from the local cache, which is topped up from InfluxDB first
+        (see `_scan_cached`). With `incremental`, only points added since the
+        last incremental scan are fetched (see `_scan_incremental`).
+        `progress(done, total)` is called after each query and setting the
+        `cancel` event aborts the scan with OperationCancelled.
+        """
+        self.anomalies = AnomalyStore(context_size)
+        with profiler.operation(f"scan {entity_id}") as operation:
+            anomalies_list, points = self._scan(
+                unit,
+                entity_id,
+                start_time,
+                end_time,
+                context_size,
+                check_type,
+                min_val,
+                max_val,
+                chunk_duration,
+                prefilter,
+                use_cache,
+                incremental,
+                progress,
+                cancel,
+                options=options,
+            )
+            operation.count("points", points)
+            self._set_value_types(anomalies_list)
+        self.last_scan = operation
+        self.anomalies = anomalies_list
+        return anomalies_list
 
-                if check_type == "bounds":
-                    if not (min_val <= e["value"] <= max_val):
-                        anomalies_list.append(anomaly_data)
-                        last_flagged_idx = idx
-                else:  # monotonicity
-                    if idx > 0 and idx < len(points) - 1:  # Ensure prev and next exist
-                        curr_val = e["value"]
-                        prev_val = anomaly_data["prev_value"]
-                        next_val = anomaly_data["next_value"]
-                        before_vals = [p[1] for p in anomaly_data["context_before"][::-1]]
-                        after_vals = [p[1] for p in anomaly_data["context_after"]]
-
-                        # Skip if no context to establish trend
-                        if not before_vals or not after_vals:
-                            continue
-
-                        # Establish trend boundaries from context
-                        max_before = max(before_vals)
-                        min_before = min(before_vals)
-                        max_after = max(after_vals)
-                        min_after = min(after_vals)
-
-                        # Detect isolated peaks and dips using full context
-                        is_peak = curr_val > prev_val and curr_val > next_val
-                        is_dip = curr_val < prev_val and curr_val < next_val
-
-                        # Flag as anomaly if it's a dip or a significant peak
-                        should_flag = False
-                        if is_dip:
-                            # Flag dips that are below the trend
-                            if curr_val < max_before and curr_val < min_after:
-                                # Avoid flagging if this is a correction after a peak
-                                if idx != last_flagged_idx + 1:  # Not immediately after a flagged anomaly
-                                    should_flag = True
-                                elif curr_val >= min_before:  # Aligns with pre-anomaly trend
-                                    should_flag = False
-                                else:
-                                    should_flag = True  # Flag if it's a new dip below the trend
-                        elif is_peak:
-                            # Flag peaks that are above both the trend before and after
-                            if curr_val > max_before and curr_val > max_after:
-                                if idx != last_flagged_idx + 1:  # Not immediately after a flagged anomaly
-                                    should_flag = True
-                                elif curr_val > max(before_vals[:-1] if len(before_vals) > 1 else before_vals):  # Still above pre-anomaly trend
-                                    should_flag = True
-
-                        if should_flag:
-                            anomalies_list.append(anomaly_data)
-                            last_flagged_idx = idx
+    def scan_all(
+        self,
+        entities: dict,
+        start_time: str,
+        end_time: str,
+        context_size: int,
+        check_type: str,
+        chunk_duration: str = "",
+        prefilter: bool = False,
+        use_cache: bool = False,
+        incremental: bool = False,
+        progress=None,
+        cancel=None,
+    ) -> tuple[list, list]:
+        """Scan every configured entity, up to `scan_workers` at a time.
+
+        Each entity uses its own unit and bounds from `entities` (as returned by
+        InfluxDBConfig.get_entities). Returns the combined anomalies, in entity
+        order, and one summary per entity with the points scanned, anomalies
+        found, duration in seconds and error, if any.
+        """
+        self.anomalies = AnomalyStore(context_size)
 
+        def scan_entity(entity_id, config):
+            started = time.perf_counter()
+            summary = {"entity_id": entity_id, "unit": config["unit"], "error": None}
+            try:
+                with profiler.attach(operation):
+                    anomalies_list, points = self._scan(
+                        config["unit"],
+                        entity_id,
+                        start_time,
+                        end_time,
+                        context_size,
+                        check_type,
+                        config["min"],
+                        config["max"],
+                        chunk_duration,
+                        prefilter,
+                        use_cache,
+                        incremental,
+                        cancel=cancel,
+                        options=config,
+                    )
+            except (ValueError, *REQUEST_ERRORS) as e:
+                anomalies_list, points = AnomalyStore(context_size), 0
+                summary["error"] = str(e)
+            summary["points"] = points
+            summary["anomalies"] = len(anomalies_list)
+            summary["duration"] = time.perf_counter() - started
+            return anomalies_list, summary
+
+        with profiler.operation("scan all") as operation:
+            with ThreadPoolExecutor(max_workers=self.scan_workers) as executor:
+                futures = [
+                    executor.submit(scan_entity, entity_id, config)
+                    for entity_id, config in entities.items()
+                ]
+                for done, _ in enumerate(as_completed(futures), 1):
+                    if progress is not None:
+                        progress(done, len(futures))
+                    if cancel is not None and cancel.is_set():
+                        for future in futures:
+                            future.cancel()
+                        raise OperationCancelled("Scan cancelled")
+                results = [future.result() for future in futures]
+            operation.count("points", sum(summary["points"] for _, summary in results))
+            anomalies_list = AnomalyStore(context_size)
+            for entity_anomalies, _ in results:
+                anomalies_list.extend(entity_anomalies)
+            self._set_value_types(anomalies_list)
+        self.last_scan = operation
         self.anomalies = anomalies_list
-        return anomalies_list
+        return anomalies_list, [summary for _, summary in results]
+
+    def _set_value_types(self, anomalies_list: AnomalyStore) -> None:
+        """Report the values of integer fields without a decimal point.
+
+        On errors the values stay floats, the next scan tries again.
+        """
+        errors = []
+        anomalies_list.set_value_types(
+            self._value_types(anomalies_list.measurements(), errors)
+        )
+        for error in errors:
+            logger.warning(error)
+
+    def _fields(self, measurement: str) -> dict:
+        """Map the fields of a measurement to their types, read once per measurement."""
+        if measurement not in self.field_types:
+            self.field_types[measurement] = _field_types(
+                self._query(f'SHOW FIELD KEYS FROM "{measurement}"')
+            )
+        return self.field_types[measurement]
+
+    def _value_types(self, measurements, errors: list) -> dict:
+        """Map measurements to the type of their value field.
+
+        Measurements whose field types cannot be read are left out with an
+        error, their values are taken as floats.
+        """
+        value_types = {}
+        for measurement in measurements:
+            try:
+                value_types[measurement] = self._fields(measurement).get("value")
+            except REQUEST_ERRORS as e:
+                errors.append(
+                    f"Cannot read the field types of {measurement}, "
+                    f"taking its values as floats: {e}"
+                )
+        return value_types
+
+    def _scan(
+        self,
+        unit: str,
+        entity_id: str,
+        start_time: str,
+        end_time: str,
+        context_size: int,
+        check_type: str,
+        min_val: float,
+        max_val: float,
+        chunk_duration: str = "",
+        prefilter: bool = False,
+        use_cache: bool = False,
+        incremental: bool = False,
+        progress=None,
+        cancel=None,
+        options: dict = None,
+    ) -> tuple[list, int]:
+        """Scan one entity without touching `self.anomalies`, safe to run concurrently.
+
+        Returns the anomalies and the number of points fetched. Raises
+        ValueError for `prefilter` with options it cannot honour (checks other
+        than bounds, also among configured checks), and for
+        `incremental` with `use_cache`: incremental scans fetch only new
+        points from the server and keep no cache.
+        """
+        if incremental and use_cache:
+            raise ValueError("Incremental scans cannot be combined with cached scans")
+        if prefilter:
+            if check_names(check_type, options or {}) != ["bounds"]:
+                raise ValueError("Filtering on the server only works for bounds checks")
+            if chunk_duration:
+                raise ValueError(
+                    "Filtering on the server fetches no chunks, clear the chunk duration"
+                )
+            if use_cache or incremental:
+                raise ValueError(
+                    "Filtering on the server cannot be combined with cached "
+                    "or incremental scans"
+                )
+        if incremental and self.watermarks is not None:
+            return self._scan_incremental(
+                unit,
+                entity_id,
+                start_time,
+                end_time,
+                context_size,
+                check_type,
+                min_val,
+                max_val,
+                chunk_duration,
+                progress,
+                cancel,
+                options,
+            )
+        if prefilter:
+            return self._scan_bounds_prefiltered(
+                unit,
+                entity_id,
+                start_time,
+                end_time,
+                context_size,
+                min_val,
+                max_val,
+                progress,
+                cancel,
+            )
+        if use_cache and self.cache is not None:
+            return self._scan_cached(
+                unit,
+                entity_id,
+                start_time,
+                end_time,
+                context_size,
+                check_type,
+                min_val,
+                max_val,
+                chunk_duration,
+                progress,
+                cancel,
+                options,
+            )
+
+        detectors = _detectors(check_type, context_size, min_val, max_val, options)
+        run = self._detector_runner()
+        scans = {}
+        queries = list(
+            self._scan_queries(unit, entity_id, start_time, end_time, chunk_duration)
+        )
+        for number, query in enumerate(queries, 1):
+            if cancel is not None and cancel.is_set():
+                raise OperationCancelled("Scan cancelled")
+            result = self._scan_query(query)
+            _feed_result(scans, result, unit, entity_id, context_size, detectors, run)
+            if progress is not None:
+                progress(number, len(queries))
+
+        return _finish_scans(scans, context_size), sum(
+            scan.points for scan in scans.values()
+        )
+
+    def _scan_cached(
+        self,
+        unit: str,
+        entity_id: str,
+        start_time: str,
+        end_time: str,
+        context_size: int,
+        check_type: str,
+        min_val: float,
+        max_val: float,
+        chunk_duration: str = "",
+        progress=None,
+        cancel=None,
+        options: dict = None,
+    ) -> tuple[list, int]:
+        """Scan from the local cache, fetching only what it does not cover yet.
+
+        Older points are fetched once; newer ones are fetched again only if
+        the cache is more than CACHE_REFRESH_INTERVAL behind. A range that
+        does not touch the cached one replaces it, so coverage stays contiguous.
+        Returns the anomalies and the number of points scanned.
+        """
+        detectors = _detectors(check_type, context_size, min_val, max_val, options)
+        run = self._detector_runner()
+        now = time.time_ns()
+        start = now + parse_duration(start_time)
+        end = now + parse_duration(end_time)
+        step = parse_duration(chunk_duration) if chunk_duration else end - start
+        if step <= 0:
+            raise ValueError(f"Chunk duration must be positive: {chunk_duration!r}")
+
+        coverage = self.cache.coverage(unit, entity_id)
+        if coverage is None or coverage[1] <= start or coverage[0] >= end:
+            self.cache.clear(unit, entity_id)
+            ranges = [(start, end)]
+            low, high = start, end
+        else:
+            # Bounds are exclusive, so the fetched ranges overlap the cached one by 1ns
+            ranges = []
+            low, high = coverage
+            if start < low:
+                ranges.append((start, low + 1))
+                low = start
+            if end - high > parse_duration(CACHE_REFRESH_INTERVAL):
+                ranges.append((high - 1, end))
+                high = end
+
+        select = _scan_select(unit, entity_id)
+        queries = [
+            query
+            for range_start, range_end in ranges
+            for query in _range_queries(select, range_start, range_end, step)
+        ]
+        for number, query in enumerate(queries, 1):
+            if cancel is not None and cancel.is_set():
+                raise OperationCancelled("Scan cancelled")
+            result = self._query(query, epoch="ns")
+            for series in result.raw.get("series", []):
+                self.cache.store(unit, entity_id, _series_key(series), series)
+            if progress is not None:
+                progress(number, len(queries))
+        self.cache.set_coverage(unit, entity_id, low, high)
+
+        scans = {}
+        for key, series in self.cache.iter_series(
+            unit, entity_id, start, min(end, high), CACHE_READ_CHUNK
+        ):
+            if cancel is not None and cancel.is_set():
+                raise OperationCancelled("Scan cancelled")
+            if key not in scans:
+                scans[key] = _SeriesScan(unit, entity_id, context_size, detectors, run)
+            scans[key].feed(series)
+        return _finish_scans(scans, context_size), sum(
+            scan.points for scan in scans.values()
+        )
+
+    def _scan_incremental(
+        self,
+        unit: str,
+        entity_id: str,
+        start_time: str,
+        end_time: str,
+        context_size: int,
+        check_type: str,
+        min_val: float,
+        max_val: float,
+        chunk_duration: str = "",
+        progress=None,
+        cancel=None,
+        options: dict = None,
+    ) -> tuple[list, int]:
+        """Scan only the points added since the last incremental scan of the entity.
+
+        The saved unchecked tail, its `context_size` points of context and the
+        suppression state are restored, so the new anomalies are those a full
+        rescan would find after the previous scan. Without a saved state, or
+        one saved with other settings, the whole range is scanned.
+        Returns the new anomalies and the number of points fetched.
+        """
+        detectors = _detectors(check_type, context_size, min_val, max_val, options)
+        args = (unit, entity_id, context_size, detectors, self._detector_runner())
+        # What a detector is configured with decides whether the saved state
+        # still applies; "ns" marks states whose times are epoch nanoseconds
+        settings = [
+            context_size,
+            [[detector.name, vars(detector)] for detector in detectors],
+            "ns",
+        ]
+        state = self.watermarks.get(unit, entity_id)
+        if state is not None and (state["settings"] != settings or not state["series"]):
+            # A state without series has nothing to resume from, scan in full
+            state = None
+
+        scans = {}
+        if state is None:
+            queries = list(
+                self._scan_queries(
+                    unit, entity_id, start_time, end_time, chunk_duration
+                )
+            )
+        else:
+            for key, series_state in state["series"].items():
+                scans[key] = _SeriesScan.restore(series_state, *args)
+            since = min(scan.resume_after for scan in scans.values())
+            end = time.time_ns() + parse_duration(end_time)
+            step = parse_duration(chunk_duration) if chunk_duration else end - since
+            if step <= 0:
+                raise ValueError(f"Chunk duration must be positive: {chunk_duration!r}")
+            select = _scan_select(unit, entity_id)
+            queries = list(_range_queries(select, since, end, step))
+
+        for number, query in enumerate(queries, 1):
+            if cancel is not None and cancel.is_set():
+                raise OperationCancelled("Scan cancelled")
+            _feed_result(scans, self._scan_query(query), *args)
+            if progress is not None:
+                progress(number, len(queries))
+
+        for scan in scans.values():
+            scan.save_state()
+        anomalies_list = _finish_scans(scans, context_size)
+        series_states = {
+            key: scan.resume_state
+            for key, scan in scans.items()
+            if scan.resume_state["times"]
+        }
+        if series_states:
+            self.watermarks.set(
+                unit, entity_id, {"settings": settings, "series": series_states}
+            )
+        else:
+            # No points in range yet, the next scan starts over
+            self.watermarks.discard(unit, entity_id)
+        return anomalies_list, sum(scan.points for scan in scans.values())
+
+    def _discard_watermark(self, measurement: str, entity_id: str, times: list):
+        """Forget the incremental state of an entity if points of its saved tail changed.
+
+        `times` are epoch ns. Called after deletes and writes went through, so
+        it reports a broken state instead of raising.
+        """
+        if self.watermarks is None or not times:
+            return
+        try:
+            state = self.watermarks.get(measurement, entity_id)
+            if state is None:
+                return
+            firsts = [
+                series_state["times"][0]
+                for series_state in state["series"].values()
+                if series_state["times"]
+            ]
+            if not firsts or max(times) >= min(firsts):
+                self.watermarks.discard(measurement, entity_id)
+        except (OSError, KeyError, TypeError, ValueError) as e:
+            logger.warning(
+                f"Failed to update the incremental state of {entity_id}: {e}"
+            )
+
+    def _scan_bounds_prefiltered(
+        self,
+        unit: str,
+        entity_id: str,
+        start_time: str,
+        end_time: str,
+        context_size: int,
+        min_val: float,
+        max_val: float,
+        progress=None,
+        cancel=None,
+    ) -> tuple[list, int]:
+        """Bounds scan that only transfers violators and their context.
+
+        The bounds predicate runs in InfluxDB. Each violator is fetched with
+        `context_size` neighbours on either side, several violators per
+        request, so the transfer grows with the number of violators rather
+        than the time between them. Violators whose neighbourhoods overlap
+        share one window. Returns the anomalies and the number of points
+        fetched, counting each window once.
+        """
+        where = (
+            f"(\"entity_id\" = '{_quote(entity_id)}') AND "
+            f"time > now(){start_time} AND time < now(){end_time}"
+        )
+        result = self._query(
+            f'SELECT value, friendly_name FROM "{unit}" WHERE {where} AND '
+            f"(value < {min_val} OR value > {max_val}) GROUP BY *",
+            epoch="ns",
+        )
+
+        points = 0  # The windows hold the violators again
+        margin = max(context_size, 1)  # Neighbours needed for context and prev/next
+        violators = []  # (violator times, series tags) per series
+        statements = []
+        for series in sorted(result.raw.get("series", []), key=_series_key):
+            times = _series_columns(series)[0]
+            if not times:
+                continue
+            tags = series.get("tags") or {}
+            select = (
+                f'SELECT value, friendly_name FROM "{unit}" WHERE {where}'
+                + "".join(
+                    f" AND (\"{k}\" = '{_quote(v)}')"
+                    for k, v in sorted(tags.items())
+                    if k != "entity_id"
+                )
+            )
+            violators.append((times, _series_tags(series)))
+            for t in times:
+                statements += [
+                    f"{select} AND time < {t} GROUP BY * "
+                    f"ORDER BY time DESC LIMIT {margin}",
+                    f"{select} AND time >= {t} GROUP BY * LIMIT {margin + 1}",
+                ]
+
+        results = []
+        batches = batch_statements(statements, QUERY_BATCH_MAX_LENGTH)
+        for number, batch in enumerate(batches, 1):
+            if cancel is not None and cancel.is_set():
+                raise OperationCancelled("Scan cancelled")
+            batch_results = self._query("; ".join(batch), epoch="ns")
+            results += (
+                batch_results if isinstance(batch_results, list) else [batch_results]
+            )
+            if progress is not None:
+                progress(number, len(batches))
+
+        anomalies_list = AnomalyStore(context_size)
+        results = iter(results)
+        for violator_times, tags in violators:
+            windows = []  # [times, values, friendly names, violator times]
+            for t in violator_times:
+                before, after = (
+                    _series_columns(
+                        next(iter(next(results).raw.get("series", [])), {"columns": []})
+                    )
+                    for _ in range(2)
+                )
+                if windows and t <= windows[-1][0][-1]:
+                    # Within the previous window: add what follows it
+                    window = windows[-1]
+                    new = bisect_right(after[0], window[0][-1])
+                    for column, extra in zip(window, after):
+                        column.extend(extra[new:])
+                    window[3].add(t)
+                else:
+                    # Before-context comes newest first
+                    windows.append(
+                        [[*before[column][::-1], *after[column]] for column in range(3)]
+                        + [{t}]
+                    )
+            for times, values, friendly_names, flagged_times in windows:
+                points += len(times)
+                flagged = [
+                    idx
+                    for idx in detect_bounds(
+                        to_value_array(values), min_val, max_val
+                    ).tolist()
+                    if times[idx] in flagged_times
+                ]
+                if flagged:
+                    window = SeriesPoints(unit, entity_id, tags)
+                    window.keep(0, times, values, friendly_names, 0, len(times))
+                    anomalies_list.add(window, flagged)
+        return anomalies_list, points
+
+    @staticmethod
+    def _scan_queries(
+        unit: str, entity_id: str, start_time: str, end_time: str, chunk_duration: str
+    ):
+        """Yield the scan query, or one query per time chunk if `chunk_duration` is set."""
+        select = _scan_select(unit, entity_id)
+        if not chunk_duration:
+            yield (
+                select + f"time > now(){start_time} AND "
+                f"time < now(){end_time} GROUP BY *"
+            )
+            return
+
+        # Anchor all chunks to one client-side now() so they tile the range exactly
+        now = time.time_ns()
+        start = now + parse_duration(start_time)
+        end = now + parse_duration(end_time)
+        step = parse_duration(chunk_duration)
+        if step <= 0:
+            raise ValueError(f"Chunk duration must be positive: {chunk_duration!r}")
+        yield from _range_queries(select, start, end, step)
+
+    def fetch_overview(
+        self, unit: str, entity_id: str, start: int, end: int, buckets: int
+    ) -> dict:
+        """Fetch the points of an entity between `start` and `end` (epoch ns) for plotting.
+
+        Large windows are decimated by InfluxDB to the minimum and maximum of
+        each of `buckets` time buckets (one per pixel), so spikes survive while
+        only a few thousand values are transferred. Once a zoomed-in window has
+        at most OVERVIEW_RAW_PER_BUCKET points per bucket, its raw points are
+        returned instead. Returns epoch ns `times` with `lows` and `highs`
+        (equal for raw points) and whether they are `raw`.
+        """
+        with profiler.operation(f"overview {entity_id}"):
+            where = (
+                f'FROM "{unit}" WHERE ("entity_id" = \'{_quote(entity_id)}\') AND '
+                f"time >= {start} AND time < {end}"
+            )
+            step = max(1, -(-(end - start) // max(1, buckets)))
+            result = self._query(
+                f"SELECT min(value), max(value), count(value) {where} "
+                f"GROUP BY time({step}ns) fill(none)",
+                epoch="ns",
+            )
+            rows = list(result.get_points())
+            if sum(row["count"] for row in rows) > OVERVIEW_RAW_PER_BUCKET * buckets:
+                return {
+                    "times": [row["time"] for row in rows],
+                    "lows": [row["min"] for row in rows],
+                    "highs": [row["max"] for row in rows],
+                    "raw": False,
+                }
+            rows = list(self._query(f"SELECT value {where}", epoch="ns").get_points())
+            values = [row["value"] for row in rows]
+            return {
+                "times": [row["time"] for row in rows],
+                "lows": values,
+                "highs": values,
+                "raw": True,
+            }
+
+    def delete_selected(
+        self,
+        selected_indices: list,
+        max_batch_length: int = QUERY_BATCH_MAX_LENGTH,
+        progress=None,
+        cancel=None,
+        ranges: bool = False,
+    ) -> tuple[list, list]:
+        """Delete selected anomalies from InfluxDB in batched requests.
 
-    def delete_selected(self, selected_indices: list) -> int:
-        """Delete selected anomalies from InfluxDB."""
+        DELETE statements are grouped per measurement/entity and sent several
+        per request, each request capped at `max_batch_length` characters.
+        With `ranges`, each run of consecutive anomalies is deleted by a
+        single statement over its time range. With a journal, the points of
+        each batch are read and journaled before it is sent. Returns the
+        indices that were deleted and one error per failed batch. Setting the
+        `cancel` event stops before the next batch.
+        """
         if not selected_indices:
-            return 0
+            return [], []
 
-        deleted_count = 0
+        with profiler.operation("delete"):
+            groups, batches = self._delete_batches(
+                selected_indices, max_batch_length, ranges
+            )
+            try:
+                operation = self._journal_begin(
+                    "delete", f"Delete {len(selected_indices)} anomalies"
+                )
+            except OSError as e:
+                return [], [f"Not deleting, cannot write the journal: {e}"]
+            deleted = []
+            errors = []
+            for number, batch in enumerate(batches, 1):
+                if cancel is not None and cancel.is_set():
+                    remaining = sum(
+                        len(indices) for b in batches[number - 1 :] for indices, _ in b
+                    )
+                    errors.append(f"Cancelled, {remaining} delete(s) not sent")
+                    break
+                if progress is not None:
+                    progress(number - 1, len(batches))
+                if operation is not None:
+                    try:
+                        self._journal_deletes(operation, batch, max_batch_length)
+                    except (OSError, *REQUEST_ERRORS) as e:
+                        errors.append(
+                            f"Delete batch {number}/{len(batches)}: not sent, "
+                            f"journaling its points failed: {e}"
+                        )
+                        continue
+                # Multiple statements in one request run one after the other on the
+                # server; OR-ing time predicates instead would delete the whole span
+                try:
+                    results = self._query(
+                        "; ".join(dquery for _, dquery in batch),
+                        method="POST",
+                        raise_errors=False,
+                    )
+                except REQUEST_ERRORS as e:
+                    results = e
+                self._collect_deletes(
+                    f"Delete batch {number}/{len(batches)}",
+                    batch,
+                    results,
+                    deleted,
+                    errors,
+                )
+
+            self._deleted(groups, deleted)
+        return deleted, errors
+
+    def _delete_batches(
+        self, selected_indices: list, max_batch_length: int, ranges: bool = False
+    ):
+        """Group DELETE statements per measurement/entity and split them into requests.
+
+        Returns the anomaly indices per (measurement, entity_id) and the
+        batches as lists of (anomaly indices, statement). A statement deletes
+        one anomaly, or with `ranges` one run of consecutive anomalies: no
+        other point of the series lay between them when it was scanned. It
+        matches every tag of the series, so other series of the entity (e.g.
+        under an older friendly_name) keep their points in that time range.
+        """
+        anomalies = self.anomalies
+        groups = {}
         for idx in selected_indices:
-            anomaly = self.anomalies[idx]
-            dquery = (
-                f'DELETE FROM "{anomaly["measurement"]}" WHERE '
-                f'("entity_id" = \'{anomaly["entity_id"]}\') AND '
-                f'(time = \'{anomaly["time"]}\')'
+            groups.setdefault(
+                (anomalies.measurement(idx), anomalies.entity_id(idx)), []
+            ).append(idx)
+
+        batches = []
+        for (measurement, entity_id), indices in groups.items():
+            runs = anomalies.runs(indices) if ranges else [[idx] for idx in indices]
+            dqueries = []
+            for run in runs:
+                first, last = anomalies.timestamp(run[0]), anomalies.timestamp(run[-1])
+                if first == last:
+                    condition = f"time = {first}"
+                else:
+                    condition = f"time >= {first} AND time <= {last}"
+                tags = "".join(
+                    f" AND (\"{k}\" = '{_quote(v)}')"
+                    for k, v in sorted(anomalies.tags(run[0]).items())
+                    if k != "entity_id"
+                )
+                dqueries.append(
+                    f'DELETE FROM "{measurement}" WHERE '
+                    f"(\"entity_id\" = '{_quote(entity_id)}'){tags} AND ({condition})"
+                )
+            start = 0
+            for batch in batch_statements(dqueries, max_batch_length):
+                batches.append(list(zip(runs[start : start + len(batch)], batch)))
+                start += len(batch)
+        return groups, batches
+
+    def _journal_begin(self, action: str, description: str):
+        """Start a journaled operation, returns its id or None without a journal."""
+        if self.journal is None:
+            return None
+        return self.journal.begin(action, description)
+
+    def _journal_deletes(
+        self, operation: int, batch: list, max_batch_length: int
+    ) -> None:
+        """Read and journal the points a batch of DELETE statements removes."""
+        measurement = self.anomalies.measurement(batch[0][0][0])
+        field_types = self._fields(measurement)
+        points = []
+        for query in _snapshot_queries(
+            [statement for _, statement in batch], max_batch_length
+        ):
+            points.extend(
+                _journal_points(
+                    measurement,
+                    self._query(query, epoch="ns"),
+                    field_types,
+                )
+            )
+        self.journal.record(operation, points)
+
+    def _journal_fixes(self, operation: int, batch: list) -> None:
+        """Journal the values a batch of fixes overwrites, with the tags it writes."""
+        self.journal.record(
+            operation,
+            [
+                {
+                    "measurement": point["measurement"],
+                    "tags": point["tags"],
+                    "time": point["time"],
+                    # Of the type of the fix, which has the type of the field
+                    "fields": {"value": type(fix_value)(self.anomalies.value(idx))},
+                }
+                for idx, fix_value, point in batch
+                if self.anomalies.value(idx) is not None
+            ],
+        )
+
+    @staticmethod
+    def _collect_deletes(
+        name: str, batch: list, results, deleted: list, errors: list
+    ) -> None:
+        """Record the outcome of one delete request, `results` is its error if it failed."""
+        if isinstance(results, Exception):
+            total = sum(len(indices) for indices, _ in batch)
+            errors.append(f"{name}: all {total} deletes failed: {results}")
+            return
+        if not isinstance(results, list):
+            results = [results]
+        statement_errors = {
+            result.raw.get("statement_id", pos): result.error
+            for pos, result in enumerate(results)
+        }
+        failed = 0
+        first_error = None
+        for pos, (indices, _) in enumerate(batch):
+            # Statements after a failing one are not run and have no result
+            error = statement_errors.get(pos, "statement not executed")
+            if error is None:
+                deleted.extend(indices)
+            else:
+                failed += len(indices)
+                first_error = first_error or error
+        if failed:
+            total = sum(len(indices) for indices, _ in batch)
+            errors.append(f"{name}: {failed} of {total} deletes failed: {first_error}")
+
+    def _deleted(self, groups: dict, deleted: list) -> None:
+        """Bring the local cache and incremental state in line after deletes."""
+        anomalies = self.anomalies
+        done = set(deleted)
+        for (measurement, entity_id), indices in groups.items():
+            self._discard_watermark(
+                measurement,
+                entity_id,
+                [anomalies.timestamp(idx) for idx in indices if idx in done],
             )
-            self.client.query(dquery)
-            deleted_count += 1
+        if self.cache is not None:
+            # Keep the local cache in step with the server, series by series
+            # as the DELETEs matched their tags
+            for (measurement, entity_id), indices in groups.items():
+                by_series = {}
+                for idx in indices:
+                    if idx in done:
+                        by_series.setdefault(anomalies.series_ids[idx], []).append(idx)
+                for series_indices in by_series.values():
+                    self.cache.delete_points(
+                        measurement,
+                        entity_id,
+                        [anomalies.timestamp(idx) for idx in series_indices],
+                        anomalies.tags(series_indices[0]) or None,
+                    )
 
-        return deleted_count
+    def fix_selected(
+        self, selected_indices: list, fix_method: str, progress=None, cancel=None
+    ) -> tuple[list, list]:
+        """Fix selected anomalies in InfluxDB using the specified method.
 
-    def fix_selected(self, selected_indices: list, fix_method: str) -> tuple[int, list]:
-        """Fix selected anomalies in InfluxDB using the specified method."""
+        Fixes are written in batches of `write_batch_size` points, each
+        journaled first if there is a journal. Returns the indices that were
+        fixed and the errors for the ones that were not. Setting the `cancel`
+        event stops before the next batch.
+        """
         if not selected_indices:
-            return 0, []
+            return [], []
+
+        with profiler.operation("fix"):
+            fixed = []
+            errors = []
+            with span("fix points"):
+                value_types = self._value_types(
+                    {self.anomalies.measurement(idx) for idx in selected_indices},
+                    errors,
+                )
+                pending = self._fix_points(
+                    selected_indices, fix_method, errors, value_types
+                )
+            if not pending:
+                return fixed, errors
+            try:
+                operation = self._journal_begin(
+                    "fix", f"Fix {len(pending)} anomalies ({fix_method})"
+                )
+            except OSError as e:
+                return [], errors + [f"Not fixing, cannot write the journal: {e}"]
+            for start in range(0, len(pending), self.write_batch_size):
+                if cancel is not None and cancel.is_set():
+                    errors.append(
+                        f"Cancelled, {len(pending) - start} fix(es) not written"
+                    )
+                    break
+                if progress is not None:
+                    progress(start, len(pending))
+                batch = pending[start : start + self.write_batch_size]
+                if operation is not None:
+                    try:
+                        self._journal_fixes(operation, batch)
+                    except OSError as e:
+                        errors.append(
+                            f"Failed to write {len(batch)} fix(es), "
+                            f"journaling them failed: {e}"
+                        )
+                        continue
+                self._write_fixes(batch, fixed, errors)
+
+        return fixed, errors
+
+    def preview_delete(
+        self,
+        selected_indices: list,
+        max_batch_length: int = QUERY_BATCH_MAX_LENGTH,
+        ranges: bool = False,
+    ) -> list:
+        """Return the changes delete_selected would make, without touching InfluxDB.
+
+        One change per anomaly, with the DELETE statement that removes it.
+        """
+        _, batches = self._delete_batches(selected_indices, max_batch_length, ranges)
+        return [
+            self._change(idx, "delete", None, statement)
+            for batch in batches
+            for indices, statement in batch
+            for idx in indices
+        ]
+
+    def preview_fix(self, selected_indices: list, fix_method: str) -> tuple:
+        """Return the changes fix_selected would make and the anomalies it could not fix.
 
-        success_count = 0
+        Fix values get the type of their field, as fix_selected writes them.
+        """
         errors = []
+        value_types = self._value_types(
+            {self.anomalies.measurement(idx) for idx in selected_indices}, errors
+        )
+        pending = self._fix_points(selected_indices, fix_method, errors, value_types)
+        return [
+            self._change(idx, "fix", fix_value) for idx, fix_value, _ in pending
+        ], errors
+
+    def _change(self, idx: int, action: str, new_value, statement: str = None):
+        anomalies = self.anomalies
+        return {
+            "action": action,
+            "measurement": anomalies.measurement(idx),
+            "entity_id": anomalies.entity_id(idx),
+            "time": anomalies.time(idx),
+            "old_value": anomalies.value(idx),
+            "new_value": new_value,
+            "statement": statement,
+        }
+
+    def undo_last(self, progress=None, cancel=None) -> tuple:
+        """Write back the points journaled by the latest delete or fix not undone yet.
+
+        Points are restored in batches of `write_batch_size`. Returns the
+        description of the operation (None if there is nothing to undo), the
+        number of points restored and one error per failed batch. The
+        operation only counts as undone once every batch was written.
+        """
+        if self.journal is None:
+            return None, 0, ["Undo needs a journal"]
+        with profiler.operation("undo"):
+            last = self.journal.last_operation()
+            if last is None:
+                return None, 0, []
+            points = last["points"]
+            restored = 0
+            errors = []
+            for start in range(0, len(points), self.write_batch_size):
+                if cancel is not None and cancel.is_set():
+                    errors.append(
+                        f"Cancelled, {len(points) - start} point(s) not restored"
+                    )
+                    break
+                if progress is not None:
+                    progress(start, len(points))
+                batch = points[start : start + self.write_batch_size]
+                try:
+                    with span("write"):
+                        result = self.client.write_points(batch, time_precision="n")
+                except REQUEST_ERRORS as e:
+                    result = e
+                restored += self._restored(batch, result, errors)
+            self._undone(last, errors)
+        return last["description"], restored, errors
+
+    @staticmethod
+    def _restored(batch: list, result, errors: list) -> int:
+        """Record the outcome of one restore write, returns the points restored."""
+        if isinstance(result, Exception) or not result:
+            errors.append(
+                f"Failed to restore {len(batch)} point(s)"
+                + (f": {result}" if isinstance(result, Exception) else "")
+            )
+            return 0
+        return len(batch)
+
+    def _undone(self, operation: dict, errors: list) -> None:
+        """Close an undone operation and drop the cache and incremental state it affects."""
+        if not errors:
+            self.journal.mark_undone(operation["operation"])
+        entities = {}
+        for point in operation["points"]:
+            entities.setdefault(
+                (point["measurement"], point["tags"].get("entity_id")), []
+            ).append(point["time"])
+        for (measurement, entity_id), times in entities.items():
+            self._discard_watermark(measurement, entity_id, times)
+            if self.cache is not None:
+                # Restored points are missing from the cache or outdated in it
+                self.cache.clear(measurement, entity_id)
+
+    def _fix_points(
+        self,
+        selected_indices: list,
+        fix_method: str,
+        errors: list,
+        value_types: dict = None,
+    ):
+        """Return (anomaly index, fix value, point) for each anomaly that can be fixed.
+
+        Fix values get the type of the value field in `value_types`, by
+        measurement, so integer fields stay integers.
+        """
+        value_types = value_types or {}
+        if fix_method == "Linear Interpolation":
+            return self._interpolate_runs(selected_indices, errors, value_types)
+        pending = []
+        anomalies = self.anomalies
         for idx in selected_indices:
-            anomaly = self.anomalies[idx]
+            prev_value = anomalies.prev_value(idx)
+            next_value = anomalies.next_value(idx)
+            timestamp = anomalies.time(idx)
 
             if fix_method == "Previous Value":
-                fix_value = anomaly["prev_value"]
+                fix_value = prev_value
             elif fix_method == "Next Value":
-                fix_value = anomaly["next_value"]
+                fix_value = next_value
             elif fix_method == "Average of Previous and Next":
-                if (
-                    anomaly["prev_value"] is not None
-                    and anomaly["next_value"] is not None
-                ):
-                    fix_value = (anomaly["prev_value"] + anomaly["next_value"]) / 2
+                if prev_value is not None and next_value is not None:
+                    fix_value = (prev_value + next_value) / 2
                 else:
                     errors.append(
-                        f"Cannot average for {anomaly['time']}: Missing previous or next value"
+                        f"Cannot average for {timestamp}: Missing previous or next value"
                     )
                     continue
 
             if fix_value is None:
+                errors.append(f"No {fix_method.lower()} available for {timestamp}")
+                continue
+
+            pending.append(self._pending_fix(idx, fix_value, value_types))
+        return pending
+
+    def _interpolate_runs(
+        self, selected_indices: list, errors: list, value_types: dict
+    ):
+        """Fix each run of consecutive anomalies by linear interpolation over time.
+
+        The values are interpolated between the points just before and just
+        after the run, so the whole run is written as one straight line.
+        """
+        pending = []
+        anomalies = self.anomalies
+        for run in anomalies.runs(selected_indices):
+            before = anomalies.neighbour(run[0], -1)
+            after = anomalies.neighbour(run[-1], 1)
+            if before is None or after is None or None in (before[1], after[1]):
                 errors.append(
-                    f"No {fix_method.lower()} available for {anomaly['time']}"
+                    f"Cannot interpolate {len(run)} point(s) from "
+                    f"{anomalies.time(run[0])}: Missing previous or next value"
                 )
                 continue
+            start, end = before[0], after[0]
+            slope = (after[1] - before[1]) / (end - start) if end > start else 0.0
+            for idx in run:
+                offset = anomalies.timestamp(idx) - start
+                fix_value = before[1] + slope * offset
+                pending.append(self._pending_fix(idx, fix_value, value_types))
+        return pending
 
-            json_body = [
-                {
-                    "measurement": anomaly["measurement"],
-                    "tags": {
-                        "domain": "sensor",
-                        "entity_id": anomaly["entity_id"],
-                        "source": "HA",
-                        "friendly_name": anomaly["friendly_name"],
-                    },
-                    "time": anomaly["time"],
-                    "fields": {"value": fix_value},
+    def _pending_fix(self, idx: int, fix_value: float, value_types: dict) -> tuple:
+        """Return (anomaly index, fix value, point) with the value of the field's type."""
+        fix_value = _field_value(
+            fix_value, value_types.get(self.anomalies.measurement(idx))
+        )
+        return idx, fix_value, self._fix_point(idx, fix_value)
+
+    def _fix_point(self, idx: int, fix_value: float) -> dict:
+        """Return the point that overwrites an anomaly with `fix_value`.
+
+        It carries the full tag set the scan reported for the anomaly's
+        series, so it lands in that series rather than creating a new one.
+        """
+        anomalies = self.anomalies
+        tags = anomalies.tags(idx) or {
+            # Scans that did not report tags, assume Home Assistant's defaults
+            "domain": "sensor",
+            "entity_id": anomalies.entity_id(idx),
+            "source": "HA",
+            "friendly_name": anomalies.friendly_name(idx),
+        }
+        return {
+            "measurement": anomalies.measurement(idx),
+            "tags": tags,
+            "time": anomalies.timestamp(idx),  # Epoch ns, written with precision 'n'
+            "fields": {"value": fix_value},
+        }
+
+    def _write_fixes(self, batch: list, fixed: list, errors: list) -> None:
+        """Write a batch of fixes, splitting it in half on rejection to find the bad points."""
+        try:
+            with span("write"):
+                result = self.client.write_points(
+                    [point for _, _, point in batch], time_precision="n"
+                )
+        except InfluxDBClientError as e:
+            # The server rejected some points of the batch: narrow them down
+            if len(batch) > 1:
+                middle = len(batch) // 2
+                self._write_fixes(batch[:middle], fixed, errors)
+                self._write_fixes(batch[middle:], fixed, errors)
+            else:
+                errors.append(
+                    f"Failed to write fix for {self.anomalies.time(batch[0][0])}: {e}"
+                )
+            return
+        except REQUEST_ERRORS as e:
+            # Connection or server trouble affects the whole batch alike
+            errors.append(f"Failed to write {len(batch)} fix(es): {e}")
+            return
+
+        self._fixes_written(batch, result, fixed, errors)
+
+    def _fixes_written(self, batch: list, result, fixed: list, errors: list) -> None:
+        """Record a written batch of fixes and update memory, cache and incremental state."""
+        if not result:
+            errors.append(f"Failed to write {len(batch)} fix(es)")
+            return
+        anomalies = self.anomalies
+        for idx, fix_value, point in batch:
+            anomalies.set_value(idx, fix_value)  # Update in memory
+            fixed.append(idx)
+            self._discard_watermark(
+                point["measurement"], anomalies.entity_id(idx), [point["time"]]
+            )
+        if self.cache is not None:
+            for idx, fix_value, point in batch:
+                self.cache.update_points(
+                    point["measurement"],
+                    anomalies.entity_id(idx),
+                    [
+                        (
+                            point["time"],
+                            anomalies.friendly_name(idx),
+                            fix_value,
+                        )
+                    ],
+                )
+
+
+class AsyncDataManager(DataManager):
+    """DataManager for an asyncio client such as AsyncInfluxDBClient.
+
+    Scan chunks are fetched ahead while earlier ones are checked, and entities
+    and delete/fix batches are sent concurrently, up to `concurrency` requests
+    at a time. Detection is unchanged. Pre-filtered, cached and incremental
+    scans need the blocking DataManager.
+    """
+
+    def __init__(
+        self,
+        client,
+        write_batch_size: int = WRITE_BATCH_SIZE,
+        scan_workers: int = SCAN_WORKERS,
+        concurrency: int = ASYNC_CONCURRENCY,
+        journal=None,
+    ):
+        super().__init__(client, write_batch_size, scan_workers, journal=journal)
+        self.concurrency = max(1, int(concurrency))
+
+    async def scan_data(
+        self,
+        unit: str,
+        entity_id: str,
+        start_time: str,
+        end_time: str,
+        context_size: int,
+        check_type: str,
+        min_val: float,
+        max_val: float,
+        chunk_duration: str = "",
+        options: dict = None,
+        progress=None,
+        cancel=None,
+    ):
+        """Async counterpart of DataManager.scan_data."""
+        self.anomalies = AnomalyStore(context_size)
+        with profiler.operation(f"scan {entity_id}") as operation:
+            anomalies_list, points = await self._scan_async(
+                unit,
+                entity_id,
+                start_time,
+                end_time,
+                context_size,
+                check_type,
+                min_val,
+                max_val,
+                chunk_duration,
+                progress,
+                cancel,
+                options,
+            )
+            operation.count("points", points)
+            await self._set_value_types_async(anomalies_list)
+        self.last_scan = operation
+        self.anomalies = anomalies_list
+        return anomalies_list
+
+    async def scan_all(
+        self,
+        entities: dict,
+        start_time: str,
+        end_time: str,
+        context_size: int,
+        check_type: str,
+        chunk_duration: str = "",
+        progress=None,
+        cancel=None,
+    ) -> tuple[list, list]:
+        """Async counterpart of DataManager.scan_all, `scan_workers` entities at a time."""
+        self.anomalies = AnomalyStore(context_size)
+        workers = asyncio.Semaphore(self.scan_workers)
+        done = 0
+
+        async def scan_entity(entity_id, config):
+            nonlocal done
+            async with workers:
+                started = time.perf_counter()
+                summary = {
+                    "entity_id": entity_id,
+                    "unit": config["unit"],
+                    "error": None,
                 }
-            ]
-            print(json_body)
-            result = self.client.write_points(json_body)
-            if result:
-                anomaly["value"] = fix_value  # Update in memory
-                success_count += 1
+                try:
+                    anomalies_list, points = await self._scan_async(
+                        config["unit"],
+                        entity_id,
+                        start_time,
+                        end_time,
+                        context_size,
+                        check_type,
+                        config["min"],
+                        config["max"],
+                        chunk_duration,
+                        cancel=cancel,
+                        options=config,
+                    )
+                except (ValueError, *REQUEST_ERRORS) as e:
+                    anomalies_list, points = AnomalyStore(context_size), 0
+                    summary["error"] = str(e)
+                summary["points"] = points
+                summary["anomalies"] = len(anomalies_list)
+                summary["duration"] = time.perf_counter() - started
+            done += 1
+            if progress is not None:
+                progress(done, len(entities))
+            return anomalies_list, summary
+
+        with profiler.operation("scan all") as operation:
+            results = await asyncio.gather(
+                *(
+                    scan_entity(entity_id, config)
+                    for entity_id, config in entities.items()
+                )
+            )
+            operation.count("points", sum(summary["points"] for _, summary in results))
+            anomalies_list = AnomalyStore(context_size)
+            for entity_anomalies, _ in results:
+                anomalies_list.extend(entity_anomalies)
+            await self._set_value_types_async(anomalies_list)
+        self.last_scan = operation
+        self.anomalies = anomalies_list
+        return anomalies_list, [summary for _, summary in results]
+
+    async def _set_value_types_async(self, anomalies_list: AnomalyStore) -> None:
+        """Async counterpart of DataManager._set_value_types."""
+        errors = []
+        anomalies_list.set_value_types(
+            await self._value_types_async(anomalies_list.measurements(), errors)
+        )
+        for error in errors:
+            logger.warning(error)
+
+    async def _fields_async(self, measurement: str) -> dict:
+        """Async counterpart of DataManager._fields."""
+        if measurement not in self.field_types:
+            self.field_types[measurement] = _field_types(
+                await self.client.query(f'SHOW FIELD KEYS FROM "{measurement}"')
+            )
+        return self.field_types[measurement]
+
+    async def _value_types_async(self, measurements, errors: list) -> dict:
+        """Async counterpart of DataManager._value_types."""
+        value_types = {}
+        for measurement in measurements:
+            try:
+                value_types[measurement] = (await self._fields_async(measurement)).get(
+                    "value"
+                )
+            except REQUEST_ERRORS as e:
+                errors.append(
+                    f"Cannot read the field types of {measurement}, "
+                    f"taking its values as floats: {e}"
+                )
+        return value_types
+
+    async def _scan_async(
+        self,
+        unit: str,
+        entity_id: str,
+        start_time: str,
+        end_time: str,
+        context_size: int,
+        check_type: str,
+        min_val: float,
+        max_val: float,
+        chunk_duration: str = "",
+        progress=None,
+        cancel=None,
+        options: dict = None,
+    ) -> tuple[list, int]:
+        """Scan one entity, fetching up to `concurrency` chunks ahead of detection.
+
+        Chunks are still checked in time order, so the result is the same as
+        DataManager._scan's.
+        """
+        detectors = _detectors(check_type, context_size, min_val, max_val, options)
+        queries = list(
+            self._scan_queries(unit, entity_id, start_time, end_time, chunk_duration)
+        )
+        scans = {}
+        ahead = deque()
+        next_query = 0
+        try:
+            for number in range(1, len(queries) + 1):
+                while next_query < len(queries) and len(ahead) < self.concurrency:
+                    ahead.append(
+                        asyncio.ensure_future(
+                            self.client.query(queries[next_query], epoch="ns")
+                        )
+                    )
+                    next_query += 1
+                if cancel is not None and cancel.is_set():
+                    raise OperationCancelled("Scan cancelled")
+                _feed_result(
+                    scans,
+                    await ahead.popleft(),
+                    unit,
+                    entity_id,
+                    context_size,
+                    detectors,
+                )
+                if progress is not None:
+                    progress(number, len(queries))
+        finally:
+            for task in ahead:
+                task.cancel()
+
+        return _finish_scans(scans, context_size), sum(
+            scan.points for scan in scans.values()
+        )
+
+    async def delete_selected(
+        self,
+        selected_indices: list,
+        max_batch_length: int = QUERY_BATCH_MAX_LENGTH,
+        progress=None,
+        cancel=None,
+        ranges: bool = False,
+    ) -> tuple[list, list]:
+        """Async counterpart of DataManager.delete_selected, sending batches concurrently."""
+        if not selected_indices:
+            return [], []
+
+        with profiler.operation("delete"):
+            groups, batches = self._delete_batches(
+                selected_indices, max_batch_length, ranges
+            )
+            try:
+                operation = self._journal_begin(
+                    "delete", f"Delete {len(selected_indices)} anomalies"
+                )
+            except OSError as e:
+                return [], [f"Not deleting, cannot write the journal: {e}"]
+            limit = asyncio.Semaphore(self.concurrency)
+            done = 0
+
+            async def send(batch):
+                nonlocal done
+                async with limit:
+                    if cancel is not None and cancel.is_set():
+                        return None  # Not sent
+                    if operation is not None:
+                        try:
+                            await self._journal_deletes_async(
+                                operation, batch, max_batch_length
+                            )
+                        except (OSError, *REQUEST_ERRORS) as e:
+                            return RuntimeError(
+                                f"not sent, journaling its points failed: {e}"
+                            )
+                    try:
+                        results = await self.client.query(
+                            "; ".join(dquery for _, dquery in batch),
+                            method="POST",
+                            raise_errors=False,
+                        )
+                    except REQUEST_ERRORS as e:
+                        results = e
+                done += 1
+                if progress is not None:
+                    progress(done, len(batches))
+                return results
+
+            outcomes = await asyncio.gather(*(send(batch) for batch in batches))
+            deleted = []
+            errors = []
+            not_sent = 0
+            for number, (batch, results) in enumerate(zip(batches, outcomes), 1):
+                if results is None:
+                    not_sent += sum(len(indices) for indices, _ in batch)
+                    continue
+                self._collect_deletes(
+                    f"Delete batch {number}/{len(batches)}",
+                    batch,
+                    results,
+                    deleted,
+                    errors,
+                )
+            if not_sent:
+                errors.append(f"Cancelled, {not_sent} delete(s) not sent")
+
+            self._deleted(groups, deleted)
+        return deleted, errors
+
+    async def fix_selected(
+        self, selected_indices: list, fix_method: str, progress=None, cancel=None
+    ) -> tuple[list, list]:
+        """Async counterpart of DataManager.fix_selected, writing batches concurrently."""
+        if not selected_indices:
+            return [], []
+
+        with profiler.operation("fix"):
+            fixed = []
+            errors = []
+            with span("fix points"):
+                value_types = await self._value_types_async(
+                    {self.anomalies.measurement(idx) for idx in selected_indices},
+                    errors,
+                )
+                pending = self._fix_points(
+                    selected_indices, fix_method, errors, value_types
+                )
+            if not pending:
+                return fixed, errors
+            try:
+                operation = self._journal_begin(
+                    "fix", f"Fix {len(pending)} anomalies ({fix_method})"
+                )
+            except OSError as e:
+                return [], errors + [f"Not fixing, cannot write the journal: {e}"]
+            limit = asyncio.Semaphore(self.concurrency)
+            written = 0
+            not_written = 0
+
+            async def write(batch):
+                nonlocal written, not_written
+                async with limit:
+                    if cancel is not None and cancel.is_set():
+                        not_written += len(batch)
+                        return
+                    if operation is not None:
+                        try:
+                            self._journal_fixes(operation, batch)
+                        except OSError as e:
+                            errors.append(
+                                f"Failed to write {len(batch)} fix(es), "
+                                f"journaling them failed: {e}"
+                            )
+                            return
+                    await self._write_fixes_async(batch, fixed, errors)
+                written += len(batch)
+                if progress is not None:
+                    progress(written, len(pending))
+
+            await asyncio.gather(
+                *(
+                    write(pending[start : start + self.write_batch_size])
+                    for start in range(0, len(pending), self.write_batch_size)
+                )
+            )
+            if not_written:
+                errors.append(f"Cancelled, {not_written} fix(es) not written")
+        return fixed, errors
+
+    async def preview_fix(self, selected_indices: list, fix_method: str) -> tuple:
+        """Async counterpart of DataManager.preview_fix."""
+        errors = []
+        value_types = await self._value_types_async(
+            {self.anomalies.measurement(idx) for idx in selected_indices},
+            errors,
+        )
+        pending = self._fix_points(selected_indices, fix_method, errors, value_types)
+        return [
+            self._change(idx, "fix", fix_value) for idx, fix_value, _ in pending
+        ], errors
+
+    async def _journal_deletes_async(
+        self, operation: int, batch: list, max_batch_length: int
+    ) -> None:
+        """Async counterpart of DataManager._journal_deletes."""
+        measurement = self.anomalies.measurement(batch[0][0][0])
+        field_types = await self._fields_async(measurement)
+        points = []
+        for query in _snapshot_queries(
+            [statement for _, statement in batch], max_batch_length
+        ):
+            points.extend(
+                _journal_points(
+                    measurement,
+                    await self.client.query(query, epoch="ns"),
+                    field_types,
+                )
+            )
+        self.journal.record(operation, points)
+
+    async def undo_last(self, progress=None, cancel=None) -> tuple:
+        """Async counterpart of DataManager.undo_last, writing batches concurrently."""
+        if self.journal is None:
+            return None, 0, ["Undo needs a journal"]
+        with profiler.operation("undo"):
+            last = self.journal.last_operation()
+            if last is None:
+                return None, 0, []
+            points = last["points"]
+            limit = asyncio.Semaphore(self.concurrency)
+            errors = []
+            written = 0
+            not_written = 0
+
+            async def write(batch):
+                nonlocal written, not_written
+                async with limit:
+                    if cancel is not None and cancel.is_set():
+                        not_written += len(batch)
+                        return 0
+                    try:
+                        with span("write"):
+                            result = await self.client.write_points(
+                                batch, time_precision="n"
+                            )
+                    except REQUEST_ERRORS as e:
+                        result = e
+                written += len(batch)
+                if progress is not None:
+                    progress(written, len(points))
+                return self._restored(batch, result, errors)
+
+            restored = sum(
+                await asyncio.gather(
+                    *(
+                        write(points[start : start + self.write_batch_size])
+                        for start in range(0, len(points), self.write_batch_size)
+                    )
+                )
+            )
+            if not_written:
+                errors.append(f"Cancelled, {not_written} point(s) not restored")
+            self._undone(last, errors)
+        return last["description"], restored, errors
+
+    async def _write_fixes_async(self, batch: list, fixed: list, errors: list) -> None:
+        """Async counterpart of DataManager._write_fixes."""
+        try:
+            with span("write"):
+                result = await self.client.write_points(
+                    [point for _, _, point in batch], time_precision="n"
+                )
+        except InfluxDBClientError as e:
+            # The server rejected some points of the batch: narrow them down
+            if len(batch) > 1:
+                middle = len(batch) // 2
+                await self._write_fixes_async(batch[:middle], fixed, errors)
+                await self._write_fixes_async(batch[middle:], fixed, errors)
             else:
-                errors.append(f"Failed to write fix for {anomaly['time']}")
+                errors.append(
+                    f"Failed to write fix for {self.anomalies.time(batch[0][0])}: {e}"
+                )
+            return
+        except REQUEST_ERRORS as e:
+            # Connection or server trouble affects the whole batch alike
+            errors.append(f"Failed to write {len(batch)} fix(es): {e}")
+            return
 
-        return success_count, errors
+        self._fixes_written(batch, result, fixed, errors)
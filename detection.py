@@ -0,0 +1,504 @@
+import warnings
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from checks import MAX_DETECTOR_WINDOW, check_names
+
+# Fewest points per shard worth sending to a worker process
+SHARD_MIN_POINTS = 250_000
+
+# Longest window rolling_before reduces with one pass per shift, faster than blocks
+SHIFTED_WINDOW_MAX = 16
+
+# Neighbours per block of rolling_median, bounds the memory of its neighbour matrix
+MEDIAN_BLOCK_CELLS = 4_000_000
+
+
+def to_value_array(values) -> np.ndarray:
+    """Convert raw point values into a float array (missing values become NaN)."""
+    return np.asarray(values, dtype=float)
+
+
+def rolling_before(values: np.ndarray, window: int, reducer, fill: float) -> np.ndarray:
+    """Reduce the `window` points preceding each index (fewer at the series start).
+
+    `reducer` is np.maximum or np.minimum. Short windows take one pass per
+    shift. Longer ones run in O(n) whatever the window: the padded series is
+    cut into blocks of `window` points, and each window combines the running
+    reduction from its start to the end of one block with the one from the
+    start of the next block to its end (van Herk/Gil-Werman). Both cover only
+    points of the window, so the result is the same.
+    """
+    n = len(values)
+    window = min(window, n)
+    if window <= SHIFTED_WINDOW_MAX:
+        out = np.full(n, fill, dtype=float)
+        for shift in range(1, window + 1):
+            reducer(out[shift:], values[:-shift], out=out[shift:])
+        return out
+    blocks = -(-(n + window) // window)
+    padded = np.full(blocks * window, fill, dtype=float)
+    padded[window : window + n] = values
+    # Running reduction from the start of each block, and to the end of it
+    forward = reducer.accumulate(padded.reshape(blocks, window), axis=1).ravel()
+    backward = reducer.accumulate(padded.reshape(blocks, window)[:, ::-1], axis=1)[
+        :, ::-1
+    ].ravel()
+    # The window of index i is padded[i : i + window]
+    return reducer(backward[:n], forward[window - 1 : window - 1 + n])
+
+
+def rolling_after(values: np.ndarray, window: int, reducer, fill: float) -> np.ndarray:
+    """Reduce the `window` points following each index (fewer at the series end)."""
+    return rolling_before(values[::-1], window, reducer, fill)[::-1]
+
+
+def detect_bounds(values: np.ndarray, min_val: float, max_val: float) -> np.ndarray:
+    """Return indices of points outside [min_val, max_val]."""
+    return np.flatnonzero(~((values >= min_val) & (values <= max_val)))
+
+
+def monotonicity_candidates(
+    values: np.ndarray, context_size: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """Find isolated peaks/dips that break the trend of the surrounding context.
+
+    Returns the candidate indices and, per candidate, whether it is still
+    flagged when it directly follows a flagged point (see `suppress_consecutive`).
+    """
+    n = len(values)
+    if context_size < 1 or n < 3:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=bool)
+
+    max_before = rolling_before(values, context_size, np.maximum, -np.inf)
+    min_before = rolling_before(values, context_size, np.minimum, np.inf)
+    max_after = rolling_after(values, context_size, np.maximum, -np.inf)
+    min_after = rolling_after(values, context_size, np.minimum, np.inf)
+    # Trend before the anomaly excluding the immediate predecessor, which may
+    # itself be the anomaly this point is correcting
+    max_before_excl_prev = np.full(n, -np.inf)
+    max_before_excl_prev[1:] = rolling_before(
+        values, context_size - 1, np.maximum, -np.inf
+    )[:-1]
+
+    inner = slice(1, n - 1)
+    curr = values[inner]
+    prev = values[:-2]
+    nxt = values[2:]
+
+    is_peak = (curr > prev) & (curr > nxt)
+    is_dip = (curr < prev) & (curr < nxt)
+    peak = is_peak & (curr > max_before[inner]) & (curr > max_after[inner])
+    dip = is_dip & (curr < max_before[inner]) & (curr < min_after[inner])
+    # Whether the candidate is still flagged when directly following a flagged point
+    peak_after_flag = peak & (curr > max_before_excl_prev[inner])
+    dip_after_flag = dip & (curr < min_before[inner])
+
+    candidates = np.flatnonzero(peak | dip)
+    return candidates + 1, (peak_after_flag | dip_after_flag)[candidates]
+
+
+def suppress_consecutive(
+    candidates, still_flagged, last_flagged_idx: int = -2
+) -> tuple[list, int]:
+    """Drop candidates that merely correct the flagged point right before them.
+
+    Returns the positions of the kept candidates and the updated
+    `last_flagged_idx` so callers can carry it across chunks and series.
+    """
+    kept = []
+    for pos, (idx, keep) in enumerate(zip(candidates, still_flagged)):
+        if idx != last_flagged_idx + 1 or keep:
+            kept.append(pos)
+            last_flagged_idx = idx
+    return kept, last_flagged_idx
+
+
+def to_time_array(times) -> np.ndarray:
+    """Convert epoch ns integers into an int64 array."""
+    return np.asarray(times, dtype=np.int64)
+
+
+def rolling_sum(values: np.ndarray, window: int) -> tuple[np.ndarray, np.ndarray]:
+    """Sum and count the non-NaN points within `window` of each index, excluding it.
+
+    Neighbours are added in a fixed order, so a point gets the same result in
+    any slice of the series that holds its whole window. Differences of
+    cumulative sums would take O(n) rather than O(n * window), but round
+    differently depending on where the slice starts, which breaks that for
+    chunked and sharded scans. Windows are capped at MAX_DETECTOR_WINDOW.
+    """
+    valid = ~np.isnan(values)
+    filled = np.where(valid, values, 0.0)
+    total = np.zeros(len(values))
+    count = np.zeros(len(values))
+    for shift in range(1, min(window, len(values) - 1) + 1):
+        total[shift:] += filled[:-shift]
+        count[shift:] += valid[:-shift]
+        total[:-shift] += filled[shift:]
+        count[:-shift] += valid[shift:]
+    return total, count
+
+
+def rolling_squares(values: np.ndarray, centre: np.ndarray, window: int) -> np.ndarray:
+    """Sum the squared distances of the non-NaN neighbours within `window` of each index from `centre` there.
+
+    Summing centred differences keeps the variance exact at large
+    magnitudes, where the sum of squares minus the squared mean cancels out.
+    The centre differs per index, so this takes O(n * window) like
+    `rolling_sum`.
+    """
+    valid = ~np.isnan(values)
+    total = np.zeros(len(values))
+    for shift in range(1, min(window, len(values) - 1) + 1):
+        before = values[:-shift] - centre[shift:]
+        total[shift:] += np.where(valid[:-shift], before * before, 0.0)
+        after = values[shift:] - centre[:-shift]
+        total[:-shift] += np.where(valid[shift:], after * after, 0.0)
+    return total
+
+
+def rolling_median(
+    values: np.ndarray, window: int, cells: int = MEDIAN_BLOCK_CELLS
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Median, median absolute deviation and count of the non-NaN neighbours within `window` of each index.
+
+    Selecting the medians takes O(n * window). The neighbour matrix is built
+    for as many indices at a time as fit `cells` neighbours, so its memory
+    does not grow with the series or the window.
+    """
+    n = len(values)
+    median = np.full(n, np.nan)
+    mad = np.full(n, np.nan)
+    count = np.zeros(n, dtype=np.int64)
+    padded = np.concatenate([np.full(window, np.nan), values, np.full(window, np.nan)])
+    windows = np.lib.stride_tricks.sliding_window_view(padded, 2 * window + 1)
+    neighbours = np.r_[0:window, window + 1 : 2 * window + 1]
+    block = max(1, cells // len(neighbours))
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # All-NaN neighbourhoods
+        for start in range(0, n, block):
+            rows = windows[start : start + block][:, neighbours]
+            middle = np.nanmedian(rows, axis=1)
+            median[start : start + block] = middle
+            mad[start : start + block] = np.nanmedian(
+                np.abs(rows - middle[:, None]), axis=1
+            )
+            count[start : start + block] = (~np.isnan(rows)).sum(axis=1)
+    return median, mad, count
+
+
+def _window(options: dict, key: str) -> int:
+    """Read a rolling window option, 30 neighbours on either side by default."""
+    window = max(1, int(options.get(key, 30)))
+    if window > MAX_DETECTOR_WINDOW:
+        raise ValueError(
+            f"'{key}' must be at most {MAX_DETECTOR_WINDOW}, detection time "
+            "grows with the window"
+        )
+    return window
+
+
+class Detector:
+    """Flags anomalies in the array-backed points of one series.
+
+    `detect` gets the values as a float array (NaN for missing) and, if
+    `needs_times`, the epoch ns times, and returns the flagged indices with,
+    per index, whether it is still flagged directly after a flagged point
+    (see `suppress_consecutive`). A point may only be judged by the `lookback`
+    points before and `lookahead` points after it, so the scan can feed any
+    window with that much context and get the same result as for the whole
+    series.
+    """
+
+    name = ""
+    lookback = 0
+    lookahead = 0
+    needs_times = False
+
+    def detect(self, values: np.ndarray, times) -> tuple[np.ndarray, np.ndarray]:
+        raise NotImplementedError
+
+    @staticmethod
+    def flag(mask: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Flag the indices of a boolean mask, never suppressed."""
+        flagged = np.flatnonzero(mask)
+        return flagged, np.ones(len(flagged), dtype=bool)
+
+
+class BoundsDetector(Detector):
+    """Values outside [min, max]."""
+
+    name = "bounds"
+
+    def __init__(self, context_size: int, options: dict):
+        self.min_val = options["min"]
+        self.max_val = options["max"]
+
+    def detect(self, values, times):
+        flagged = detect_bounds(values, self.min_val, self.max_val)
+        return flagged, np.ones(len(flagged), dtype=bool)
+
+
+class MonotonicityDetector(Detector):
+    """Isolated peaks and dips that break the trend of their context."""
+
+    name = "monotonicity"
+
+    def __init__(self, context_size: int, options: dict):
+        self.context_size = context_size
+        self.lookback = self.lookahead = max(context_size, 1)
+
+    def detect(self, values, times):
+        return monotonicity_candidates(values, self.context_size)
+
+
+class RateDetector(Detector):
+    """Changes faster than `max_rate` units per second."""
+
+    name = "rate"
+    lookback = 1
+    needs_times = True
+
+    def __init__(self, context_size: int, options: dict):
+        if options.get("max_rate") is None:
+            raise ValueError(
+                "Rate of change check needs 'max_rate' in the entity config"
+            )
+        self.max_rate = float(options["max_rate"])
+
+    def detect(self, values, times):
+        mask = np.zeros(len(values), dtype=bool)
+        if len(values) > 1:
+            seconds = np.diff(times) / 1e9
+            with np.errstate(divide="ignore", invalid="ignore"):
+                rate = np.abs(np.diff(values)) / seconds
+            mask[1:] = rate > self.max_rate
+        return self.flag(mask)
+
+
+class ZScoreDetector(Detector):
+    """Points more than `zscore` standard deviations from their neighbours' mean."""
+
+    name = "zscore"
+
+    def __init__(self, context_size: int, options: dict):
+        self.threshold = float(options.get("zscore", 4.0))
+        self.window = _window(options, "zscore_window")
+        self.lookback = self.lookahead = self.window
+
+    def detect(self, values, times):
+        total, count = rolling_sum(values, self.window)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = total / count
+            deviation = values - mean
+            std = np.sqrt(rolling_squares(values, mean, self.window) / count)
+            distance = np.abs(deviation) - self.threshold * std
+        # At least two neighbours that are not all equal
+        return self.flag((count >= 2) & (std > 0) & (distance > 0))
+
+
+class MADDetector(Detector):
+    """Points more than `mad` scaled median absolute deviations from their neighbours' median.
+
+    Unlike the z-score, one large outlier does not widen the band for the
+    points around it.
+    """
+
+    name = "mad"
+
+    def __init__(self, context_size: int, options: dict):
+        self.threshold = float(options.get("mad", 4.0))
+        self.window = _window(options, "mad_window")
+        self.lookback = self.lookahead = self.window
+
+    def detect(self, values, times):
+        median, mad, count = rolling_median(values, self.window)
+        # 1.4826 * MAD estimates the standard deviation of normal noise
+        with np.errstate(invalid="ignore"):
+            distance = np.abs(values - median) - self.threshold * 1.4826 * mad
+        return self.flag((count >= 2) & (mad > 0) & (distance > 0))
+
+
+class StuckDetector(Detector):
+    """Runs of `stuck_run` identical values, flagged once where the run gets that long."""
+
+    name = "stuck"
+
+    def __init__(self, context_size: int, options: dict):
+        self.run = max(2, int(options.get("stuck_run", 30)))
+        self.lookback = self.run
+
+    def detect(self, values, times):
+        n = len(values)
+        same = np.zeros(n, dtype=bool)
+        same[1:] = values[1:] == values[:-1]
+        # Start of the current run of equal values at each index
+        starts = np.where(same, 0, np.arange(n))
+        np.maximum.accumulate(starts, out=starts)
+        return self.flag(np.arange(n) - starts == self.run - 1)
+
+
+class GapDetector(Detector):
+    """Points that follow more than `max_gap` seconds without data."""
+
+    name = "gaps"
+    lookback = 1
+    needs_times = True
+
+    def __init__(self, context_size: int, options: dict):
+        self.max_gap = int(float(options.get("max_gap", 3600)) * 1e9)
+
+    def detect(self, values, times):
+        mask = np.zeros(len(values), dtype=bool)
+        mask[1:] = np.diff(times) > self.max_gap
+        return self.flag(mask)
+
+
+class DuplicateTimeDetector(Detector):
+    """Points whose timestamp does not advance past the previous point's."""
+
+    name = "duplicates"
+    lookback = 1
+    needs_times = True
+
+    def __init__(self, context_size: int, options: dict):
+        pass
+
+    def detect(self, values, times):
+        mask = np.zeros(len(values), dtype=bool)
+        mask[1:] = np.diff(times) <= 0
+        return self.flag(mask)
+
+
+class CounterResetDetector(Detector):
+    """Drops of more than `reset_drop` in a counter that should only grow."""
+
+    name = "counter_reset"
+    lookback = 1
+
+    def __init__(self, context_size: int, options: dict):
+        self.drop = float(options.get("reset_drop", 0))
+
+    def detect(self, values, times):
+        mask = np.zeros(len(values), dtype=bool)
+        mask[1:] = values[:-1] - values[1:] > self.drop
+        return self.flag(mask)
+
+
+# Available detectors by check name, see checks.CHECKS for their labels
+DETECTORS = {
+    detector.name: detector
+    for detector in (
+        BoundsDetector,
+        MonotonicityDetector,
+        RateDetector,
+        ZScoreDetector,
+        MADDetector,
+        StuckDetector,
+        GapDetector,
+        DuplicateTimeDetector,
+        CounterResetDetector,
+    )
+}
+
+
+def build_detectors(check_type: str, context_size: int, options: dict) -> list:
+    """Create the detectors of a check type, configured from entity `options`."""
+    return [
+        DETECTORS[name](context_size, options)
+        for name in dict.fromkeys(check_names(check_type, options))
+    ]
+
+
+def run_detectors(detectors: list, values: np.ndarray, times) -> tuple:
+    """Run several detectors over the same arrays and merge their flags.
+
+    Returns the flagged indices in order and whether each is still flagged
+    after a flagged point, which holds if any detector that flagged it says so.
+    """
+    if len(detectors) == 1:
+        return detectors[0].detect(values, times)
+    results = [detector.detect(values, times) for detector in detectors]
+    indices = np.concatenate([flagged for flagged, _ in results])
+    keep = np.concatenate([still for _, still in results])
+    flagged, inverse = np.unique(indices, return_inverse=True)
+    still_flagged = np.zeros(len(flagged), dtype=bool)
+    np.logical_or.at(still_flagged, inverse, keep)
+    return flagged, still_flagged
+
+
+def _detect_shard(
+    memory_name: str, length: int, with_times: bool, detectors: list, start, end
+) -> tuple:
+    """Run detectors in a worker process over points [start, end) of shared arrays.
+
+    The shared block holds the float values, followed by the int64 times if
+    `with_times`. Returns the flags of the whole slice.
+    """
+    memory = shared_memory.SharedMemory(name=memory_name)
+    try:
+        values = np.ndarray(length, np.float64, memory.buf)[start:end]
+        times = None
+        if with_times:
+            times = np.ndarray(length, np.int64, memory.buf, length * 8)[start:end]
+        flagged, still_flagged = run_detectors(detectors, values, times)
+        del values, times  # The block cannot be closed while they refer to it
+    finally:
+        memory.close()
+    return flagged + start, still_flagged
+
+
+def run_detectors_sharded(
+    detectors: list, values: np.ndarray, times, executor, shards: int
+) -> tuple:
+    """Like run_detectors, but split by time over the worker processes of `executor`.
+
+    The arrays are copied once into shared memory and each worker checks one
+    segment plus the detectors' lookback/lookahead on either side, keeping
+    the flags of its own segment only. By the Detector contract this gives
+    the same flags as a single pass. Suppression of consecutive flags is left
+    to the caller, which sees the merged flags and so handles the seams
+    between segments like any other neighbouring points.
+    """
+    length = len(values)
+    shards = min(shards, length // SHARD_MIN_POINTS)
+    if shards < 2:
+        return run_detectors(detectors, values, times)
+    margin = max(max(d.lookback, d.lookahead) for d in detectors)
+    arrays = [values.astype(np.float64, copy=False)]
+    if times is not None:
+        arrays.append(times.astype(np.int64, copy=False))
+    memory = shared_memory.SharedMemory(create=True, size=length * 8 * len(arrays))
+    futures = []
+    try:
+        for number, array in enumerate(arrays):
+            np.ndarray(length, array.dtype, memory.buf, number * length * 8)[:] = array
+        bounds = np.linspace(0, length, shards + 1).astype(int).tolist()
+        futures = [
+            executor.submit(
+                _detect_shard,
+                memory.name,
+                length,
+                times is not None,
+                detectors,
+                max(0, start - margin),
+                min(length, end + margin),
+            )
+            for start, end in zip(bounds, bounds[1:])
+        ]
+        results = []
+        for (start, end), future in zip(zip(bounds, bounds[1:]), futures):
+            flagged, still_flagged = future.result()
+            own = (flagged >= start) & (flagged < end)
+            results.append((flagged[own], still_flagged[own]))
+    finally:
+        for future in futures:
+            future.cancel()  # Segments not started yet after a failed one
+        memory.close()
+        memory.unlink()
+    return (
+        np.concatenate([flagged for flagged, _ in results]),
+        np.concatenate([still for _, still in results]),
+    )
@@ -1,19 +1,13 @@
-import tkinter as tk
 import os
 import sys
 import logging
 from logging.handlers import RotatingFileHandler
-from influxdb import InfluxDBClient
 from config import InfluxDBConfig
-from ui import InfluxDataCleaner
-from data import DataManager
+from cli import parse_args, run_headless
 from platformdirs import user_config_dir, user_state_dir
 
-# Set up initial logging to stderr (console) so it’s available immediately
-logging.basicConfig(
-    level=logging.DEBUG, format="%(asctime)s - %(levelname)s - %(message)s"
-)
 logger = logging.getLogger(__name__)
+app_name = "influx_data_cleaner"
 
 
 def get_script_dir():
@@ -113,34 +107,146 @@ def get_app_paths(app_name="influx_data_cleaner"):
     return config_file, state_file, log_file
 
 
-# Get paths and set up rotating file handler
-app_name = "influx_data_cleaner"
-config_file, state_file, log_file = get_app_paths(app_name)
-handler = RotatingFileHandler(
-    log_file, maxBytes=1_000_000, backupCount=3
-)  # 1MB limit, 3 backups
-handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
-logger.handlers = []  # Clear the default stderr handler
-logger.addHandler(handler)
+def setup_logging(log_file):
+    """Send this module's log and the operation timings to a rotating log file."""
+    handler = RotatingFileHandler(
+        log_file, maxBytes=1_000_000, backupCount=3
+    )  # 1MB limit, 3 backups
+    handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+    logger.handlers = []  # Clear the default stderr handler
+    logger.addHandler(handler)
+    # Operation timings from profiling.py go to the log file only
+    profiling_logger = logging.getLogger("profiling")
+    profiling_logger.addHandler(handler)
+    profiling_logger.propagate = False
+
+
+def create_data_manager(influx_config, state_file):
+    """Connect to InfluxDB and set up the DataManager shared by GUI and headless mode."""
+    # Imported here as they are slow to load: the GUI calls this on a worker
+    # thread while its window comes up
+    from cache import SeriesCache
+    from connection import create_client
+    from data import DataManager, SCAN_PROCESSES, SCAN_WORKERS, WRITE_BATCH_SIZE
+    from watermarks import WatermarkStore
+
+    return DataManager(
+        create_client(influx_config),
+        write_batch_size=influx_config.get("write_batch_size", WRITE_BATCH_SIZE),
+        scan_workers=influx_config.get("scan_workers", SCAN_WORKERS),
+        columnar_decoding=influx_config.get("columnar_decoding", False),
+        scan_processes=influx_config.get("scan_processes", SCAN_PROCESSES),
+        # One cache file per database, next to the state file
+        cache=SeriesCache(
+            os.path.join(
+                os.path.dirname(state_file),
+                f"{app_name}.{influx_config['database']}.cache.sqlite",
+            )
+        ),
+        watermarks=WatermarkStore(
+            os.path.join(
+                os.path.dirname(state_file),
+                f"{app_name}.{influx_config['database']}.watermarks.json",
+            )
+        ),
+        journal=create_journal(influx_config, state_file),
+    )
 
 
-def main():
-    root = tk.Tk()
-    config_file, state_file, _ = get_app_paths(app_name)
+def create_journal(influx_config, state_file):
+    """Open the undo journal of the database, next to the state file."""
+    from journal import ChangeJournal
 
-    config_manager = InfluxDBConfig(config_file)
-    influx_config = config_manager.get_influxdb_config()
-    client = InfluxDBClient(
+    return ChangeJournal(
+        os.path.join(
+            os.path.dirname(state_file),
+            f"{app_name}.{influx_config['database']}.journal.jsonl",
+        )
+    )
+
+
+def create_async_data_manager(influx_config, state_file, concurrency):
+    """Set up an AsyncDataManager with the asyncio client, which needs aiohttp."""
+    from async_client import AsyncInfluxDBClient
+    from connection import connection_settings
+    from data import AsyncDataManager, SCAN_WORKERS, WRITE_BATCH_SIZE
+
+    settings = connection_settings(influx_config)
+    client = AsyncInfluxDBClient(
         host=influx_config["host"],
         port=influx_config["port"],
         username=influx_config["username"],
         password=influx_config["password"],
         database=influx_config["database"],
+        pool_size=concurrency,
+        connect_timeout=settings["connect_timeout"],
+        read_timeout=settings["read_timeout"],
+        retries=settings["retries"],
+        retry_backoff=settings["retry_backoff"],
+        gzip=settings["gzip"],
     )
-    data_manager = DataManager(client)
+    return AsyncDataManager(
+        client,
+        write_batch_size=influx_config.get("write_batch_size", WRITE_BATCH_SIZE),
+        scan_workers=influx_config.get("scan_workers", SCAN_WORKERS),
+        concurrency=concurrency,
+        journal=create_journal(influx_config, state_file),
+    )
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    # Paths and logging are set up here rather than on import, as scan worker
+    # processes import this module again. Log to stderr (console) until the
+    # log file is known
+    logging.basicConfig(
+        level=logging.DEBUG, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    config_file, state_file, log_file = get_app_paths(app_name)
+    setup_logging(log_file)
+
+    config_manager = InfluxDBConfig(config_file)
+    if args.headless and args.async_requests > 0:
+        sys.exit(
+            run_headless(
+                args,
+                config_manager,
+                create_async_data_manager(
+                    config_manager.get_influxdb_config(),
+                    state_file,
+                    args.async_requests,
+                ),
+            )
+        )
+    if args.headless:
+        # No tkinter/ttkbootstrap import at all, so this runs without a display
+        data_manager = create_data_manager(
+            config_manager.get_influxdb_config(), state_file
+        )
+        sys.exit(run_headless(args, config_manager, data_manager))
+
+    # Set up the client on a worker thread while the window is built, the UI
+    # enables its buttons once it is ready
+    from concurrent.futures import ThreadPoolExecutor
+
+    setup = ThreadPoolExecutor(max_workers=1, thread_name_prefix="influx-setup")
+    data_manager = setup.submit(
+        create_data_manager, config_manager.get_influxdb_config(), state_file
+    )
+    setup.shutdown(wait=False)
+
+    import tkinter as tk
+    from ui import InfluxDataCleaner
+
+    root = tk.Tk()
     app = InfluxDataCleaner(root, config_manager, data_manager, state_file)
     root.mainloop()
 
 
 if __name__ == "__main__":
+    # Scan worker processes of the frozen executable start here, see scan_processes
+    import multiprocessing
+
+    multiprocessing.freeze_support()
     main()
@@ -0,0 +1,82 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class OperationCancelled(Exception):
+    """Raised when a running operation is cancelled through its cancel event."""
+
+
+class JobRunner:
+    """Runs long operations on a worker thread and reports back on the Tk thread.
+
+    The worker never touches Tk: progress, results and errors are passed
+    through a thread-safe queue that is drained with `root.after`.
+    """
+
+    def __init__(self, root, poll_interval: int = 50):
+        self.root = root
+        self.poll_interval = poll_interval  # Milliseconds between queue polls
+        self.executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="influx-job"
+        )
+        self.queue = queue.Queue()
+        self.cancel_event = None
+
+    @property
+    def busy(self) -> bool:
+        return self.cancel_event is not None
+
+    def submit(self, func, on_done, on_error=None, on_progress=None) -> bool:
+        """Run `func(progress, cancel)` on the worker thread.
+
+        `progress(done, total)` may be called from the worker; `cancel` is a
+        threading.Event the worker should check. The callbacks run on the Tk
+        thread. Returns False if another job is still running.
+        """
+        if self.busy:
+            return False
+        cancel = threading.Event()
+        self.cancel_event = cancel
+
+        def progress(done, total):
+            self.queue.put(("progress", (done, total)))
+
+        def run():
+            try:
+                self.queue.put(("done", func(progress, cancel)))
+            except Exception as e:
+                self.queue.put(("error", e))
+
+        self.executor.submit(run)
+        self.root.after(self.poll_interval, self._poll, on_done, on_error, on_progress)
+        return True
+
+    def cancel(self) -> None:
+        """Ask the running job to stop at its next checkpoint."""
+        if self.cancel_event is not None:
+            self.cancel_event.set()
+
+    def shutdown(self) -> None:
+        self.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _poll(self, on_done, on_error, on_progress):
+        try:
+            while True:
+                kind, payload = self.queue.get_nowait()
+                if kind == "progress":
+                    if on_progress is not None:
+                        on_progress(*payload)
+                    continue
+                # The job finished: free the runner before the callbacks so
+                # they can start a follow-up job
+                self.cancel_event = None
+                if kind == "done":
+                    on_done(payload)
+                elif on_error is not None:
+                    on_error(payload)
+                return
+        except queue.Empty:
+            pass
+        self.root.after(self.poll_interval, self._poll, on_done, on_error, on_progress)
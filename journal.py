@@ -0,0 +1,168 @@
+import json
+import os
+import threading
+import time
+
+# Latest operations that can be undone, older ones are dropped from the journal
+KEEP_OPERATIONS = 20
+
+
+class ChangeJournal:
+    """Write-ahead journal of deletes and fixes, so they can be undone.
+
+    A file of JSON lines. An operation starts with a 'begin' entry. Before
+    each batch is sent, the points it deletes or overwrites are appended as a
+    'points' entry with their measurement, tags, time (epoch ns) and fields,
+    and synced to disk. Undoing an operation writes those points back and
+    appends an 'undone' entry, so the next undo goes one operation further
+    back.
+
+    The offset of every line is indexed as the file grows, so only the lines
+    of the operation being undone are read again. Entries of undone
+    operations, of operations without points and of all but the latest
+    KEEP_OPERATIONS are dead weight; once they take up more of the file than
+    the rest, the file is rewritten without them.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        # Operation id -> {'begin': entry, 'lines': [(offset, length) of its lines]}
+        self._index = {}
+        self._indexed = 0  # Bytes of the file indexed so far
+
+    def _append(self, entry: dict) -> None:
+        line = json.dumps(entry, separators=(",", ":")) + "\n"
+        with self._lock:
+            with open(self.path, "a+b") as f:
+                if f.seek(0, os.SEEK_END):
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        # Start afresh after a line cut short by a crash
+                        line = "\n" + line
+                f.write(line.encode("utf-8"))
+                f.flush()
+                os.fsync(f.fileno())
+            self._update_index()
+
+    def _update_index(self) -> None:
+        """Index the complete lines appended since the last call, by this or another process."""
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            size = 0
+        if size < self._indexed:
+            # Rewritten elsewhere, start over
+            self._index = {}
+            self._indexed = 0
+        if size == self._indexed:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self._indexed)
+            offset = self._indexed
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # Still being written, or cut short by a crash
+                self._index_line(line, offset)
+                offset += len(line)
+        self._indexed = offset
+
+    def _index_line(self, line: bytes, offset: int) -> None:
+        try:
+            entry = json.loads(line)
+        except json.JSONDecodeError:
+            return  # Cut short by a crash while appending
+        operation = entry.get("operation")
+        if entry.get("entry") == "begin":
+            self._index[operation] = {"begin": entry, "lines": [(offset, len(line))]}
+            if len(self._index) > KEEP_OPERATIONS:
+                # Out of reach of undo
+                del self._index[min(self._index)]
+        elif entry.get("entry") == "points" and operation in self._index:
+            self._index[operation]["lines"].append((offset, len(line)))
+        elif entry.get("entry") == "undone":
+            self._index.pop(operation, None)
+
+    def _pending(self) -> list:
+        """Return the ids of the operations that can be undone, oldest first."""
+        return [
+            operation
+            for operation in sorted(self._index)
+            if len(self._index[operation]["lines"]) > 1
+        ]
+
+    def _compact(self) -> None:
+        """Rewrite the file with the pending operations only, once the rest outweighs them."""
+        operations = self._pending()
+        if self._index and max(self._index) not in operations:
+            # May still be journaling its first batch, in another process
+            operations.append(max(self._index))
+        live = [
+            line for operation in operations for line in self._index[operation]["lines"]
+        ]
+        live_bytes = sum(length for _, length in live)
+        if self._indexed - live_bytes <= live_bytes:
+            return
+        temporary = self.path + ".tmp"
+        with open(self.path, "rb") as source, open(temporary, "wb") as target:
+            for offset, length in live:
+                source.seek(offset)
+                target.write(source.read(length))
+            target.flush()
+            os.fsync(target.fileno())
+        os.replace(temporary, self.path)
+        self._index = {}
+        self._indexed = 0
+        self._update_index()
+
+    def begin(self, action: str, description: str) -> int:
+        """Start an operation and return its id."""
+        operation = time.time_ns()
+        with self._lock:
+            self._update_index()
+            self._compact()
+            self._append(
+                {
+                    "entry": "begin",
+                    "operation": operation,
+                    "action": action,
+                    "description": description,
+                    "started": time.time(),
+                }
+            )
+        return operation
+
+    def record(self, operation: int, points: list) -> None:
+        """Journal the original points a batch is about to change."""
+        if points:
+            self._append({"entry": "points", "operation": operation, "points": points})
+
+    def mark_undone(self, operation: int) -> None:
+        with self._lock:
+            self._append({"entry": "undone", "operation": operation})
+            self._compact()
+
+    def last_operation(self):
+        """Return the latest operation not undone yet as a dict, or None.
+
+        Operations that never got to journal a point changed nothing and are
+        skipped. The dict holds the 'operation' id, 'action', 'description'
+        and the journaled 'points' in the order they were recorded.
+        """
+        with self._lock:
+            self._update_index()
+            pending = self._pending()
+            if not pending:
+                return None
+            entry = self._index[pending[-1]]["begin"]
+            points = []
+            with open(self.path, "rb") as f:
+                for offset, length in self._index[pending[-1]]["lines"][1:]:
+                    f.seek(offset)
+                    points.extend(json.loads(f.read(length))["points"])
+        return {
+            "operation": entry["operation"],
+            "action": entry["action"],
+            "description": entry["description"],
+            "points": points,
+        }
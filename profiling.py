@@ -0,0 +1,177 @@
+import cProfile
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger("profiling")
+
+# Finished operations kept for the Performance panel
+OPERATION_HISTORY = 50
+
+
+class Operation:
+    """Timed spans and counters of one scan, delete, fix or UI update.
+
+    Spans may nest (a 'query' span contains the 'http' span of its request),
+    so their times do not add up to the duration.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.time()
+        self.duration = None  # Seconds, set when the operation ends
+        self.spans = {}  # Span name -> [calls, seconds]
+        self.counters = {}  # E.g. points scanned and bytes received
+        self.profile_file = None  # cProfile dump, if profiling was on
+        self._lock = threading.Lock()  # scan_all adds from several threads
+
+    def add(self, span: str, seconds: float) -> None:
+        with self._lock:
+            entry = self.spans.setdefault(span, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+
+    def count(self, counter: str, amount: int) -> None:
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def throughput(self) -> str:
+        """Points per second and bytes received, if the operation counted them."""
+        parts = []
+        points = self.counters.get("points")
+        if points is not None:
+            rate = points / self.duration if self.duration else 0
+            parts.append(f"{points} points ({rate:,.0f}/s)")
+        if "bytes" in self.counters:
+            parts.append(f"{self.counters['bytes'] / 1_000_000:.1f} MB received")
+        parts.extend(
+            f"{amount} {counter}"
+            for counter, amount in self.counters.items()
+            if counter not in ("points", "bytes")
+        )
+        return ", ".join(parts)
+
+    def summary(self) -> str:
+        spans = ", ".join(
+            f"{name} {seconds:.3f}s/{calls}"
+            for name, (calls, seconds) in sorted(
+                self.spans.items(), key=lambda item: -item[1][1]
+            )
+        )
+        text = f"{self.name}: {self.duration:.3f}s"
+        if self.throughput():
+            text += f", {self.throughput()}"
+        if spans:
+            text += f"; {spans}"
+        if self.profile_file:
+            text += f"; profile: {self.profile_file}"
+        return text
+
+
+class Profiler:
+    """Collects timed spans per operation and keeps a history of operations.
+
+    The operation a span belongs to is tracked per thread; worker threads
+    started by an operation join it with `attach`. With `profile_dir` set,
+    each outermost operation also runs under cProfile (on the thread that
+    started it) and dumps its stats there.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.history = deque(maxlen=OPERATION_HISTORY)
+        self.profile_dir = None
+
+    def active(self):
+        """Return the operation of the calling thread, or None."""
+        return getattr(self._local, "operation", None)
+
+    @contextmanager
+    def attach(self, operation):
+        """Add spans of the calling thread to `operation`, e.g. in a worker pool."""
+        previous = self.active()
+        self._local.operation = operation
+        try:
+            yield operation
+        finally:
+            self._local.operation = previous
+
+    @contextmanager
+    def operation(self, name: str):
+        """Time an operation; nested operations of the same thread are separate."""
+        operation = Operation(name)
+        profile = self._start_profile() if self.active() is None else None
+        started = time.perf_counter()
+        try:
+            with self.attach(operation):
+                yield operation
+        finally:
+            operation.duration = time.perf_counter() - started
+            if profile is not None:
+                profile.disable()
+                operation.profile_file = self._dump_profile(profile, operation)
+            self.finish(operation)
+
+    def record(self, name: str, duration: float, **counters) -> Operation:
+        """Add an operation timed elsewhere, e.g. one spread over Tk event loop ticks."""
+        operation = Operation(name)
+        operation.duration = duration
+        operation.counters.update(counters)
+        self.finish(operation)
+        return operation
+
+    def finish(self, operation: Operation) -> None:
+        with self._lock:
+            self.history.append(operation)
+        logger.info(operation.summary())
+
+    @contextmanager
+    def span(self, name: str):
+        """Time a block as span `name` of the active operation, if there is one."""
+        operation = self.active()
+        if operation is None:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            operation.add(name, time.perf_counter() - started)
+
+    def count(self, counter: str, amount: int) -> None:
+        operation = self.active()
+        if operation is not None:
+            operation.count(counter, amount)
+
+    def _start_profile(self):
+        if not self.profile_dir:
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError as e:  # Another profiler is active
+            logger.warning(f"Not profiling: {e}")
+            return None
+        return profile
+
+    def _dump_profile(self, profile, operation: Operation):
+        name = re.sub(r"[^\w.-]+", "_", operation.name)
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(operation.started))
+        path = os.path.join(self.profile_dir, f"{stamp}-{name}.prof")
+        try:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            profile.dump_stats(path)
+        except OSError as e:
+            logger.warning(f"Failed to write profile {path}: {e}")
+            return None
+        return path
+
+
+# Shared by the data layer, the client and the UI
+profiler = Profiler()
+span = profiler.span
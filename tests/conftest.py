@@ -0,0 +1,264 @@
+import asyncio
+import os
+import re
+import socket
+import sys
+import threading
+
+import msgpack
+import pytest
+from aiohttp import web
+from influxdb.resultset import ResultSet
+
+# The application modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from async_client import AsyncInfluxDBClient  # noqa: E402
+
+BASE = 1_700_000_000_000_000_000  # Epoch ns of the first fake point
+TAGS = (("entity_id", "e1"), ("friendly_name", "Meter"))
+VALUES = [1.0, 2.0, 50.0, 3.0, 4.0, 60.0, 61.0, 5.0, 6.0, -7.0, 7.0, 8.0]
+
+
+def scan_args():
+    return ("kWh", "e1", "-100000d", "-0s", 2, "bounds", 0, 10)
+
+
+class FakeInflux:
+    """InfluxDB 1.x /query and /write endpoints over in-memory points.
+
+    Understands the statements the data managers send: SELECTs with tag
+    conditions, integer time bounds (relative now() bounds cover
+    everything), bounds predicates, ORDER BY time DESC and LIMIT, DELETEs,
+    SHOW FIELD KEYS and line protocol writes with ns precision. `fail` answers that many requests with 503 first, `compress`
+    gzips query responses. `authorization` keeps the header of the last query.
+    With `msgpack`, clients that accept it get msgpack responses.
+    `query_error` fails whole queries with 400, as a string left open does,
+    and `statement_error` each SELECT.
+    """
+
+    def __init__(self):
+        self.series = {
+            TAGS: {BASE + i * 1_000_000_000: v for i, v in enumerate(VALUES)}
+        }
+        self.value_type = "float"  # Type SHOW FIELD KEYS reports for 'value'
+        self.fail = 0
+        self.compress = False
+        self.msgpack = False
+        self.query_error = None
+        self.statement_error = None
+        self.requests = 0
+        self.authorization = None
+
+    def _select(self, statement):
+        conditions = [
+            (op, int(bound))
+            for op, bound in re.findall(r"time (>=|<=|>|<|=) (\d+)\b", statement)
+        ]
+        compare = {
+            ">=": lambda t, b: t >= b,
+            "<=": lambda t, b: t <= b,
+            ">": lambda t, b: t > b,
+            "<": lambda t, b: t < b,
+            "=": lambda t, b: t == b,
+        }
+        tag_conditions = [
+            (key, re.sub(r"\\(.)", r"\1", value))
+            for key, value in re.findall(
+                r"\(\"(\w+)\" = '((?:[^'\\]|\\.)*)'\)", statement
+            )
+        ]
+        bounds = re.search(r"\(value < (\S+) OR value > (\S+)\)", statement)
+        limit = re.search(r"LIMIT (\d+)", statement)
+        for tags, points in sorted(self.series.items()):
+            if any(dict(tags).get(key, "") != value for key, value in tag_conditions):
+                continue
+            times = [
+                t
+                for t in sorted(points, reverse="ORDER BY time DESC" in statement)
+                if all(compare[op](t, bound) for op, bound in conditions)
+                and (
+                    bounds is None
+                    or not float(bounds[1]) <= points[t] <= float(bounds[2])
+                )
+            ]
+            yield tags, points, times[: int(limit[1])] if limit else times
+
+    def _statement(self, statement, number):
+        if statement.startswith("SHOW FIELD KEYS"):
+            series = {
+                "name": "kWh",
+                "columns": ["fieldKey", "fieldType"],
+                "values": [["value", self.value_type]],
+            }
+            return {"statement_id": number, "series": [series]}
+        if statement.startswith("DELETE"):
+            for _, points, times in self._select(statement):
+                for t in times:
+                    del points[t]
+            return {"statement_id": number}
+        if self.statement_error:
+            return {"statement_id": number, "error": self.statement_error}
+        # SELECT * ... GROUP BY * returns the fields only, the tags are grouped
+        fields_only = statement.startswith("SELECT *")
+        series = [
+            {
+                "name": "kWh",
+                "tags": dict(tags),
+                "columns": ["time", "value"]
+                + ([] if fields_only else ["friendly_name"]),
+                "values": [
+                    [t, points[t]]
+                    + ([] if fields_only else [dict(tags)["friendly_name"]])
+                    for t in times
+                ],
+            }
+            for tags, points, times in self._select(statement)
+            if times
+        ]
+        return {"statement_id": number, "series": series}
+
+    async def query(self, request):
+        if self._failing():
+            return web.Response(status=503, text="unavailable")
+        self.authorization = request.headers.get("Authorization")
+        params = dict(request.query)
+        if request.method == "POST":
+            params.update(await request.post())
+        statements = params["q"].split("; ")
+        error = self.query_error
+        if any(re.sub(r"\\.", "", s).count("'") % 2 for s in statements):
+            error = "error parsing query: unterminated string"
+        if error:
+            return self._response(request, {"error": error}, 400)
+        results = [
+            self._statement(statement, number)
+            for number, statement in enumerate(statements)
+        ]
+        return self._response(request, {"results": results})
+
+    def _response(self, request, body, status=200):
+        if self.msgpack and "application/x-msgpack" in request.headers.get(
+            "Accept", ""
+        ):
+            response = web.Response(
+                body=msgpack.packb(body),
+                status=status,
+                content_type="application/x-msgpack",
+            )
+        else:
+            response = web.json_response(body, status=status)
+        if self.compress:
+            response.enable_compression(web.ContentCoding.gzip)
+        return response
+
+    async def write(self, request):
+        if self._failing():
+            return web.Response(status=503, text="unavailable")
+        assert request.query.get("precision") == "n"
+        for line in (await request.text()).splitlines():
+            key, fields, timestamp = line.split(" ")
+            tags = tuple(sorted(tag.split("=") for tag in key.split(",")[1:]))
+            value = dict(field.split("=") for field in fields.split(","))["value"]
+            value = int(value[:-1]) if value.endswith("i") else float(value)
+            self.series.setdefault(tuple(map(tuple, tags)), {})[int(timestamp)] = value
+        return web.Response(status=204)
+
+    def _failing(self):
+        self.requests += 1
+        if self.fail:
+            self.fail -= 1
+            return True
+        return False
+
+
+@pytest.fixture
+def server():
+    """Run a FakeInflux on a local port in a background event loop."""
+    fake = FakeInflux()
+    app = web.Application()
+    app.router.add_route("*", "/query", fake.query)
+    app.router.add_post("/write", fake.write)
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(app)
+    loop.run_until_complete(runner.setup())
+    loop.run_until_complete(web.TCPSite(runner, "127.0.0.1", port).start())
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    fake.port = port
+    yield fake
+    asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+def async_client(server, **kwargs):
+    return AsyncInfluxDBClient(
+        host="127.0.0.1", port=server.port, database="db", **kwargs
+    )
+
+
+class FakeClient:
+    """Blocking client answering queries from in-memory series of entity e1.
+
+    `series` holds (friendly_name, values) per series, one point per second
+    from BASE, returned in key order like InfluxDB. Integer time bounds are
+    applied, DELETE statements are recorded and the value field is a float
+    field.
+    """
+
+    def __init__(self, series):
+        self.series = series
+        self.deletes = []
+
+    def query(self, query, epoch=None, method="GET", raise_errors=True, **kwargs):
+        results = [
+            ResultSet(self._statement(statement, number))
+            for number, statement in enumerate(query.split("; "))
+        ]
+        return results if len(results) > 1 else results[0]
+
+    def _statement(self, statement, number):
+        if statement.startswith("SHOW FIELD KEYS"):
+            series = {
+                "name": "kWh",
+                "columns": ["fieldKey", "fieldType"],
+                "values": [["value", "float"]],
+            }
+            return {"statement_id": number, "series": [series]}
+        if statement.startswith("DELETE"):
+            self.deletes.append(statement)
+            return {"statement_id": number}
+        conditions = [
+            (op, int(bound))
+            for op, bound in re.findall(r"time (>=|>|<) (\d+)\b", statement)
+        ]
+        compare = {
+            ">=": lambda t, b: t >= b,
+            ">": lambda t, b: t > b,
+            "<": lambda t, b: t < b,
+        }
+        series = []
+        for name, values in sorted(self.series):
+            rows = [
+                [BASE + i * 1_000_000_000, value, name]
+                for i, value in enumerate(values)
+                if all(
+                    compare[op](BASE + i * 1_000_000_000, bound)
+                    for op, bound in conditions
+                )
+            ]
+            if rows:
+                series.append(
+                    {
+                        "name": "kWh",
+                        "tags": {"entity_id": "e1", "friendly_name": name},
+                        "columns": ["time", "value", "friendly_name"],
+                        "values": rows,
+                    }
+                )
+        return {"statement_id": number, "series": series}
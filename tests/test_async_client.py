@@ -0,0 +1,122 @@
+import asyncio
+
+import pytest
+from influxdb import InfluxDBClient
+from influxdb.exceptions import InfluxDBServerError
+
+from conftest import BASE, TAGS, VALUES, async_client, scan_args
+from connection import create_client
+from data import AsyncDataManager, DataManager
+from profiling import profiler
+
+
+def test_query_and_write_points(server):
+    async def run():
+        async with async_client(server) as client:
+            await client.write_points(
+                [
+                    {
+                        "measurement": "kWh",
+                        "tags": dict(TAGS),
+                        "time": BASE,
+                        "fields": {"value": 9.5},
+                    }
+                ],
+                time_precision="n",
+            )
+            return await client.query(
+                f"SELECT value FROM kWh WHERE time = {BASE}", epoch="ns"
+            )
+
+    result = asyncio.run(run())
+    assert [p["value"] for p in result.get_points()] == [9.5]
+
+
+def test_sends_the_credentials_of_the_blocking_client(server):
+    credentials = {"username": "cleaner", "password": "pässword"}
+
+    async def run():
+        async with async_client(server, **credentials) as client:
+            await client.query("SELECT value FROM kWh")
+
+    asyncio.run(run())
+    sent = server.authorization
+    InfluxDBClient(
+        host="127.0.0.1", port=server.port, database="db", **credentials
+    ).query("SELECT value FROM kWh")
+    assert sent == server.authorization
+
+
+def test_retries_gateway_errors(server):
+    server.fail = 2
+
+    async def run(retries):
+        async with async_client(server, retries=retries, retry_backoff=0) as client:
+            return await client.query(f"SELECT value FROM kWh WHERE time = {BASE}")
+
+    assert [p["value"] for p in asyncio.run(run(2)).get_points()] == [1.0]
+    assert server.requests == 3
+    server.fail = 1
+    with pytest.raises(InfluxDBServerError):
+        asyncio.run(run(0))
+
+
+def test_bytes_counted_as_received(server):
+    statement = "SELECT value, friendly_name FROM kWh"
+    blocking = create_client(
+        {
+            "host": "127.0.0.1",
+            "port": server.port,
+            "username": "root",
+            "password": "root",
+            "database": "db",
+        }
+    )
+
+    async def run():
+        async with async_client(server) as client:
+            return await client.query(statement)
+
+    received = {}
+    for server.compress in (False, True):
+        with profiler.operation("async") as operation:
+            points = list(asyncio.run(run()).get_points())
+        with profiler.operation("blocking") as blocking_operation:
+            assert list(blocking.query(statement).get_points()) == points
+        received[server.compress] = (
+            operation.counters["bytes"],
+            blocking_operation.counters["bytes"],
+        )
+    assert len(points) == len(VALUES)
+    # Uncompressed, both count the JSON body, gzipped they count less than that
+    assert received[False][0] == received[False][1]
+    assert all(gzipped < received[False][0] for gzipped in received[True])
+
+
+def test_async_manager_matches_blocking(server):
+    blocking = DataManager(
+        InfluxDBClient(host="127.0.0.1", port=server.port, database="db")
+    )
+    expected = list(blocking.scan_data(*scan_args()))
+    assert len(expected) == 4
+
+    async def run():
+        async with async_client(server) as client:
+            manager = AsyncDataManager(client, write_batch_size=2, concurrency=3)
+            anomalies = await manager.scan_data(*scan_args())
+            scanned = list(anomalies)
+            fixed = await manager.fix_selected([0, 2], "Previous Value")
+            deleted = await manager.delete_selected([1, 3])
+            return scanned, fixed, deleted
+
+    scanned, fixed, deleted = asyncio.run(run())
+    assert scanned == expected
+
+    # The same repairs through the blocking manager on a fresh copy of the data
+    written = dict(server.series[TAGS])
+    server.series[TAGS] = {BASE + i * 1_000_000_000: v for i, v in enumerate(VALUES)}
+    blocking.scan_data(*scan_args())
+    assert blocking.fix_selected([0, 2], "Previous Value") == fixed
+    assert blocking.delete_selected([1, 3]) == deleted
+    assert server.series[TAGS] == written
+    assert list(server.series) == [TAGS]  # Fixes wrote to the scanned series
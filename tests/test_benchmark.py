@@ -0,0 +1,18 @@
+import json
+
+import benchmark
+
+
+def test_benchmark_runs_at_a_small_size(tmp_path):
+    output = tmp_path / "results.json"
+    benchmark.main(
+        ["--sizes", "1k", "--context-sizes", "2", "--repeat", "1", "-o", str(output)]
+    )
+    report = json.loads(output.read_text())
+    names = [result["name"] for result in report["results"]]
+    for entity_id in benchmark.FakeInfluxDBClient(1).series:
+        assert f"delete/{entity_id}" in names
+        assert f"fix/{entity_id}" in names
+    fixes = [r for r in report["results"] if r["name"].startswith("fix/")]
+    assert all(r["points_written"] == r["anomalies"] for r in fixes)
+    assert report["startup"]["seconds"] > 0
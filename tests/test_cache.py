@@ -0,0 +1,58 @@
+import time
+
+from influxdb import InfluxDBClient
+
+import data
+from cache import SeriesCache
+from conftest import BASE, TAGS, scan_args
+from data import DataManager
+
+
+def cached_manager(server, tmp_path):
+    return DataManager(
+        InfluxDBClient(host="127.0.0.1", port=server.port, database="db"),
+        cache=SeriesCache(str(tmp_path / "cache.sqlite")),
+    )
+
+
+def test_cached_rescan_needs_no_request(server, tmp_path):
+    manager = cached_manager(server, tmp_path)
+    expected = list(manager.scan_data(*scan_args()))
+    server.requests = 0
+    assert list(manager.scan_data(*scan_args(), use_cache=True)) == expected
+    assert server.requests == 1
+    server.series.clear()  # Answered from the cache from now on
+    server.requests = 0
+    assert list(manager.scan_data(*scan_args(), use_cache=True)) == expected
+    assert server.requests == 0
+
+
+def test_cached_scan_refreshes_the_tail_after_the_interval(
+    server, tmp_path, monkeypatch
+):
+    manager = cached_manager(server, tmp_path)
+    assert len(manager.scan_data(*scan_args(), use_cache=True)) == 4
+    server.series[TAGS][time.time_ns()] = 99.0  # Written after the scan
+    server.requests = 0
+    assert len(manager.scan_data(*scan_args(), use_cache=True)) == 4
+    assert server.requests == 0
+
+    monkeypatch.setattr(data, "CACHE_REFRESH_INTERVAL", "0s")
+    anomalies = manager.scan_data(*scan_args(), use_cache=True)
+    assert server.requests == 1
+    assert [anomalies.value(idx) for idx in range(len(anomalies))][-1] == 99.0
+    assert len(anomalies) == 5
+
+
+def test_cached_entities_keep_their_own_points(server, tmp_path):
+    other = (("entity_id", "e2"), ("friendly_name", "Other"))
+    server.series[other] = {BASE + i * 1_000_000_000: 70.0 + i for i in range(3)}
+    manager = cached_manager(server, tmp_path)
+    assert len(manager.scan_data(*scan_args(), use_cache=True)) == 4
+
+    server.requests = 0
+    args = ("kWh", "e2", *scan_args()[2:])
+    anomalies = manager.scan_data(*args, use_cache=True)
+    assert server.requests == 1
+    assert {anomalies.entity_id(idx) for idx in range(len(anomalies))} == {"e2"}
+    assert [anomalies.value(idx) for idx in range(len(anomalies))] == [70, 71, 72]
@@ -0,0 +1,27 @@
+import os
+import subprocess
+import sys
+
+from checks import CHECKS
+from detection import DETECTORS
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_every_check_has_a_detector():
+    assert list(CHECKS) == list(DETECTORS)
+
+
+def test_startup_imports_leave_out_numpy():
+    process = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, config, cli, ui; print('numpy' in sys.modules)",
+        ],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    assert process.returncode == 0, process.stderr
+    assert process.stdout.splitlines()[-1] == "False"
@@ -0,0 +1,127 @@
+import csv
+import json
+
+import pytest
+
+import influx_data_cleaner
+from cli import EXIT_ANOMALIES, EXIT_CLEAN, EXIT_ERROR
+from config import InfluxDBConfig
+from conftest import TAGS, VALUES
+
+
+@pytest.fixture
+def headless(server, tmp_path, monkeypatch):
+    """Run main() in headless mode against the fake server, returns the exit code."""
+    monkeypatch.setenv("XDG_CONFIG_HOME", str(tmp_path / "config"))
+    monkeypatch.setenv("XDG_STATE_HOME", str(tmp_path / "state"))
+    config_dir = tmp_path / "config" / "influx_data_cleaner"
+    config_dir.mkdir(parents=True)
+    (config_dir / "influx_data_cleaner.config.json").write_text(
+        json.dumps(
+            {
+                "influxdb": {
+                    "host": "127.0.0.1",
+                    "port": server.port,
+                    "username": "root",
+                    "password": "root",
+                    "database": "db",
+                },
+                "entities": {
+                    "e1": {"unit": "kWh", "min": 0, "max": 10},
+                    "e2": {"unit": "kWh", "min": 0, "max": 10},  # No points
+                },
+            }
+        )
+    )
+
+    def run(*argv):
+        with pytest.raises(SystemExit) as exit_info:
+            influx_data_cleaner.main(["--headless", "--start=-100000d", *argv])
+        return exit_info.value.code
+
+    return run
+
+
+def test_exit_code_and_json_output(headless, capsys):
+    assert headless() == EXIT_ANOMALIES
+    anomalies = json.loads(capsys.readouterr().out)
+    assert [a["value"] for a in anomalies] == [50, 60, 61, -7]
+    assert anomalies[0]["context_before"][0][1] == VALUES[1]
+
+
+def test_clean_range_exits_zero(headless, capsys):
+    assert headless("-e", "e2") == EXIT_CLEAN
+    assert json.loads(capsys.readouterr().out) == []
+
+
+def test_errors_exit_two(headless, capsys):
+    assert headless("-e", "unknown") == EXIT_ERROR
+    assert "Unknown entities: unknown" in capsys.readouterr().err
+    assert headless("--check", "rate") == EXIT_ERROR  # Needs max_rate
+    assert "e1: error:" in capsys.readouterr().err
+
+
+def test_csv_output(headless, server, tmp_path):
+    output = tmp_path / "anomalies.csv"
+    assert headless("-o", str(output)) == EXIT_ANOMALIES
+    with open(output, newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert [row["value"] for row in rows] == ["50.0", "60.0", "61.0", "-7.0"]
+    assert rows[0]["prev_value"] == "2.0"
+    assert rows[0]["friendly_name"] == "Meter"
+
+
+def test_dry_run_changes_nothing(headless, server, capsys):
+    original = dict(server.series[TAGS])
+    assert headless("--delete", "--dry-run") == EXIT_ANOMALIES
+    assert "Would delete 4 of 4 anomalies" in capsys.readouterr().err
+    assert headless("--fix", "previous", "--dry-run") == EXIT_ANOMALIES
+    assert "fix kWh e1" in capsys.readouterr().err
+    assert server.series[TAGS] == original
+
+
+def test_fix_and_delete(headless, server, capsys):
+    assert headless("-e", "e1", "--fix", "previous") == EXIT_ANOMALIES
+    assert "Fixed 4 of 4 anomalies" in capsys.readouterr().err
+    # 61 took the value of 60 before it, which is still out of bounds
+    assert list(server.series[TAGS].values()) == [1, 2, 2, 3, 4, 4, 60, 5, 6, 6, 7, 8]
+    assert headless("-e", "e1", "--delete") == EXIT_ANOMALIES
+    assert "Deleted 1 of 1 anomalies" in capsys.readouterr().err
+    assert 60 not in server.series[TAGS].values()
+    assert headless("-e", "e1") == EXIT_CLEAN
+
+
+@pytest.mark.parametrize("argv", [(), ("--async-requests", "2")])
+def test_integer_fields_are_reported_as_integers(
+    headless, server, tmp_path, capsys, argv
+):
+    server.value_type = "integer"
+    assert headless(*argv) == EXIT_ANOMALIES
+    anomalies = json.loads(capsys.readouterr().out)
+    assert [repr(a["value"]) for a in anomalies] == ["50", "60", "61", "-7"]
+    assert repr(anomalies[0]["context_before"][0][1]) == "2"
+    output = tmp_path / "anomalies.csv"
+    assert headless("-o", str(output), *argv) == EXIT_ANOMALIES
+    with open(output, newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert [row["value"] for row in rows] == ["50", "60", "61", "-7"]
+    assert rows[0]["prev_value"] == "2"
+    # The average of 2 and 3, rounded as the fix would be written
+    assert headless("--fix", "average", "--dry-run", *argv) == EXIT_ANOMALIES
+    assert ": 50 -> 2\n" in capsys.readouterr().err
+
+
+def test_ignored_options_are_rejected(headless, capsys):
+    assert headless("--ranges") == EXIT_ERROR
+    assert "--ranges needs --delete" in capsys.readouterr().err
+    assert headless("--dry-run") == EXIT_ERROR
+    assert "--dry-run needs --delete or --fix" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("content", [None, "{not json", '{"entities": []}'])
+def test_config_problems_stay_off_stdout(tmp_path, capsys, content):
+    path = tmp_path / "config.json"
+    if content is not None:
+        path.write_text(content)
+    assert InfluxDBConfig(str(path)).get_entities()
+    assert capsys.readouterr().out == ""
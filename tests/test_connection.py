@@ -0,0 +1,111 @@
+import gc
+import threading
+
+import pytest
+from influxdb import InfluxDBClient
+from influxdb.exceptions import InfluxDBClientError
+
+from connection import ColumnarInfluxDBClient, _gc_paused
+from conftest import TAGS
+
+QUERIES = [
+    "SELECT value, friendly_name FROM kWh GROUP BY *",
+    "SELECT * FROM kWh WHERE time >= 1700000000000000000 GROUP BY *",
+    # Two statements, the second one without points
+    "SELECT value FROM kWh GROUP BY *; SELECT value FROM kWh WHERE time < 1",
+]
+
+
+def clients(server):
+    json_client = InfluxDBClient(
+        host="127.0.0.1",
+        port=server.port,
+        database="db",
+        headers={"Accept": "application/json"},
+    )
+    columnar = ColumnarInfluxDBClient(host="127.0.0.1", port=server.port, database="db")
+    return json_client, columnar
+
+
+def as_rows(result):
+    """The statement results with column-wise series turned back into rows."""
+    results = result if isinstance(result, list) else [result]
+    raw = []
+    for statement in results:
+        statement = dict(statement.raw)
+        statement["series"] = [
+            (
+                {
+                    **{k: v for k, v in series.items() if k != "data"},
+                    "values": [list(row) for row in zip(*series["data"])],
+                }
+                if "data" in series
+                else series
+            )
+            for series in statement.get("series", [])
+        ]
+        raw.append(statement)
+    return raw
+
+
+@pytest.mark.parametrize("query", QUERIES)
+@pytest.mark.parametrize("msgpack", [True, False])
+def test_columnar_decoding_matches_json(server, query, msgpack):
+    server.msgpack = msgpack  # Servers before InfluxDB 1.4 only answer JSON
+    server.series[(("entity_id", "e2"), ("friendly_name", "Other"))] = {1: 5.5, 2: 7}
+    json_client, columnar = clients(server)
+    expected = json_client.query(query, epoch="ns")
+    result = columnar.query_columns(query)
+    assert as_rows(result) == as_rows(expected)
+    if query == QUERIES[0]:
+        series = as_rows(result)[0]["series"]
+        assert [s["tags"] for s in series] == [
+            dict(TAGS),
+            {"entity_id": "e2", "friendly_name": "Other"},
+        ]
+
+
+@pytest.mark.parametrize("msgpack", [True, False])
+def test_columnar_decoding_raises_like_json(server, msgpack):
+    server.msgpack = msgpack
+    json_client, columnar = clients(server)
+    server.statement_error = "field type conflict"
+    with pytest.raises(InfluxDBClientError, match="field type conflict"):
+        json_client.query(QUERIES[0], epoch="ns")
+    with pytest.raises(InfluxDBClientError, match="field type conflict"):
+        columnar.query_columns(QUERIES[0])
+    server.statement_error = None
+    server.query_error = "error parsing query"
+    with pytest.raises(InfluxDBClientError, match="error parsing query") as expected:
+        json_client.query(QUERIES[0], epoch="ns")
+    with pytest.raises(InfluxDBClientError, match="error parsing query") as raised:
+        columnar.query_columns(QUERIES[0])
+    assert raised.value.code == expected.value.code == 400
+
+
+def test_gc_pause_lasts_until_the_last_decode_ends():
+    assert gc.isenabled()
+    first_in, second_done = threading.Event(), threading.Event()
+
+    def decode():
+        with _gc_paused():
+            first_in.set()
+            second_done.wait()
+
+    thread = threading.Thread(target=decode)
+    thread.start()
+    first_in.wait()
+    with _gc_paused():
+        assert not gc.isenabled()
+    assert not gc.isenabled()  # The first decode is still running
+    second_done.set()
+    thread.join()
+    assert gc.isenabled()
+
+    gc.disable()
+    try:
+        with _gc_paused():
+            pass
+        assert not gc.isenabled()  # Left off as it was
+    finally:
+        gc.enable()
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+import detection
+from data import DataManager
+from checks import MAX_DETECTOR_WINDOW
+from detection import (
+    MADDetector,
+    ZScoreDetector,
+    build_detectors,
+    rolling_after,
+    rolling_before,
+    run_detectors,
+)
+
+
+@pytest.mark.parametrize("detector", [ZScoreDetector, MADDetector])
+@pytest.mark.parametrize("base", [1e5, 1e7, 1.2e9])
+def test_outliers_found_at_meter_magnitudes(detector, base):
+    values = base + np.random.default_rng(1).normal(0, 0.05, 20_000)
+    values[[100, 9_000]] += 5
+    flagged, _ = detector(10, {}).detect(values, None)
+    assert {100, 9_000} <= set(flagged.tolist())
+    assert len(flagged) < 20  # Not the noise, which the sum of squares flagged
+
+
+def test_counter_near_1e9_is_not_flagged():
+    values = 1.2e9 + np.cumsum(np.random.default_rng(2).uniform(0, 1, 20_000))
+    for detector in (ZScoreDetector, MADDetector):
+        assert len(detector(10, {}).detect(values, None)[0]) == 0
+
+
+def test_flat_neighbourhood_needs_a_spread():
+    values = np.ones(100)
+    values[50] = 1.001
+    values[10] = np.nan
+    for detector in (ZScoreDetector, MADDetector):
+        assert len(detector(10, {}).detect(values, None)[0]) == 0
+
+
+@pytest.mark.parametrize(
+    "check_type", ["monotonicity", "stuck", "zscore", "monotonicity,stuck,zscore"]
+)
+def test_sharded_detection_matches_a_single_pass(monkeypatch, check_type):
+    monkeypatch.setattr(detection, "SHARD_MIN_POINTS", 500)
+    rng = np.random.default_rng(3)
+    values = np.repeat(rng.uniform(0, 10, 400), rng.integers(1, 40, 400))[:4_000]
+    values += rng.choice([0, 0, 0, 0.5], len(values))
+    values[rng.choice(len(values), 80, replace=False)] += 30
+    # Across the seams of three shards: a stuck run, and a point that only
+    # stands out from the neighbours on one side
+    values[1325:1345] = 5.0
+    values[2659:2666] = [0, 20, 0, 20, 0, 20, 0]
+    values[2666] = 12
+    values[2667:2674] = [10, 10.1, 9.9, 10, 10.1, 9.9, 10]
+    detectors = build_detectors(check_type, 3, {"stuck_run": 5, "zscore_window": 7})
+    manager = DataManager(None, scan_processes=3)
+    try:
+        flagged, still_flagged = manager._detector_runner()(detectors, values, None)
+    finally:
+        manager._process_pool.shutdown()
+    expected, expected_still = run_detectors(detectors, values, None)
+    assert len(expected)
+    assert flagged.tolist() == expected.tolist()
+    assert still_flagged.tolist() == expected_still.tolist()
+
+
+@pytest.mark.parametrize("window", [0, 1, 3, 16, 17, 50, 999, 5_000])
+def test_rolling_extremes_match_shifted_passes(window):
+    values = np.random.default_rng(4).integers(0, 20, 1_000).astype(float)
+    values[[0, 500]] = np.nan
+    for reducer, fill in ((np.maximum, -np.inf), (np.minimum, np.inf)):
+        before = np.full(len(values), fill)
+        after = np.full(len(values), fill)
+        for shift in range(1, min(window, len(values)) + 1):
+            reducer(before[shift:], values[:-shift], out=before[shift:])
+            reducer(after[:-shift], values[shift:], out=after[:-shift])
+        result = rolling_before(values, window, reducer, fill)
+        assert np.array_equal(result, before, equal_nan=True)
+        result = rolling_after(values, window, reducer, fill)
+        assert np.array_equal(result, after, equal_nan=True)
+
+
+@pytest.mark.parametrize(
+    "detector, key", [(ZScoreDetector, "zscore_window"), (MADDetector, "mad_window")]
+)
+def test_windows_are_capped(detector, key):
+    assert detector(2, {key: MAX_DETECTOR_WINDOW}).window == MAX_DETECTOR_WINDOW
+    with pytest.raises(ValueError, match=key):
+        detector(2, {key: MAX_DETECTOR_WINDOW + 1})
@@ -0,0 +1,145 @@
+import pytest
+
+from conftest import FakeClient
+from data import DataManager
+from watermarks import WatermarkStore
+
+
+def scan(data_manager, incremental=True):
+    return data_manager.scan_data(
+        "kWh", "e1", "-100000d", "-0s", 2, "bounds", 0, 10, incremental=incremental
+    )
+
+
+def test_incremental_scan_of_empty_entity_saves_no_state(tmp_path):
+    watermarks = WatermarkStore(str(tmp_path / "watermarks.json"))
+    data_manager = DataManager(FakeClient([("E1", [])]), watermarks=watermarks)
+    scan(data_manager)
+    assert watermarks.get("kWh", "e1") is None
+    # A second scan used to fail on the empty state
+    assert len(scan(data_manager)) == 0
+
+
+def test_state_without_series_falls_back_to_full_scan(tmp_path):
+    watermarks = WatermarkStore(str(tmp_path / "watermarks.json"))
+    data_manager = DataManager(
+        FakeClient([("E1", [1, 2, 50, 3, 4])]), watermarks=watermarks
+    )
+    scan(data_manager)
+    state = watermarks.get("kWh", "e1")
+    watermarks.set("kWh", "e1", {"settings": state["settings"], "series": {}})
+    anomalies = scan(data_manager)
+    assert [anomalies.value(idx) for idx in range(len(anomalies))] == [50]
+    assert watermarks.get("kWh", "e1")["series"]
+
+
+def test_incremental_scan_refuses_cache(tmp_path):
+    watermarks = WatermarkStore(str(tmp_path / "watermarks.json"))
+    data_manager = DataManager(FakeClient([("E1", [1, 2, 50])]), watermarks=watermarks)
+    with pytest.raises(ValueError, match="cached"):
+        data_manager.scan_data(
+            "kWh",
+            "e1",
+            "-100000d",
+            "-0s",
+            2,
+            "bounds",
+            0,
+            10,
+            incremental=True,
+            use_cache=True,
+        )
+    assert watermarks.get("kWh", "e1") is None
+
+
+def test_delete_reports_success_with_empty_state(tmp_path):
+    watermarks = WatermarkStore(str(tmp_path / "watermarks.json"))
+    client = FakeClient([("E1", [1, 50, 2, 60, 3])])
+    data_manager = DataManager(client, watermarks=watermarks)
+    anomalies = scan(data_manager, incremental=False)
+    watermarks.set("kWh", "e1", {"settings": [], "series": {}})
+    deleted, errors = data_manager.delete_selected(list(range(len(anomalies))))
+    assert sorted(deleted) == [0, 1]
+    assert errors == []
+    assert len(client.deletes) == 2
+    assert watermarks.get("kWh", "e1") is None
+
+
+def test_state_errors_stay_off_stdout(tmp_path, capsys, caplog):
+    # Headless mode writes the anomalies to stdout
+    path = tmp_path / "watermarks.json"
+    path.write_text("{cut short")
+    watermarks = WatermarkStore(str(path))
+    data_manager = DataManager(
+        FakeClient([("E1", [1, 50, 2, 60, 3])]), watermarks=watermarks
+    )
+    scan(data_manager)
+    watermarks.path = str(tmp_path)  # Saving the state fails from now on
+    deleted, errors = data_manager.delete_selected([0])
+    assert (deleted, errors) == ([0], [])
+    assert capsys.readouterr().out == ""
+    assert "Invalid watermark file" in caplog.text
+    assert "Failed to update the incremental state of e1" in caplog.text
+
+
+# Spikes, a run of equal values and counter resets, about every detector fires
+GROWING = (
+    list(range(10))
+    + [50]
+    + [10] * 6
+    + [11, 12, 2, 3, 4, 13, -5, 14]
+    + [15] * 6
+    + [16, 0, 1, 17, 80, 18, 19]
+)
+
+
+@pytest.mark.parametrize("first", [5, 10, 11, 16, 20, 25, 33, 38])
+@pytest.mark.parametrize(
+    "check_type, options",
+    [
+        ("bounds", {}),
+        ("monotonicity", {}),
+        ("zscore", {"zscore": 2, "zscore_window": 4}),
+        ("stuck", {"stuck_run": 4}),
+        ("counter_reset", {}),
+        ("configured", {"checks": ["bounds", "stuck", "zscore"], "stuck_run": 4}),
+    ],
+)
+def test_incremental_scans_find_what_a_full_scan_finds(
+    tmp_path, check_type, options, first
+):
+    def scan(data_manager, incremental=True):
+        anomalies = data_manager.scan_data(
+            "kWh",
+            "e1",
+            "-100000d",
+            "-0s",
+            2,
+            check_type,
+            0,
+            20,
+            incremental=incremental,
+            options=options,
+        )
+        return [
+            (anomalies.timestamp(idx), anomalies[idx]) for idx in range(len(anomalies))
+        ]
+
+    watermarks = WatermarkStore(str(tmp_path / "watermarks.json"))
+    client = FakeClient([("E1", GROWING[:first])])
+    data_manager = DataManager(client, watermarks=watermarks)
+    found = scan(data_manager)
+    # The next scan checks again from the first point without full context
+    (state,) = watermarks.get("kWh", "e1")["series"].values()
+    watermark = state["times"][state["pending"]]
+    # The rest of the points arrive before it
+    client.series = [("E1", GROWING)]
+    new = scan(data_manager)
+    full = scan(DataManager(FakeClient([("E1", GROWING)])), incremental=False)
+    assert full
+    # Anomalies the first scan checked with full context stay as they were
+    assert [a for a in found if a[0] < watermark] == [
+        a for a in full if a[0] < watermark
+    ]
+    # The rest is checked again, with the suppression state and trailing context
+    assert new == [a for a in full if a[0] >= watermark]
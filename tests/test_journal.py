@@ -0,0 +1,109 @@
+import asyncio
+import json
+import os
+
+from influxdb import InfluxDBClient
+
+from conftest import TAGS, VALUES, async_client, scan_args
+from data import AsyncDataManager, DataManager
+from journal import KEEP_OPERATIONS, ChangeJournal
+
+POINT = {"measurement": "kWh", "tags": {"entity_id": "e1"}, "time": 1, "fields": {}}
+
+
+def test_undo_steps_back_through_operations(tmp_path):
+    journal = ChangeJournal(str(tmp_path / "journal.jsonl"))
+    assert journal.last_operation() is None
+    first = journal.begin("delete", "Delete 1 anomalies")
+    journal.record(first, [POINT])
+    journal.begin("fix", "Fix 1 anomalies")  # Failed before journaling a point
+    with open(journal.path, "a") as f:
+        f.write('{"entry": "points", "operat')  # Cut short by a crash
+
+    last = journal.last_operation()
+    assert (last["operation"], last["points"]) == (first, [POINT])
+    journal.mark_undone(first)
+    assert journal.last_operation() is None
+
+
+def test_undone_operations_are_compacted(tmp_path):
+    journal = ChangeJournal(str(tmp_path / "journal.jsonl"))
+    first = journal.begin("delete", "Delete 1 anomalies")
+    journal.record(first, [POINT])
+    second = journal.begin("fix", "Fix 2 anomalies")
+    journal.record(second, [POINT])
+    journal.record(second, [dict(POINT, time=2)])
+    journal.mark_undone(second)
+    # Only the operation left to undo is kept
+    with open(journal.path) as f:
+        assert [json.loads(line)["operation"] for line in f] == [first, first]
+
+    # A second journal on the same file, e.g. the GUI and a headless run
+    other = ChangeJournal(journal.path)
+    assert other.last_operation()["points"] == [POINT]
+    other.mark_undone(first)
+    assert os.path.getsize(journal.path) == 0
+    assert journal.last_operation() is None
+
+
+def test_only_latest_operations_are_kept(tmp_path):
+    journal = ChangeJournal(str(tmp_path / "journal.jsonl"))
+    for _ in range(KEEP_OPERATIONS * 3):
+        journal.record(journal.begin("delete", "Delete 1 anomalies"), [POINT])
+    with open(journal.path) as f:
+        assert sum(1 for _ in f) <= KEEP_OPERATIONS * 2 * 2
+    for _ in range(KEEP_OPERATIONS):
+        journal.mark_undone(journal.last_operation()["operation"])
+    assert journal.last_operation() is None
+
+
+def test_undo_restores_deletes_and_fixes(server, tmp_path):
+    original = dict(server.series[TAGS])
+    journal = ChangeJournal(str(tmp_path / "journal.jsonl"))
+    manager = DataManager(
+        InfluxDBClient(host="127.0.0.1", port=server.port, database="db"),
+        write_batch_size=2,
+        journal=journal,
+    )
+    anomalies = manager.scan_data(*scan_args())
+    deleted, errors = manager.delete_selected(list(range(len(anomalies))))
+    assert (len(deleted), errors) == (4, [])
+    assert len(server.series[TAGS]) == len(VALUES) - 4
+    assert manager.undo_last() == ("Delete 4 anomalies", 4, [])
+    assert server.series[TAGS] == original
+
+    anomalies = manager.scan_data(*scan_args())
+    fixed, errors = manager.fix_selected(list(range(len(anomalies))), "Previous Value")
+    assert (len(fixed), errors) == (4, [])
+    assert server.series[TAGS] != original
+    description, restored, errors = manager.undo_last()
+    assert (restored, errors) == (4, [])
+    assert server.series[TAGS] == original
+    assert manager.undo_last() == (None, 0, [])
+
+
+def test_failed_undo_stays_pending(server, tmp_path):
+    original = dict(server.series[TAGS])
+    journal = ChangeJournal(str(tmp_path / "journal.jsonl"))
+
+    async def run():
+        async with async_client(server) as client:
+            manager = AsyncDataManager(
+                client, write_batch_size=2, concurrency=1, journal=journal
+            )
+            anomalies = await manager.scan_data(*scan_args())
+            await manager.delete_selected(list(range(len(anomalies))))
+            server.fail = 1  # The first restore batch
+            failed = await manager.undo_last()
+            pending = journal.last_operation()
+            retried = await manager.undo_last()
+            return failed, pending, retried
+
+    failed, pending, retried = asyncio.run(run())
+    description, restored, errors = failed
+    assert (description, restored, len(errors)) == ("Delete 4 anomalies", 2, 1)
+    assert pending is not None and pending["description"] == description
+    # Undoing again writes every point back and closes the operation
+    assert retried == (description, 4, [])
+    assert server.series[TAGS] == original
+    assert journal.last_operation() is None
@@ -0,0 +1,281 @@
+import asyncio
+import random
+import time
+
+import numpy as np
+import pytest
+from influxdb import InfluxDBClient
+
+from cache import SeriesCache
+from checks import CONFIGURED_CHECKS
+from conftest import BASE, TAGS, FakeClient, async_client, scan_args
+from data import AsyncDataManager, DataManager
+from timestamps import ns_to_rfc3339
+from watermarks import WatermarkStore
+
+
+def original_scan(series, context_size, check_type, min_val, max_val):
+    """The per-point loop DataManager.scan_data started out as."""
+    anomalies_list = []
+    last_flagged_idx = -2
+    for name, values in sorted(series):
+        points = [
+            {"time": ns_to_rfc3339(BASE + i * 1_000_000_000), "value": v}
+            for i, v in enumerate(values)
+        ]
+        for idx, e in enumerate(points):
+            anomaly_data = {
+                "time": e["time"],
+                "value": e["value"],
+                "prev_value": points[idx - 1]["value"] if idx > 0 else None,
+                "next_value": (
+                    points[idx + 1]["value"] if idx < len(points) - 1 else None
+                ),
+                "measurement": "kWh",
+                "entity_id": "e1",
+                "friendly_name": name,
+                "context_before": [],
+                "context_after": [],
+            }
+            for i in range(1, context_size + 1):
+                if idx - i >= 0:
+                    anomaly_data["context_before"].append(
+                        (points[idx - i]["time"], points[idx - i]["value"])
+                    )
+                if idx + i < len(points):
+                    anomaly_data["context_after"].append(
+                        (points[idx + i]["time"], points[idx + i]["value"])
+                    )
+
+            if check_type == "bounds":
+                if not (min_val <= e["value"] <= max_val):
+                    anomalies_list.append(anomaly_data)
+                    last_flagged_idx = idx
+            elif 0 < idx < len(points) - 1:
+                curr_val = e["value"]
+                prev_val = anomaly_data["prev_value"]
+                next_val = anomaly_data["next_value"]
+                before_vals = [p[1] for p in anomaly_data["context_before"][::-1]]
+                after_vals = [p[1] for p in anomaly_data["context_after"]]
+                if not before_vals or not after_vals:
+                    continue
+                max_before = max(before_vals)
+                min_before = min(before_vals)
+                max_after = max(after_vals)
+                min_after = min(after_vals)
+                is_peak = curr_val > prev_val and curr_val > next_val
+                is_dip = curr_val < prev_val and curr_val < next_val
+                should_flag = False
+                if is_dip:
+                    if curr_val < max_before and curr_val < min_after:
+                        if idx != last_flagged_idx + 1:
+                            should_flag = True
+                        elif curr_val >= min_before:
+                            should_flag = False
+                        else:
+                            should_flag = True
+                elif is_peak:
+                    if curr_val > max_before and curr_val > max_after:
+                        if idx != last_flagged_idx + 1:
+                            should_flag = True
+                        elif curr_val > max(
+                            before_vals[:-1] if len(before_vals) > 1 else before_vals
+                        ):
+                            should_flag = True
+                if should_flag:
+                    anomalies_list.append(anomaly_data)
+                    last_flagged_idx = idx
+    return anomalies_list
+
+
+def random_series(rng):
+    """Several series of a counter with resets, equal runs, spikes and dips."""
+    series = []
+    for number in range(4):
+        size = int(rng.integers(1, 400))
+        # Small integer steps give many equal neighbours and points on the bounds
+        values = np.cumsum(rng.integers(0, 3, size)).astype(float)
+        resets = rng.choice(size, size // 50, replace=False)
+        for reset in resets:
+            values[reset:] -= values[reset]
+        glitches = rng.choice(size, size // 10, replace=False)
+        values[glitches] += rng.choice([-20.0, -3.0, 5.0, 40.0], len(glitches))
+        series.append((f"Meter {number}", values.tolist()))
+    return series
+
+
+@pytest.mark.parametrize("seed", range(8))
+@pytest.mark.parametrize("context_size", [0, 1, 2, 5])
+@pytest.mark.parametrize("check_type", ["bounds", "monotonicity"])
+def test_scan_matches_the_original_loop(seed, context_size, check_type):
+    series = random_series(np.random.default_rng(seed))
+    args = (context_size, check_type, 0.0, 100.0)
+    anomalies = DataManager(FakeClient(series)).scan_data(
+        "kWh", "e1", "-100000d", "-0s", *args
+    )
+    assert list(anomalies) == original_scan(series, *args)
+
+
+def test_range_delete_and_interpolation_keep_to_the_series(server):
+    # Another series of the entity, under an older friendly_name, within the run
+    old = (("entity_id", "e1"), ("friendly_name", "Old"))
+    server.series[old] = {BASE + i * 500_000_000: 5.0 for i in range(10, 14)}
+    kept = dict(server.series[old])
+    manager = DataManager(
+        InfluxDBClient(host="127.0.0.1", port=server.port, database="db")
+    )
+    anomalies = manager.scan_data(*scan_args())
+    by_time = {
+        anomalies.timestamp(idx): idx
+        for idx in range(len(anomalies))
+        if anomalies.tags(idx) == dict(TAGS)
+    }
+    run = [by_time[BASE + i * 1_000_000_000] for i in (5, 6)]
+    assert anomalies.runs(run) == [run]
+
+    fixed, errors = manager.fix_selected(run, "Linear Interpolation")
+    assert (sorted(fixed), errors) == (sorted(run), [])
+    # Between 4.0 one second before the run and 5.0 one second after it
+    assert server.series[TAGS][BASE + 5_000_000_000] == pytest.approx(4 + 1 / 3)
+    assert server.series[TAGS][BASE + 6_000_000_000] == pytest.approx(4 + 2 / 3)
+
+    server.requests = 0
+    deleted, errors = manager.delete_selected(run, ranges=True)
+    assert (sorted(deleted), errors, server.requests) == (sorted(run), [], 1)
+    assert BASE + 5_000_000_000 not in server.series[TAGS]
+    assert BASE + 6_000_000_000 not in server.series[TAGS]
+    assert server.series[old] == kept
+
+
+@pytest.mark.parametrize("value_type, written", [("integer", 2), ("float", 2.0)])
+def test_fixes_keep_the_field_type(server, value_type, written):
+    server.value_type = value_type
+    manager = DataManager(
+        InfluxDBClient(host="127.0.0.1", port=server.port, database="db")
+    )
+    anomalies = manager.scan_data(*scan_args())
+    idx = next(i for i in range(len(anomalies)) if anomalies.value(i) == 50.0)
+    server.requests = 0
+    assert manager.fix_selected([idx], "Previous Value") == ([idx], [])
+    assert server.requests == 1  # The write, the field types were read by the scan
+    value = server.series[TAGS][BASE + 2_000_000_000]
+    assert (type(value), value) == (type(written), written)
+
+
+def test_fix_preview_matches_written_values(server):
+    server.value_type = "integer"
+    manager = DataManager(
+        InfluxDBClient(host="127.0.0.1", port=server.port, database="db")
+    )
+    anomalies = manager.scan_data(*scan_args())
+    indices = list(range(len(anomalies)))
+    method = "Average of Previous and Next"
+    changes, errors = manager.preview_fix(indices, method)
+    assert errors == []
+    fixed, errors = manager.fix_selected(indices, method)
+    assert (sorted(fixed), errors) == (indices, [])
+    written = [server.series[TAGS][anomalies.timestamp(idx)] for idx in fixed]
+    preview = {change["time"]: change["new_value"] for change in changes}
+    assert [preview[anomalies.time(idx)] for idx in fixed] == written
+    assert all(type(value) is int for value in written)
+
+
+def test_prefiltered_scan_counts_each_window_once(server):
+    entity = "e'1"  # Quoted in every statement
+    server.series[(("entity_id", entity), ("friendly_name", "Meter"))] = (
+        server.series.pop(TAGS)
+    )
+    manager = DataManager(
+        InfluxDBClient(host="127.0.0.1", port=server.port, database="db")
+    )
+    args = ("kWh", entity, "-100000d", "-0s", 1, "bounds", 0, 10)
+    full = list(manager.scan_data(*args))
+    assert list(manager.scan_data(*args, prefilter=True)) == full
+    # Windows 50 (1 point of context each side), 60-61 and -7, all distinct points
+    assert manager.last_scan.counters["points"] == 3 + 4 + 3
+    # Configured checks that come down to bounds alone, the default
+    configured = (*args[:5], CONFIGURED_CHECKS, 0, 10)
+    assert list(manager.scan_data(*configured, prefilter=True)) == full
+
+    for check_type, options in [
+        ("zscore", {}),
+        (CONFIGURED_CHECKS, {"options": {"checks": ["bounds", "stuck"]}}),
+        ("bounds", {"chunk_duration": "1d"}),
+        ("bounds", {"incremental": True}),
+    ]:
+        with pytest.raises(ValueError):
+            manager.scan_data(*args[:5], check_type, 0, 10, prefilter=True, **options)
+
+
+def test_prefiltered_scan_skips_points_between_sparse_violators(server):
+    # Two violators a millisecond apart with hundreds of points between them
+    values = [1.0] * 1000
+    values[100] = values[900] = 50.0
+    server.series = {TAGS: {BASE + i * 1000: v for i, v in enumerate(values)}}
+    manager = DataManager(
+        InfluxDBClient(host="127.0.0.1", port=server.port, database="db")
+    )
+    args = ("kWh", "e1", "-100000d", "-0s", 1, "bounds", 0, 10)
+    full = list(manager.scan_data(*args))
+    assert list(manager.scan_data(*args, prefilter=True)) == full
+    assert manager.last_scan.counters["points"] == 3 + 3
+
+
+@pytest.mark.parametrize("chunk_duration", ["1s", "2s", "7s", "13s", "1m"])
+@pytest.mark.parametrize("check_type", ["bounds", "monotonicity"])
+def test_chunked_scan_matches_unchunked(server, chunk_duration, check_type):
+    # Two series of the last 90 seconds, so chunks of a few seconds tile them
+    rng = random.Random(5)
+    start = time.time_ns() - 90 * 1_000_000_000
+    server.series = {
+        tags: {
+            start + i * 1_000_000_000 + offset: float(rng.choice([1, 2, 3, 20, -5]))
+            for i in range(80)
+        }
+        for tags, offset in [
+            (TAGS, 0),
+            ((("entity_id", "e1"), ("friendly_name", "Old")), 500_000_000),
+        ]
+    }
+    args = ("kWh", "e1", "-2m", "-0s", 2, check_type, 0, 10)
+    manager = DataManager(
+        InfluxDBClient(host="127.0.0.1", port=server.port, database="db")
+    )
+    expected = list(manager.scan_data(*args))
+    assert len(expected) > 5
+    assert list(manager.scan_data(*args, chunk_duration)) == expected
+
+    async def run():
+        async with async_client(server) as client:
+            manager = AsyncDataManager(client, concurrency=4)
+            return list(await manager.scan_data(*args, chunk_duration))
+
+    assert asyncio.run(run()) == expected
+
+
+def test_entity_ids_are_quoted_on_every_scan_path(server, tmp_path):
+    entity = "e'1\\x"
+    server.series[(("entity_id", entity), ("friendly_name", "Meter"))] = (
+        server.series.pop(TAGS)
+    )
+    manager = DataManager(
+        InfluxDBClient(host="127.0.0.1", port=server.port, database="db"),
+        cache=SeriesCache(str(tmp_path / "cache.sqlite")),
+        watermarks=WatermarkStore(str(tmp_path / "watermarks.json")),
+    )
+    args = ("kWh", entity, *scan_args()[2:])
+    for options in [
+        {},
+        {"chunk_duration": "100000d"},
+        {"use_cache": True},
+        {"incremental": True},
+    ]:
+        anomalies = manager.scan_data(*args, **options)
+        values = [anomalies.value(idx) for idx in range(len(anomalies))]
+        assert values == [50, 60, 61, -7]
+    server.series[(("entity_id", entity), ("friendly_name", "Meter"))][
+        time.time_ns()
+    ] = 99.0
+    # Resumed from the saved state
+    anomalies = manager.scan_data(*args, incremental=True)
+    assert [anomalies.value(idx) for idx in range(len(anomalies))] == [99]
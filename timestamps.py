@@ -0,0 +1,36 @@
+import re
+import time
+
+# Nanoseconds per InfluxQL duration unit
+DURATION_UNITS = {
+    "ns": 1,
+    "u": 1_000,
+    "µ": 1_000,
+    "ms": 1_000_000,
+    "s": 1_000_000_000,
+    "m": 60_000_000_000,
+    "h": 3_600_000_000_000,
+    "d": 86_400_000_000_000,
+    "w": 604_800_000_000_000,
+}
+DURATION_PATTERN = re.compile(r"(\d+)(ns|u|µ|ms|s|m|h|d|w)")
+
+
+def parse_duration(text: str) -> int:
+    """Parse a signed InfluxQL duration such as '-200d' or '1h30m' into nanoseconds."""
+    text = text.replace(" ", "")
+    sign = -1 if text.startswith("-") else 1
+    body = text.lstrip("+-")
+    parts = DURATION_PATTERN.findall(body)
+    if not body or "".join(n + u for n, u in parts) != body:
+        raise ValueError(f"Invalid duration: {text!r}")
+    return sign * sum(int(n) * DURATION_UNITS[u] for n, u in parts)
+
+
+def ns_to_rfc3339(timestamp: int) -> str:
+    """Format epoch nanoseconds the way InfluxDB returns RFC3339 timestamps."""
+    seconds, fraction = divmod(timestamp, 1_000_000_000)
+    text = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(seconds))
+    if fraction:
+        text += "." + f"{fraction:09d}".rstrip("0")
+    return text + "Z"
@@ -3,6 +3,14 @@ import tkinter.font as tkfont
 import json
 import sys
 import os
+import time
+from concurrent.futures import Future
+
+from chart import OverviewChart
+from checks import CHECKS, CONFIGURED_CHECKS, DETECTOR_OPTIONS
+from jobs import JobRunner, OperationCancelled
+from profiling import profiler
+from timestamps import parse_duration
 
 try:
     import ttkbootstrap as ttk
@@ -16,13 +24,6 @@ except ImportError:
 if os.name == "nt":
     import ctypes
 
-    try:
-        import darkdetect  # For detecting system theme as a fallback
-    except ImportError:
-        darkdetect = None
-        print(
-            "Warning: darkdetect not installed. Title bar color may not match system theme perfectly."
-        )
     # Set DPI awareness before creating the Tkinter window
     try:
         ctypes.windll.shcore.SetProcessDpiAwareness(1)  # System DPI Aware
@@ -41,15 +42,48 @@ TTKBOOTSTRAP_DARK_THEMES = {
     "pulse",
 }  # Based on ttkbootstrap documentation/source
 
+# Anomaly rows inserted per event loop tick, keeps the UI responsive for large results
+TREE_INSERT_BATCH = 500
+
+
+def format_detector_options(config):
+    """Format the detector options of an entity config as 'key=value, ...'."""
+    return ", ".join(f"{k}={config[k]}" for k in DETECTOR_OPTIONS if k in config)
+
+
+def parse_detector_options(text):
+    """Parse 'key=value, ...' into detector options, raising ValueError if invalid."""
+    options = {}
+    for item in text.split(","):
+        if not item.strip():
+            continue
+        key, _, value = item.partition("=")
+        key = key.strip()
+        if key not in DETECTOR_OPTIONS:
+            raise ValueError(f"Unknown option {key!r}")
+        options[key] = float(value)
+    return options
+
 
 class InfluxDataCleaner:
     def __init__(self, root, config_manager, data_manager, state_file):
         self.root = root
         self.config_manager = config_manager
-        self.data_manager = data_manager
+        # May be a Future while the InfluxDB client is still set up in the background
+        self._data_manager = data_manager
         self.state_file = state_file  # Use the state file passed from main
         self.entity_config = self.config_manager.get_entities()
         self.influxdb_config = self.config_manager.get_influxdb_config()
+        self.jobs = JobRunner(self.root)
+        # Tree rows use the anomaly index as item id, actions survive re-sorting
+        self.row_actions = {}
+        self.tree_generation = 0  # Bumped to abort an unfinished tree population
+        self.tree_sort = ("Time", False)
+        # Overview chart fetches run on their own worker, the latest request wins
+        self.chart_jobs = JobRunner(self.root)
+        self.chart_series = None  # (unit, entity_id) shown in the overview chart
+        self.chart_range = None  # Scanned (start, end) in epoch ns
+        self.chart_request = None  # Latest (unit, entity_id, start, end) to fetch
 
         self.root.title("InfluxDB Data Cleaner")
         self.root.geometry("1280x1024")  # Increased size for better visibility
@@ -74,6 +108,7 @@ class InfluxDataCleaner:
         self.root.grid_rowconfigure(4, weight=0)
         self.root.grid_rowconfigure(5, weight=0)
         self.root.grid_rowconfigure(6, weight=0)
+        self.root.grid_rowconfigure(7, weight=0)
         self.root.grid_columnconfigure(0, weight=1)
 
         # Initialize style and set initial theme
@@ -94,10 +129,37 @@ class InfluxDataCleaner:
 
         self.setup_gui()
         self.load_state()
+        if not self.manager_ready:
+            for button in self.manager_buttons:
+                button.config(state="disabled")
+            self.root.after(50, self.wait_for_data_manager)
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
         # Schedule title bar update after GUI is fully initialized, passing self.root
         self.root.after(100, lambda: self.update_title_bar_color(self.root))
 
+    @property
+    def data_manager(self):
+        """The DataManager, its buttons stay disabled until it is set up."""
+        return self._data_manager
+
+    @property
+    def manager_ready(self) -> bool:
+        """Whether the background setup of the DataManager succeeded."""
+        return not isinstance(self._data_manager, Future)
+
+    def wait_for_data_manager(self):
+        """Poll the background setup without blocking the Tk thread."""
+        if not self._data_manager.done():
+            self.root.after(50, self.wait_for_data_manager)
+            return
+        try:
+            self._data_manager = self._data_manager.result()
+        except Exception as e:
+            self.on_job_error(e)
+            return
+        for button in self.manager_buttons:
+            button.config(state="normal")
+
     def get_initial_theme(self):
         """Load the initial theme from state file or return default."""
         default_theme = "darkly" if "ttkbootstrap" in sys.modules else "default"
@@ -203,6 +265,36 @@ class InfluxDataCleaner:
             command=lambda: (self.update_context_height(), self.save_state()),
         ).grid(row=3, column=1, padx=5, pady=5, sticky="w")
 
+        # Chunk Duration (row 3), empty scans the whole range in one query
+        ttk.Label(query_frame, text="Chunk Duration:").grid(
+            row=3, column=2, padx=5, pady=5, sticky="e"
+        )
+        self.chunk_var = tk.StringVar(value="")
+        ttk.Entry(query_frame, textvariable=self.chunk_var, width=8).grid(
+            row=3, column=3, padx=5, pady=5, sticky="w"
+        )
+        self.chunk_var.trace_add("write", lambda *args: self.save_state())
+
+        # Scan from the local cache, only fetching points it does not hold yet
+        self.use_cache_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            query_frame,
+            text="Use Local Cache",
+            variable=self.use_cache_var,
+            command=self.save_state,
+            takefocus=0,
+        ).grid(row=3, column=4, padx=5, pady=5, sticky="w")
+
+        # Only scan points added since the last incremental scan of the entity
+        self.incremental_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            query_frame,
+            text="Since Last Scan",
+            variable=self.incremental_var,
+            command=self.save_state,
+            takefocus=0,
+        ).grid(row=4, column=4, padx=5, pady=5, sticky="w")
+
         # Logo Display (inside query frame, right side)
         logo_path = os.path.join(
             os.path.dirname(os.path.abspath(__file__)), "logo_large.png"
@@ -222,20 +314,17 @@ class InfluxDataCleaner:
         check_frame.grid(row=1, column=0, padx=10, pady=5, sticky="ew")
 
         self.check_var = tk.StringVar(value="bounds")
-        ttk.Radiobutton(
-            check_frame,
-            text="Bounds Check",
-            variable=self.check_var,
-            value="bounds",
-            command=self.update_check_ui,
-        ).grid(row=0, column=0, padx=5, pady=5)
-        ttk.Radiobutton(
-            check_frame,
-            text="Monotonicity Check",
-            variable=self.check_var,
-            value="monotonicity",
-            command=self.update_check_ui,
-        ).grid(row=0, column=1, padx=5, pady=5)
+        checks = list(CHECKS.items())
+        # Runs all detectors listed under 'checks' in the entity config at once
+        checks.append((CONFIGURED_CHECKS, "Configured Checks"))
+        for number, (name, label) in enumerate(checks):
+            ttk.Radiobutton(
+                check_frame,
+                text=label,
+                variable=self.check_var,
+                value=name,
+                command=self.update_check_ui,
+            ).grid(row=number // 5, column=number % 5, padx=5, pady=5, sticky="w")
 
         self.bounds_frame = ttk.LabelFrame(self.root, text="Value Bounds")
         self.bounds_frame.grid(row=2, column=0, padx=10, pady=5, sticky="ew")
@@ -264,15 +353,37 @@ class InfluxDataCleaner:
             self.bounds_frame, text="Save", command=self.save_bounds, takefocus=0
         ).grid(row=0, column=4, padx=5, pady=5)
 
+        # Let InfluxDB find the violators so only they and their context are fetched
+        self.prefilter_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            self.bounds_frame,
+            text="Filter on Server",
+            variable=self.prefilter_var,
+            command=self.save_state,
+            takefocus=0,
+        ).grid(row=0, column=5, padx=5, pady=5)
+
         self.results_frame = ttk.LabelFrame(self.root, text="Detected Anomalies")
         self.results_frame.grid(row=3, column=0, padx=10, pady=5, sticky="nsew")
 
         self.tree = ttk.Treeview(
-            self.results_frame, columns=("Time", "Value", "Action"), show="headings"
+            self.results_frame,
+            columns=("Entity", "Time", "Value", "Action"),
+            show="headings",
+        )
+        self.tree.heading(
+            "Entity", text="Entity ID", command=lambda: self.sort_tree("Entity")
+        )
+        self.tree.heading(
+            "Time", text="Timestamp", command=lambda: self.sort_tree("Time")
         )
-        self.tree.heading("Time", text="Timestamp")
-        self.tree.heading("Value", text="Value")
-        self.tree.heading("Action", text="Action")
+        self.tree.heading(
+            "Value", text="Value", command=lambda: self.sort_tree("Value")
+        )
+        self.tree.heading(
+            "Action", text="Action", command=lambda: self.sort_tree("Action")
+        )
+        self.tree.column("Entity", width=200)
         self.tree.column("Time", width=200)
         self.tree.column("Value", width=100)
         self.tree.column("Action", width=100)
@@ -285,8 +396,15 @@ class InfluxDataCleaner:
         scrollbar.pack(side="right", fill="y")
         self.tree.bind("<<TreeviewSelect>>", self.update_context_display)
 
+        self.chart_frame = ttk.LabelFrame(self.root, text="Series Overview")
+        self.chart_frame.grid(row=4, column=0, padx=10, pady=5, sticky="ew")
+        self.chart = OverviewChart(
+            self.chart_frame, on_zoom=self.load_overview, on_select=self.select_anomaly
+        )
+        self.chart.pack(fill="x", expand=True, padx=5, pady=5)
+
         self.context_frame = ttk.LabelFrame(self.root, text="Selected Anomaly Context")
-        self.context_frame.grid(row=4, column=0, padx=10, pady=5, sticky="ew")
+        self.context_frame.grid(row=5, column=0, padx=10, pady=5, sticky="ew")
 
         self.context_tree = ttk.Treeview(
             self.context_frame,
@@ -309,13 +427,31 @@ class InfluxDataCleaner:
         context_scrollbar.pack(side="right", fill="y")
 
         btn_frame = ttk.Frame(self.root)
-        btn_frame.grid(row=5, column=0, padx=10, pady=5, sticky="ew")
+        btn_frame.grid(row=6, column=0, padx=10, pady=5, sticky="ew")
 
-        ttk.Button(btn_frame, text="Scan", command=self.scan_data, takefocus=0).pack(
-            side="left", padx=5
+        # Buttons that need the DataManager, disabled while it is set up
+        self.manager_buttons = []
+        scan_button = ttk.Button(
+            btn_frame, text="Scan", command=self.scan_data, takefocus=0
         )
-        ttk.Button(
+        scan_button.pack(side="left", padx=5)
+        scan_all_button = ttk.Button(
+            btn_frame, text="Scan All", command=self.scan_all, takefocus=0
+        )
+        scan_all_button.pack(side="left", padx=5)
+        delete_button = ttk.Button(
             btn_frame, text="Delete Selected", command=self.delete_selected, takefocus=0
+        )
+        delete_button.pack(side="left", padx=5)
+        self.manager_buttons += [scan_button, scan_all_button, delete_button]
+        # Delete runs of consecutive anomalies with one time range statement each
+        self.delete_ranges_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            btn_frame,
+            text="As Ranges",
+            variable=self.delete_ranges_var,
+            command=self.save_state,
+            takefocus=0,
         ).pack(side="left", padx=5)
 
         ttk.Label(btn_frame, text="Fix Method:").pack(side="left", padx=5)
@@ -324,6 +460,7 @@ class InfluxDataCleaner:
             "Previous Value",
             "Next Value",
             "Average of Previous and Next",
+            "Linear Interpolation",
         )
         fix_method_combo = ttk.Combobox(
             btn_frame, textvariable=self.fix_method_var, state="readonly"
@@ -333,9 +470,34 @@ class InfluxDataCleaner:
         fix_method_combo.pack(side="left", padx=5)
         fix_method_combo.bind("<<ComboboxSelected>>", lambda e: self.save_state())
 
-        ttk.Button(
+        fix_button = ttk.Button(
             btn_frame, text="Fix Selected", command=self.fix_selected, takefocus=0
+        )
+        fix_button.pack(side="left", padx=5)
+        self.manager_buttons.append(fix_button)
+        # Show the changes a delete or fix would make instead of making them
+        self.dry_run_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            btn_frame,
+            text="Dry Run",
+            variable=self.dry_run_var,
+            command=self.save_state,
+            takefocus=0,
         ).pack(side="left", padx=5)
+        undo_button = ttk.Button(
+            btn_frame, text="Undo Last", command=self.undo_last, takefocus=0
+        )
+        undo_button.pack(side="left", padx=5)
+        self.manager_buttons.append(undo_button)
+
+        ttk.Button(
+            btn_frame,
+            text="Performance",
+            command=self.open_performance_window,
+            takefocus=0,
+        ).pack(side="left", padx=5)
+        # Dump a cProfile file per operation next to the state file
+        self.profile_var = tk.BooleanVar(value=False)
 
         ttk.Label(btn_frame, text="Theme:").pack(side="left", padx=5)
         self.theme_var = tk.StringVar(value=self.initial_theme)
@@ -349,8 +511,19 @@ class InfluxDataCleaner:
         theme_combo.pack(side="left", padx=5)
         theme_combo.bind("<<ComboboxSelected>>", self.change_theme)
 
+        self.cancel_button = ttk.Button(
+            btn_frame,
+            text="Cancel",
+            command=self.jobs.cancel,
+            state="disabled",
+            takefocus=0,
+        )
+        self.cancel_button.pack(side="right", padx=5)
+        self.progress_bar = ttk.Progressbar(btn_frame, length=150)
+        self.progress_bar.pack(side="right", padx=5)
+
         self.status_bar = ttk.Label(self.root, text="", relief="sunken", anchor="w")
-        self.status_bar.grid(row=6, column=0, sticky="ew", padx=10, pady=5)
+        self.status_bar.grid(row=7, column=0, sticky="ew", padx=10, pady=5)
 
     def _set_combobox_width(self, combobox, items):
         font = tkfont.Font(font=combobox["font"])
@@ -362,10 +535,16 @@ class InfluxDataCleaner:
         """Check if the selected theme is dark based on manual mapping or fallback."""
         if "ttkbootstrap" in sys.modules:
             return theme_name in TTKBOOTSTRAP_DARK_THEMES
-        # Fallback: use darkdetect or assume light if not available
-        if darkdetect is not None:
-            return darkdetect.isDark()
-        return False  # Default to light if no better info
+        # Fallback: use darkdetect or assume light if not available. Imported
+        # here as it is only needed without ttkbootstrap and slow to load
+        try:
+            import darkdetect
+        except ImportError:
+            print(
+                "Warning: darkdetect not installed. Title bar color may not match system theme perfectly."
+            )
+            return False  # Default to light if no better info
+        return darkdetect.isDark()
 
     def update_title_bar_color(self, window):
         """Update the title bar color based on the current theme (Windows only)."""
@@ -460,16 +639,29 @@ class InfluxDataCleaner:
 
         # Entities Treeview with Scrollbar
         tree = ttk.Treeview(
-            tree_frame, columns=("Entity ID", "Unit", "Min", "Max"), show="headings"
+            tree_frame,
+            columns=("Entity ID", "Unit", "Min", "Max", "Checks"),
+            show="headings",
         )
         tree.heading("Entity ID", text="Entity ID")
         tree.heading("Unit", text="Unit")
         tree.heading("Min", text="Min Value")
         tree.heading("Max", text="Max Value")
+        tree.heading("Checks", text="Configured Checks")
         tree.column("Entity ID", width=200)
         tree.column("Unit", width=100)
         tree.column("Min", width=100)
         tree.column("Max", width=100)
+        tree.column("Checks", width=200)
+
+        def entity_row(entity, config):
+            return (
+                entity,
+                config["unit"],
+                config["min"],
+                config["max"],
+                ", ".join(config.get("checks", [])),
+            )
 
         scrollbar = ttk.Scrollbar(tree_frame, orient="vertical", command=tree.yview)
         tree.configure(yscrollcommand=scrollbar.set)
@@ -477,9 +669,7 @@ class InfluxDataCleaner:
         scrollbar.pack(side="right", fill="y")
 
         for entity, config in self.entity_config.items():
-            tree.insert(
-                "", "end", values=(entity, config["unit"], config["min"], config["max"])
-            )
+            tree.insert("", "end", values=entity_row(entity, config))
 
         # Edit frame for entity details and buttons
         edit_frame = ttk.Frame(entities_frame)
@@ -509,22 +699,45 @@ class InfluxDataCleaner:
         max_entry = ttk.Entry(edit_frame)
         max_entry.grid(row=1, column=3, padx=5, sticky="ew")
 
+        # Detectors run by "Configured Checks", e.g. "bounds, counter_reset"
+        ttk.Label(edit_frame, text="Checks:").grid(row=2, column=0, padx=5, sticky="e")
+        checks_entry = ttk.Entry(edit_frame)
+        checks_entry.grid(row=2, column=1, padx=5, sticky="ew")
+
+        # Detector thresholds, e.g. "max_rate=5, stuck_run=60"
+        ttk.Label(edit_frame, text="Options:").grid(row=2, column=2, padx=5, sticky="e")
+        options_entry = ttk.Entry(edit_frame)
+        options_entry.grid(row=2, column=3, padx=5, sticky="ew")
+
+        entries = (
+            entity_entry,
+            unit_entry,
+            min_entry,
+            max_entry,
+            checks_entry,
+            options_entry,
+        )
+
         # Button frame for centered buttons
         button_frame = ttk.Frame(edit_frame)
-        button_frame.grid(row=2, column=0, columnspan=4, pady=5)
+        button_frame.grid(row=3, column=0, columnspan=4, pady=5)
 
         def fill_fields(event):
             selected = tree.selection()
             if selected:
-                entity_id, unit, min_val, max_val = tree.item(selected[0])["values"]
-                entity_entry.delete(0, tk.END)
-                entity_entry.insert(0, entity_id)
-                unit_entry.delete(0, tk.END)
-                unit_entry.insert(0, unit)
-                min_entry.delete(0, tk.END)
-                min_entry.insert(0, min_val)
-                max_entry.delete(0, tk.END)
-                max_entry.insert(0, max_val)
+                entity_id = str(tree.item(selected[0])["values"][0])
+                config = self.entity_config[entity_id]
+                values = (
+                    entity_id,
+                    config["unit"],
+                    config["min"],
+                    config["max"],
+                    ", ".join(config.get("checks", [])),
+                    format_detector_options(config),
+                )
+                for entry, value in zip(entries, values):
+                    entry.delete(0, tk.END)
+                    entry.insert(0, value)
 
         tree.bind("<<TreeviewSelect>>", fill_fields)
 
@@ -540,22 +753,28 @@ class InfluxDataCleaner:
             if not entity_id or not unit:
                 self.set_status("Entity ID and Unit cannot be empty", "error")
                 return
+            checks = [c.strip() for c in checks_entry.get().split(",") if c.strip()]
+            unknown = [c for c in checks if c not in CHECKS]
+            if unknown:
+                self.set_status(f"Unknown checks: {', '.join(unknown)}", "error")
+                return
+            try:
+                options = parse_detector_options(options_entry.get())
+            except ValueError as e:
+                self.set_status(f"Invalid options: {e}", "error")
+                return
             self.entity_config[entity_id] = {
                 "unit": unit,
                 "min": min_val,
                 "max": max_val,
+                **({"checks": checks} if checks else {}),
+                **options,
             }
             tree.delete(*tree.get_children())
             for entity, config in self.entity_config.items():
-                tree.insert(
-                    "",
-                    "end",
-                    values=(entity, config["unit"], config["min"], config["max"]),
-                )
-            entity_entry.delete(0, tk.END)
-            unit_entry.delete(0, tk.END)
-            min_entry.delete(0, tk.END)
-            max_entry.delete(0, tk.END)
+                tree.insert("", "end", values=entity_row(entity, config))
+            for entry in entries:
+                entry.delete(0, tk.END)
             self.config_manager.save_config(
                 {"influxdb": self.influxdb_config, "entities": self.entity_config}
             )
@@ -570,10 +789,8 @@ class InfluxDataCleaner:
             entity_id = tree.item(selected[0])["values"][0]
             del self.entity_config[entity_id]
             tree.delete(selected[0])
-            entity_entry.delete(0, tk.END)
-            unit_entry.delete(0, tk.END)
-            min_entry.delete(0, tk.END)
-            max_entry.delete(0, tk.END)
+            for entry in entries:
+                entry.delete(0, tk.END)
             self.config_manager.save_config(
                 {"influxdb": self.influxdb_config, "entities": self.entity_config}
             )
@@ -657,13 +874,16 @@ class InfluxDataCleaner:
             self.set_status("All InfluxDB fields must be filled", "error")
             return
 
-        self.influxdb_config = {
-            "host": host,
-            "port": port,
-            "username": username,
-            "password": password,
-            "database": database,
-        }
+        # Update in place so optional settings (e.g. write_batch_size) are kept
+        self.influxdb_config.update(
+            {
+                "host": host,
+                "port": port,
+                "username": username,
+                "password": password,
+                "database": database,
+            }
+        )
         self.config_manager.save_config(
             {"influxdb": self.influxdb_config, "entities": self.entity_config}
         )
@@ -695,7 +915,7 @@ class InfluxDataCleaner:
             self.max_var.set(config["max"])
 
     def update_check_ui(self):
-        if self.check_var.get() == "bounds":
+        if self.check_var.get() in ("bounds", CONFIGURED_CHECKS):
             self.bounds_frame.grid(row=2, column=0, padx=10, pady=5, sticky="ew")
         else:
             self.bounds_frame.grid_forget()
@@ -704,14 +924,21 @@ class InfluxDataCleaner:
         self.context_tree.delete(*self.context_tree.get_children())
         selected = self.tree.selection()
         if selected:
-            idx = self.tree.index(selected[0])
-            anomaly = self.data_manager.anomalies[idx]
-            for t, v in reversed(anomaly["context_before"]):
+            idx = int(selected[0])
+            anomalies = self.data_manager.anomalies
+            series = (anomalies.measurement(idx), anomalies.entity_id(idx))
+            if series != self.chart_series:
+                self.show_overview(*series)
+            self.chart.select(idx)
+            before, after = anomalies.context(idx)
+            for t, v in before:
                 self.context_tree.insert("", "end", values=("Before", t, v))
             self.context_tree.insert(
-                "", "end", values=("Anomaly", anomaly["time"], anomaly["value"])
+                "",
+                "end",
+                values=("Anomaly", anomalies.time(idx), anomalies.value(idx)),
             )
-            for t, v in anomaly["context_after"]:
+            for t, v in after:
                 self.context_tree.insert("", "end", values=("After", t, v))
 
     def save_state(self):
@@ -721,6 +948,13 @@ class InfluxDataCleaner:
             "fix_method": self.fix_method_var.get(),
             "entity_id": self.entity_var.get(),
             "context_size": self.context_var.get(),
+            "chunk_duration": self.chunk_var.get(),
+            "prefilter": self.prefilter_var.get(),
+            "use_cache": self.use_cache_var.get(),
+            "incremental": self.incremental_var.get(),
+            "delete_ranges": self.delete_ranges_var.get(),
+            "dry_run": self.dry_run_var.get(),
+            "profile": self.profile_var.get(),
             "theme": (
                 self.theme_var.get()
                 if hasattr(self, "theme_var")
@@ -755,6 +989,14 @@ class InfluxDataCleaner:
                         )
                     )
                     self.context_var.set(state.get("context_size", 2))
+                    self.chunk_var.set(state.get("chunk_duration", ""))
+                    self.prefilter_var.set(state.get("prefilter", False))
+                    self.use_cache_var.set(state.get("use_cache", False))
+                    self.incremental_var.set(state.get("incremental", False))
+                    self.delete_ranges_var.set(state.get("delete_ranges", False))
+                    self.dry_run_var.set(state.get("dry_run", False))
+                    self.profile_var.set(state.get("profile", False))
+                    self.update_profiling()
                     self.update_config()
                     self.update_context_height()
             except (json.JSONDecodeError, ValueError) as e:
@@ -763,76 +1005,512 @@ class InfluxDataCleaner:
                 )
 
     def on_closing(self):
+        self.jobs.shutdown()
+        self.chart_jobs.shutdown()
         self.save_state()
         self.root.destroy()
 
+    def run_job(self, func, on_done, message):
+        """Run `func(progress, cancel)` in the background, then `on_done(result)`."""
+
+        def done(result):
+            self.end_job()
+            on_done(result)
+
+        if not self.jobs.submit(
+            func, done, on_error=self.on_job_error, on_progress=self.on_job_progress
+        ):
+            self.set_status("Another operation is still running", "warning")
+            return
+        self.progress_bar.config(mode="indeterminate")
+        self.progress_bar.start()
+        self.cancel_button.config(state="normal")
+        self.set_status(message, "info")
+
+    def end_job(self):
+        self.progress_bar.stop()
+        self.progress_bar.config(mode="determinate", value=0)
+        self.cancel_button.config(state="disabled")
+
+    def on_job_progress(self, done, total):
+        if total:
+            self.progress_bar.stop()
+            self.progress_bar.config(mode="determinate", maximum=total, value=done)
+
+    def on_job_error(self, error):
+        self.end_job()
+        if isinstance(error, OperationCancelled):
+            self.set_status(str(error), "warning")
+        else:
+            self.set_status(f"Operation failed: {error}", "error")
+
     def scan_data(self):
+        if self.jobs.busy:
+            self.set_status("Another operation is still running", "warning")
+            return
+        # Read all Tk variables here, the worker thread must not touch them
+        try:
+            params = {
+                "unit": self.unit_var.get(),
+                "entity_id": self.entity_var.get(),
+                "start_time": self.start_time_var.get(),
+                "end_time": self.end_time_var.get(),
+                "context_size": self.context_var.get(),
+                "check_type": self.check_var.get(),
+                "min_val": self.min_var.get(),
+                "max_val": self.max_var.get(),
+                "chunk_duration": self.chunk_var.get().strip(),
+                # The checkbox is hidden along with the bounds fields
+                "prefilter": self.prefilter_var.get()
+                and self.check_var.get() in ("bounds", CONFIGURED_CHECKS),
+                "use_cache": self.use_cache_var.get(),
+                "incremental": self.incremental_var.get(),
+                # Detector settings, min and max come from the fields above
+                "options": dict(self.entity_config.get(self.entity_var.get(), {})),
+            }
+        except tk.TclError:
+            self.set_status("Invalid query settings", "error")
+            return
+        self.start_chart(params["start_time"], params["end_time"])
+        self.tree_generation += 1
+        self.tree.delete(*self.tree.get_children())
+        self.context_tree.delete(*self.context_tree.get_children())
+        self.run_job(
+            lambda progress, cancel: self.data_manager.scan_data(
+                **params, progress=progress, cancel=cancel
+            ),
+            lambda anomalies: self.on_scan_done(
+                anomalies, (params["unit"], params["entity_id"])
+            ),
+            f"Scanning {params['entity_id']}...",
+        )
+
+    def on_scan_done(self, anomalies, series=None):
+        self.row_actions = {}
+        self.tree_sort = ("Time", False)
+        self.populate_tree(range(len(anomalies)))
+        self.set_status(
+            f"Found {len(anomalies)} anomalies{self.scan_throughput()}", "info"
+        )
+        if len(anomalies):
+            series = (anomalies.measurement(0), anomalies.entity_id(0))
+        if series is not None:
+            self.show_overview(*series)
+
+    def scan_all(self):
+        """Scan every configured entity with its own unit and bounds."""
+        if self.jobs.busy:
+            self.set_status("Another operation is still running", "warning")
+            return
+        try:
+            params = {
+                "entities": {k: dict(v) for k, v in self.entity_config.items()},
+                "start_time": self.start_time_var.get(),
+                "end_time": self.end_time_var.get(),
+                "context_size": self.context_var.get(),
+                "check_type": self.check_var.get(),
+                "chunk_duration": self.chunk_var.get().strip(),
+                # The checkbox is hidden along with the bounds fields
+                "prefilter": self.prefilter_var.get()
+                and self.check_var.get() in ("bounds", CONFIGURED_CHECKS),
+                "use_cache": self.use_cache_var.get(),
+                "incremental": self.incremental_var.get(),
+            }
+        except tk.TclError:
+            self.set_status("Invalid query settings", "error")
+            return
+        self.start_chart(params["start_time"], params["end_time"])
+        self.tree_generation += 1
         self.tree.delete(*self.tree.get_children())
         self.context_tree.delete(*self.context_tree.get_children())
-        anomalies = self.data_manager.scan_data(
-            unit=self.unit_var.get(),
-            entity_id=self.entity_var.get(),
-            start_time=self.start_time_var.get(),
-            end_time=self.end_time_var.get(),
-            context_size=self.context_var.get(),
-            check_type=self.check_var.get(),
-            min_val=self.min_var.get(),
-            max_val=self.max_var.get(),
-        )
-        for anomaly in anomalies:
-            self.tree.insert(
-                "", "end", values=(anomaly["time"], anomaly["value"], "None")
+        self.run_job(
+            lambda progress, cancel: self.data_manager.scan_all(
+                **params, progress=progress, cancel=cancel
+            ),
+            lambda result: self.on_scan_all_done(*result),
+            f"Scanning {len(params['entities'])} entities...",
+        )
+
+    def on_scan_all_done(self, anomalies, summaries):
+        self.on_scan_done(anomalies)
+        failed = sum(1 for summary in summaries if summary["error"])
+        self.set_status(
+            f"Found {len(anomalies)} anomalies in {len(summaries)} entities"
+            + (f", {failed} failed" if failed else "")
+            + self.scan_throughput(),
+            "warning" if failed else "info",
+        )
+        self.open_summary_window(summaries)
+
+    def scan_throughput(self):
+        """Points per second and bytes received of the latest scan, for the status bar."""
+        if not self.manager_ready:
+            return ""
+        operation = self.data_manager.last_scan
+        if operation is None or not operation.throughput():
+            return ""
+        return f" ({operation.throughput()})"
+
+    def update_profiling(self):
+        profiler.profile_dir = (
+            os.path.dirname(os.path.abspath(self.state_file))
+            if self.profile_var.get()
+            else None
+        )
+
+    def open_performance_window(self):
+        """Show the timed spans of recent operations, newest first."""
+        window = tk.Toplevel(self.root)
+        window.title("Performance")
+        window.geometry("900x500")
+        columns = ("Seconds", "Calls", "Details")
+        tree = ttk.Treeview(window, columns=columns, show="tree headings")
+        tree.heading("#0", text="Operation / Span")
+        tree.column("#0", width=250)
+        for column, width in zip(columns, (100, 80, 450)):
+            tree.heading(column, text=column)
+            tree.column(column, width=width)
+
+        def refresh():
+            tree.delete(*tree.get_children())
+            for operation in reversed(profiler.history):
+                details = operation.throughput()
+                if operation.profile_file:
+                    details += f" profile: {operation.profile_file}"
+                parent = tree.insert(
+                    "",
+                    "end",
+                    text=time.strftime("%H:%M:%S ", time.localtime(operation.started))
+                    + operation.name,
+                    values=(f"{operation.duration:.3f}", "", details),
+                )
+                for name, (calls, seconds) in sorted(
+                    operation.spans.items(), key=lambda item: -item[1][1]
+                ):
+                    share = seconds / operation.duration if operation.duration else 0
+                    tree.insert(
+                        parent,
+                        "end",
+                        text=name,
+                        values=(f"{seconds:.3f}", calls, f"{share:.0%} of operation"),
+                    )
+
+        bar = ttk.Frame(window)
+        bar.pack(side="bottom", fill="x", padx=5, pady=5)
+        ttk.Button(bar, text="Refresh", command=refresh, takefocus=0).pack(
+            side="left", padx=5
+        )
+        ttk.Checkbutton(
+            bar,
+            text="Write a cProfile file per operation",
+            variable=self.profile_var,
+            command=lambda: (self.update_profiling(), self.save_state()),
+            takefocus=0,
+        ).pack(side="left", padx=5)
+        scrollbar = ttk.Scrollbar(window, orient="vertical", command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        tree.pack(side="left", fill="both", expand=True, padx=5, pady=5)
+        scrollbar.pack(side="right", fill="y")
+        refresh()
+        window.after(100, lambda: self.update_title_bar_color(window))
+
+    def open_summary_window(self, summaries):
+        """Show points scanned, anomalies found and duration per entity."""
+        summary_window = tk.Toplevel(self.root)
+        summary_window.title("Scan Summary")
+        summary_window.geometry("800x400")
+        columns = ("Entity ID", "Points", "Anomalies", "Duration", "Error")
+        tree = ttk.Treeview(summary_window, columns=columns, show="headings")
+        for column, width in zip(columns, (200, 100, 100, 100, 300)):
+            tree.heading(column, text=column)
+            tree.column(column, width=width)
+        scrollbar = ttk.Scrollbar(summary_window, orient="vertical", command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        tree.pack(side="left", fill="both", expand=True, padx=5, pady=5)
+        scrollbar.pack(side="right", fill="y")
+        for summary in summaries:
+            tree.insert(
+                "",
+                "end",
+                values=(
+                    summary["entity_id"],
+                    summary["points"],
+                    summary["anomalies"],
+                    f"{summary['duration']:.2f}s",
+                    summary["error"] or "",
+                ),
             )
-        self.set_status(f"Found {len(anomalies)} anomalies", "info")
+        summary_window.after(100, lambda: self.update_title_bar_color(summary_window))
+
+    def start_chart(self, start_time, end_time):
+        """Clear the overview chart and remember the range a new scan covers."""
+        self.chart_series = None
+        self.chart_request = None
+        self.chart.clear()
+        now = time.time_ns()
+        try:
+            self.chart_range = (
+                now + parse_duration(start_time),
+                now + parse_duration(end_time),
+            )
+        except ValueError:
+            self.chart_range = None  # The scan itself reports the invalid range
+
+    def show_overview(self, unit, entity_id):
+        """Plot an entity over the scanned range with its anomalies marked."""
+        if self.chart_range is None:
+            return
+        anomalies = self.data_manager.anomalies
+        markers = [
+            (anomalies.timestamp(idx), anomalies.value(idx), idx)
+            for idx in range(len(anomalies))
+            if anomalies.entity_id(idx) == entity_id
+            and anomalies.measurement(idx) == unit
+        ]
+        self.chart_series = (unit, entity_id)
+        self.chart.set_series(f"{entity_id} [{unit}]", *self.chart_range, markers)
+        self.load_overview(*self.chart_range)
+
+    def load_overview(self, start, end):
+        """Fetch the charted entity between `start` and `end` at the chart's resolution."""
+        if self.chart_series is None:
+            return
+        self.chart_request = (*self.chart_series, start, end)
+        if self.chart_jobs.busy:
+            return  # Fetched once the running request is done
+        request = self.chart_request
+        buckets = self.chart.plot_width()
+        self.chart_jobs.submit(
+            lambda progress, cancel: self.data_manager.fetch_overview(
+                *request, buckets
+            ),
+            lambda overview: self.on_overview_done(request, overview),
+            on_error=self.on_overview_error,
+        )
+
+    def on_overview_done(self, request, overview):
+        if request != self.chart_request:
+            if self.chart_request is not None:
+                self.load_overview(*self.chart_request[2:])  # Superseded meanwhile
+            return
+        self.chart.set_overview(*request[2:], overview)
+
+    def on_overview_error(self, error):
+        self.set_status(f"Loading the overview failed: {error}", "error")
+
+    def select_anomaly(self, idx):
+        """Select the anomaly tree row of a marker clicked in the overview chart."""
+        item = str(idx)
+        if self.tree.exists(item):
+            self.tree.selection_set(item)
+            self.tree.see(item)
+
+    def row_values(self, idx):
+        """Return the anomaly tree row values for an anomaly index."""
+        anomalies = self.data_manager.anomalies
+        return (
+            anomalies.entity_id(idx),
+            anomalies.time(idx),
+            anomalies.value(idx),
+            self.row_actions.get(idx, "None"),
+        )
+
+    def populate_tree(self, order, selection=()):
+        """Fill the anomaly tree in the given index order, in time-sliced batches."""
+        self.tree_generation += 1
+        generation = self.tree_generation
+        self.tree.delete(*self.tree.get_children())
+        busy = 0.0  # Seconds spent inserting, without the event loop ticks between
+
+        def insert_batch(start):
+            nonlocal busy
+            if generation != self.tree_generation:
+                return  # A newer scan or sort took over
+            started = time.perf_counter()
+            batch = order[start : start + TREE_INSERT_BATCH]
+            for idx in batch:
+                self.tree.insert("", "end", iid=str(idx), values=self.row_values(idx))
+            reselect = [str(idx) for idx in batch if str(idx) in selection]
+            if reselect:
+                self.tree.selection_add(reselect)
+            busy += time.perf_counter() - started
+            if start + TREE_INSERT_BATCH < len(order):
+                self.root.after(1, insert_batch, start + TREE_INSERT_BATCH)
+            else:
+                profiler.record("populate tree", busy, rows=len(order))
+
+        insert_batch(0)
+
+    def sort_tree(self, column):
+        """Sort the anomaly rows by column, toggling the direction on repeated clicks."""
+        if not self.manager_ready:
+            return  # No rows yet
+        anomalies = self.data_manager.anomalies
+        descending = self.tree_sort == (column, False)
+        if column == "Value":
+
+            def key(idx):
+                value = anomalies.value(idx)
+                return (value is None, value if value is not None else 0)
+
+        elif column == "Action":
+
+            def key(idx):
+                return self.row_actions.get(idx, "None")
+
+        elif column == "Entity":
+
+            def key(idx):
+                return anomalies.entity_id(idx)
+
+        else:
+
+            def key(idx):
+                return anomalies.timestamp(idx)
+
+        order = sorted(range(len(anomalies)), key=key, reverse=descending)
+        self.tree_sort = (column, descending)
+        self.populate_tree(order, selection=set(self.tree.selection()))
 
     def delete_selected(self):
         selected = self.tree.selection()
         if not selected:
             self.set_status("No items selected to delete", "warning")
             return
-        indices = [self.tree.index(item) for item in selected]
-        deleted_count = self.data_manager.delete_selected(indices)
-        for item in selected:
-            self.tree.item(
-                item,
-                values=(
-                    self.tree.item(item)["values"][0],
-                    self.tree.item(item)["values"][1],
-                    "Deleted",
+        indices = [int(item) for item in selected]
+        ranges = self.delete_ranges_var.get()
+        if self.dry_run_var.get():
+            self.run_job(
+                lambda progress, cancel: (
+                    self.data_manager.preview_delete(indices, ranges=ranges),
+                    [],
                 ),
+                lambda result: self.open_preview_window("Delete Preview", *result),
+                f"Previewing delete of {len(selected)} item(s)...",
             )
+            return
+        self.run_job(
+            lambda progress, cancel: self.data_manager.delete_selected(
+                indices, progress=progress, cancel=cancel, ranges=ranges
+            ),
+            lambda result: self.on_delete_done(selected, *result),
+            f"Deleting {len(selected)} item(s)...",
+        )
+
+    def on_delete_done(self, selected, deleted, errors):
+        for idx in deleted:
+            self.row_actions[idx] = "Deleted"
+        deleted = set(deleted)
+        for item in selected:
+            if int(item) in deleted and self.tree.exists(item):
+                self.tree.item(item, values=self.row_values(int(item)))
         self.update_context_display(None)
-        self.set_status(f"Deleted {deleted_count} item(s)", "success")
+        if errors:
+            self.set_status(
+                f"Deleted {len(deleted)} of {len(selected)} item(s)\n"
+                + "\n".join(errors),
+                "warning",
+            )
+        else:
+            self.set_status(f"Deleted {len(deleted)} item(s)", "success")
 
     def fix_selected(self):
         selected = self.tree.selection()
         if not selected:
             self.set_status("No items selected to fix", "warning")
             return
-        indices = [self.tree.index(item) for item in selected]
-        success_count, errors = self.data_manager.fix_selected(
-            indices, self.fix_method_var.get()
-        )
-        for item in selected:
-            idx = self.tree.index(item)
-            anomaly = self.data_manager.anomalies[idx]
-            self.tree.item(
-                item,
-                values=(
-                    anomaly["time"],
-                    anomaly["value"],
-                    "Fixed" if not errors else "Error",
+        indices = [int(item) for item in selected]
+        fix_method = self.fix_method_var.get()
+        if self.dry_run_var.get():
+            self.run_job(
+                lambda progress, cancel: self.data_manager.preview_fix(
+                    indices, fix_method
                 ),
+                lambda result: self.open_preview_window("Fix Preview", *result),
+                f"Previewing fix of {len(selected)} item(s)...",
             )
+            return
+        self.run_job(
+            lambda progress, cancel: self.data_manager.fix_selected(
+                indices, fix_method, progress=progress, cancel=cancel
+            ),
+            lambda result: self.on_fix_done(selected, *result),
+            f"Fixing {len(selected)} item(s)...",
+        )
+
+    def on_fix_done(self, selected, fixed, errors):
+        fixed = set(fixed)
+        for item in selected:
+            idx = int(item)
+            self.row_actions[idx] = "Fixed" if idx in fixed else "Error"
+            if self.tree.exists(item):
+                self.tree.item(item, values=self.row_values(idx))
         self.update_context_display(None)
         if errors:
             self.set_status("\n".join(errors), "warning")
-        elif success_count == len(selected):
+        elif len(fixed) == len(selected):
             self.set_status(
                 f"All {len(selected)} item(s) fixed successfully", "success"
             )
         else:
             self.set_status(
-                f"{success_count} of {len(selected)} item(s) fixed successfully",
+                f"{len(fixed)} of {len(selected)} item(s) fixed successfully",
+                "success",
+            )
+
+    def open_preview_window(self, title, changes, errors):
+        """List the changes of a dry-run delete or fix."""
+        preview_window = tk.Toplevel(self.root)
+        preview_window.title(title)
+        preview_window.geometry("900x400")
+        columns = ("Action", "Entity ID", "Time", "Old Value", "New Value")
+        tree = ttk.Treeview(preview_window, columns=columns, show="headings")
+        for column, width in zip(columns, (80, 200, 250, 150, 150)):
+            tree.heading(column, text=column)
+            tree.column(column, width=width)
+        scrollbar = ttk.Scrollbar(preview_window, orient="vertical", command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        tree.pack(side="left", fill="both", expand=True, padx=5, pady=5)
+        scrollbar.pack(side="right", fill="y")
+        for change in changes:
+            tree.insert(
+                "",
+                "end",
+                values=(
+                    change["action"],
+                    change["entity_id"],
+                    change["time"],
+                    "" if change["old_value"] is None else change["old_value"],
+                    "" if change["new_value"] is None else change["new_value"],
+                ),
+            )
+        preview_window.after(100, lambda: self.update_title_bar_color(preview_window))
+        message = f"Dry run: {len(changes)} change(s), nothing was written"
+        if errors:
+            self.set_status(message + "\n" + "\n".join(errors), "warning")
+        else:
+            self.set_status(message, "info")
+
+    def undo_last(self):
+        """Restore the points of the last delete or fix from the journal."""
+        self.run_job(
+            lambda progress, cancel: self.data_manager.undo_last(
+                progress=progress, cancel=cancel
+            ),
+            lambda result: self.on_undo_done(*result),
+            "Undoing the last delete or fix...",
+        )
+
+    def on_undo_done(self, description, restored, errors):
+        if description is None and not errors:
+            self.set_status("Nothing to undo", "info")
+        elif errors:
+            self.set_status(
+                f"Restored {restored} point(s)\n" + "\n".join(errors), "warning"
+            )
+        else:
+            self.set_status(
+                f"Undid '{description}': restored {restored} point(s), "
+                "scan again to see them",
                 "success",
             )
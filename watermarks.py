@@ -0,0 +1,50 @@
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class WatermarkStore:
+    """Per-entity state of incremental scans, persisted as JSON.
+
+    For each measurement/entity it keeps the scan settings and, per series,
+    the unchecked tail with its context and the suppression state, so the
+    next scan can carry on from the last point seen.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()  # scan_all saves from several threads
+        self.states = self.load()
+
+    def load(self) -> dict:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            logger.warning(f"Invalid watermark file '{self.path}': {e}. Starting over.")
+            return {}
+
+    def save(self) -> None:
+        with open(self.path, "w") as f:
+            json.dump(self.states, f)
+
+    def get(self, measurement: str, entity_id: str):
+        """Return the saved state of an entity, or None."""
+        with self._lock:
+            return self.states.get(measurement, {}).get(entity_id)
+
+    def set(self, measurement: str, entity_id: str, state: dict) -> None:
+        with self._lock:
+            self.states.setdefault(measurement, {})[entity_id] = state
+            self.save()
+
+    def discard(self, measurement: str, entity_id: str) -> None:
+        """Forget an entity, its next incremental scan covers the whole range."""
+        with self._lock:
+            if self.states.get(measurement, {}).pop(entity_id, None) is not None:
+                self.save()